@@ -7,5 +7,5 @@ class AiFeaturesConfig(AppConfig):
     verbose_name = 'AI Features'
 
     def ready(self):
-        # import ai_features.signals  
-        pass
\ No newline at end of file
+        import ai_features.signals
+        import ai_features.tasks
\ No newline at end of file
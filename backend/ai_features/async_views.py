@@ -0,0 +1,331 @@
+# backend/ai_features/async_views.py
+"""
+Async variants of the recognition endpoints, for ASGI deployments.
+
+DRF 3.14's @api_view views are sync. Under ASGI, Django runs each sync view
+request in a thread of its own, so a worker takes on as many concurrent
+recognitions as clients send, each holding a thread and competing for the
+cores. These plain Django async views keep waiting requests as coroutines and
+run at most ASYNC_CPU_THREADS recognitions at once. They take the same requests
+and return the same JSON as register_face, verify_face and scan_license_plate
+in views.py:
+- DRF authentication, throttling and image parsers are applied by
+  @async_api_view, the blocking parts off the event loop
+- decoding, face detection/encoding, matching and OCR are awaited on a thread
+  pool of AI_SETTINGS['ASYNC_CPU_THREADS'] (face jobs then wait there on the
+  recognition process pool, if one is configured)
+- the database is reached through the async ORM; the outbox enqueue and the
+  in-memory indexes' reloads are sync code, run through sync_to_async
+
+Routed under /api/ai/async/ next to the sync endpoints; see
+benchmarks/bench_async_scans.py for in-flight scans per worker.
+"""
+import asyncio
+import functools
+import logging
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import face_recognition
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from .blobs import store_image
+from .face_index import face_index, rescore, search_scope
+from .images import IMAGE_PARSERS, decode_image, get_field, get_image_upload
+from .models import FaceEncoding
+from .plate_lookup import resolve_vehicle
+from .quality import FrameRejected
+from .utils import FaceRecognitionProcessor, LicensePlateProcessor
+from .views import (
+    NO_FACE_MATCH, _enrollment_images, _enrollment_samples, _face_match_data, _no_samples_error, _ocr_summary,
+    _plate_detection_fields,
+)
+from .workers import RecognitionBusy
+from vehicles.models import Vehicle
+from tasks.queue import enqueue
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+DEFAULT_ASYNC_SETTINGS = {
+    'ASYNC_CPU_THREADS': 4,
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def cpu_executor():
+    """Thread pool the async views run CPU-bound work on, created on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            config = {**DEFAULT_ASYNC_SETTINGS, **getattr(settings, 'AI_SETTINGS', {})}
+            _executor = ThreadPoolExecutor(max_workers=config['ASYNC_CPU_THREADS'], thread_name_prefix='ai-async')
+        return _executor
+
+
+async def run_cpu(fn, *args):
+    """Await fn(*args) on the CPU thread pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(cpu_executor(), functools.partial(fn, *args))
+
+
+def respond(data, status=200, headers=None):
+    """JSON response rendered like DRF's (NumPy scalars and ErrorDetail included)"""
+    return JsonResponse(data, status=status, headers=headers, encoder=JSONEncoder, safe=False)
+
+
+def _api_exception_response(request, exc):
+    """What DRF's exception handler answers for an APIException"""
+    headers = {}
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        authenticators = request.authenticators
+        if authenticators and authenticators[0].authenticate_header(request):
+            headers['WWW-Authenticate'] = authenticators[0].authenticate_header(request)
+        else:
+            exc.status_code = 403
+    if getattr(exc, 'wait', None):
+        headers['Retry-After'] = str(math.ceil(exc.wait))
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    return respond(data, status=exc.status_code, headers=headers)
+
+
+def _check_access(request):
+    """Authenticate, require a user and apply the throttles, as APIView.initial does"""
+    if not request.user.is_authenticated:
+        raise exceptions.NotAuthenticated()
+    for throttle in [throttle_class() for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES]:
+        if not throttle.allow_request(request, None):
+            raise exceptions.Throttled(throttle.wait())
+
+
+def async_api_view(view):
+    """POST-only async counterpart of @api_view + @parser_classes(IMAGE_PARSERS) + IsAuthenticated.
+
+    The view gets a DRF Request with the user set and the body already parsed.
+    """
+    @csrf_exempt
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        request = Request(
+            request,
+            parsers=[parser() for parser in IMAGE_PARSERS],
+            authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+            parser_context={'args': args, 'kwargs': kwargs},
+        )
+        try:
+            if request.method != 'POST':
+                raise exceptions.MethodNotAllowed(request.method)
+            # Token checks and throttle counters hit the database and cache
+            await sync_to_async(_check_access)(request)
+            await run_cpu(lambda: request.data)
+        except exceptions.APIException as e:
+            response = _api_exception_response(request, e)
+            if isinstance(e, exceptions.MethodNotAllowed):
+                response['Allow'] = 'POST'
+            return response
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def busy_response(error):
+    """503 telling the client when to retry a saturated recognition pool"""
+    return respond({'error': str(error)}, status=503, headers={'Retry-After': str(error.retry_after)})
+
+
+def rejected_response(error):
+    """422 for a frame the quality gate turned away, with the reason"""
+    return respond({'error': str(error), 'reason': error.reason, 'score': error.score}, status=422)
+
+
+@async_api_view
+async def register_face(request):
+    """Register a user's face for recognition, from one image or several samples"""
+    try:
+        user_id = get_field(request, 'user_id', request.user.id)
+        images = _enrollment_images(request)
+        max_images = settings.AI_SETTINGS.get('MAX_ENROLLMENT_IMAGES', 5)
+
+        if not images:
+            return respond({'error': 'No image provided'}, status=400)
+
+        if len(images) > max_images:
+            return respond({'error': f'At most {max_images} images per registration'}, status=400)
+
+        # Get target user (admins can register for others)
+        if str(user_id) != str(request.user.id) and request.user.role not in ['ADMIN', 'ORG_MANAGER']:
+            return respond({'error': 'Permission denied'}, status=403)
+
+        target_user = await User.objects.aget(id=user_id)
+
+        tolerance = settings.AI_SETTINGS.get('FACE_RECOGNITION_TOLERANCE', 0.6)
+        encodings, rejected = await run_cpu(_enrollment_samples, images, FaceRecognitionProcessor(tolerance))
+        if not encodings:
+            return respond(_no_samples_error(images, rejected), status=400)
+
+        face_data = await FaceEncoding.objects.filter(user=target_user).afirst() or FaceEncoding(user=target_user)
+        face_data.set_samples(encodings)
+        await face_data.asave()
+
+        target_user.is_face_registered = True
+        await target_user.asave()
+
+        return respond({
+            'message': 'Face registered successfully',
+            'user': target_user.username,
+            'face_id': face_data.id,
+            'samples': len(encodings),
+            'rejected': rejected
+        })
+
+    except User.DoesNotExist:
+        return respond({'error': 'User not found'}, status=404)
+    except RecognitionBusy as e:
+        return busy_response(e)
+    except Exception as e:
+        return respond({'error': str(e)}, status=500)
+
+
+@async_api_view
+async def verify_face(request):
+    """Verify face for attendance/login"""
+    try:
+        image_data = get_image_upload(request)
+        scan_type = get_field(request, 'scan_type', 'VERIFICATION')
+        user_id = get_field(request, 'user_id')  # Optional - for guard verification
+
+        if not image_data:
+            return respond({'error': 'No image provided'}, status=400)
+
+        image_array = await run_cpu(decode_image, image_data)
+        tolerance = settings.AI_SETTINGS.get('FACE_RECOGNITION_TOLERANCE', 0.6)
+        processor = FaceRecognitionProcessor(tolerance, quality_gate=True)
+        face_locations, face_encodings = await run_cpu(processor.detect_and_encode, image_array)
+        if not face_locations:
+            return respond({'error': 'No face detected'}, status=400)
+
+        if not face_encodings:
+            return respond({'error': 'Could not process face'}, status=400)
+
+        scanned_encoding = face_encodings[0]
+        matched_user = None
+
+        if user_id:
+            # Specific user verification (for guards)
+            try:
+                target_user = await User.objects.aget(id=user_id)
+                face_data = await FaceEncoding.objects.aget(user=target_user, is_active=True)
+            except (User.DoesNotExist, FaceEncoding.DoesNotExist):
+                return respond({'error': 'User face data not found'}, status=404)
+
+            distance = face_recognition.face_distance([face_data.encoding], scanned_encoding)[0]
+            if distance > tolerance - face_index.sample_margin():
+                distance = rescore(distance, scanned_encoding, face_data.samples)
+            if distance <= tolerance:
+                matched_user = target_user
+        else:
+            # A reload reads every encoding from the database; subtree scopes query organizations
+            await sync_to_async(face_index.ensure_loaded)()
+            org_ids = await sync_to_async(search_scope)(request.user)
+            if not face_index.count(org_ids):
+                return respond({'error': 'No registered faces found'}, status=404)
+
+            match = await run_cpu(processor.identify, scanned_encoding, face_index, org_ids)
+            if match['user_id']:
+                distance = match['distance']
+                matched_user = await User.objects.filter(id=match['user_id']).afirst()
+
+        if not matched_user:
+            return respond(NO_FACE_MATCH)
+
+        confidence = max(0, (1 - distance) * 100)
+        image_ref = await sync_to_async(store_image, thread_sensitive=False)(image_data)
+        log_task = await sync_to_async(enqueue)('ai_features.record_face_attendance', logs=[{
+            'user_id': matched_user.id,
+            'scan_type': scan_type,
+            'confidence': float(confidence),
+            'image_ref': image_ref,
+            'verified_by_id': request.user.id if request.user != matched_user else None
+        }])
+        return respond(_face_match_data(matched_user, confidence, log_task.id))
+
+    except FrameRejected as e:
+        return rejected_response(e)
+    except RecognitionBusy as e:
+        return busy_response(e)
+    except Exception as e:
+        return respond({'error': str(e)}, status=500)
+
+
+async def _record_plate_detection(request, plate, confidence, image_data, entry_type, vehicle_id=None):
+    """views._record_plate_detection with the vehicle fetched through the async ORM"""
+    plate_match = None
+    if not vehicle_id:
+        plate_scope = settings.AI_SETTINGS.get('PLATE_SEARCH_SCOPE', 'org')
+        org_ids = await sync_to_async(search_scope)(request.user, plate_scope)
+        # Resolution itself is a dict lookup, but a stale table reloads from the database
+        vehicle_id, plate_match = await sync_to_async(resolve_vehicle)(plate, org_ids=org_ids)
+    matched_vehicle = await Vehicle.objects.filter(id=vehicle_id).afirst() if vehicle_id else None
+
+    image_ref = await sync_to_async(store_image, thread_sensitive=False)(image_data)
+    record_task = await sync_to_async(enqueue)(
+        'ai_features.record_plate_scan',
+        detected_plate=plate,
+        confidence=float(confidence),
+        image_ref=image_ref,
+        entry_type=entry_type,
+        scanned_by_id=request.user.id,
+        vehicle_id=matched_vehicle.id if matched_vehicle else None
+    )
+    return _plate_detection_fields(plate, matched_vehicle, plate_match, record_task.id)
+
+
+@async_api_view
+async def scan_license_plate(request):
+    """Scan and recognize license plate from image"""
+    try:
+        image_data = get_image_upload(request)
+        entry_type = get_field(request, 'entry_type', 'ENTRY')
+        vehicle_id = get_field(request, 'vehicle_id')
+
+        if not image_data:
+            return respond({'error': 'No image provided'}, status=400)
+
+        image_array = await run_cpu(decode_image, image_data)
+
+        # extract_text fans its variants out to its own OCR threads and waits for them here
+        ocr_result = await run_cpu(LicensePlateProcessor().extract_text, image_array)
+        ocr_timings = _ocr_summary(ocr_result)
+
+        if not ocr_result['success']:
+            return respond({
+                'detected': False,
+                'message': 'Could not detect license plate text',
+                'ocr': ocr_timings
+            })
+
+        best_plate = ocr_result['best_result']['text']
+        best_confidence = ocr_result['best_result']['confidence']
+
+        return respond({
+            'detected': True,
+            'plate_number': best_plate,
+            'confidence': round(best_confidence, 2),
+            **await _record_plate_detection(request, best_plate, best_confidence, image_data, entry_type, vehicle_id),
+            'ocr': ocr_timings
+        })
+
+    except Exception as e:
+        return respond({'error': str(e)}, status=500)
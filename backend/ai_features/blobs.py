@@ -0,0 +1,121 @@
+# backend/ai_features/blobs.py
+"""
+Content-addressed image store.
+
+Images are kept out of database rows as files named by the SHA-256 of their
+bytes, and rows keep only the 64-character hex digest (the *_ref columns).
+Identical uploads hash to the same name and are stored once. Files are sharded
+two levels deep (ab/cd/abcd...) so no directory grows too large.
+
+The backend is any Django Storage, chosen by the STORAGES alias in
+AI_SETTINGS['BLOB_STORAGE'] (a FileSystemStorage under MEDIA_ROOT/blobs by
+default). An S3 or other remote storage can be swapped in without code changes.
+"""
+import hashlib
+import io
+import logging
+import os
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, InvalidStorageError, storages
+from .images import image_bytes
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BLOB_SETTINGS = {
+    'BLOB_STORAGE': 'blobs',
+}
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _hash_stream(stream):
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+class BlobStore:
+    """SHA-256 keyed blobs on a Django Storage"""
+
+    def __init__(self, storage=None):
+        self._storage = storage
+
+    @property
+    def storage(self):
+        if self._storage is not None:
+            return self._storage
+        alias = {**DEFAULT_BLOB_SETTINGS, **getattr(settings, 'AI_SETTINGS', {})}['BLOB_STORAGE']
+        try:
+            return storages[alias]
+        except InvalidStorageError:
+            return FileSystemStorage(location=f'{settings.MEDIA_ROOT}/blobs', base_url=f'{settings.MEDIA_URL}blobs/')
+
+    @staticmethod
+    def path(ref):
+        return f'{ref[:2]}/{ref[2:4]}/{ref}'
+
+    def put(self, data):
+        """Store bytes or a file object, returning its SHA-256 ref; existing content is touched, not rewritten"""
+        stream = io.BytesIO(data) if isinstance(data, (bytes, bytearray, memoryview)) else data
+        ref = _hash_stream(stream)
+        path = self.path(ref)
+        if self.storage.exists(path) and self.touch(ref):
+            return ref
+        saved = self.storage.save(path, stream if isinstance(stream, File) else File(stream))
+        if saved != path:
+            # Lost a race with an identical upload; the storage picked another name for our copy
+            self.storage.delete(saved)
+        return ref
+
+    def touch(self, ref):
+        """Refresh a blob's modified time, so prune_blobs gives a re-used blob a new grace period.
+
+        Only local storages can be touched; remote ones keep the upload time.
+        Returns False if the blob is gone.
+        """
+        try:
+            local_path = self.storage.path(self.path(ref))
+        except NotImplementedError:
+            return True
+        try:
+            os.utime(local_path)
+        except FileNotFoundError:
+            # Pruned since exists(); put() stores it again
+            return False
+        return True
+
+    def exists(self, ref):
+        return bool(ref) and self.storage.exists(self.path(ref))
+
+    def open(self, ref):
+        return self.storage.open(self.path(ref), 'rb')
+
+    def read(self, ref):
+        with self.open(ref) as blob:
+            return blob.read()
+
+    def url(self, ref):
+        return self.storage.url(self.path(ref))
+
+    def delete(self, ref):
+        self.storage.delete(self.path(ref))
+
+
+blob_store = BlobStore()
+
+
+def store_image(source, store=None):
+    """Store an uploaded file, bytes or base64 string and return its ref ('' when there is no image)"""
+    if not source:
+        return ''
+    store = store or blob_store
+    if isinstance(source, str):
+        return store.put(image_bytes(source))
+    # Uploaded files are hashed and copied in chunks, never read whole
+    return store.put(source)
+
@@ -0,0 +1,602 @@
+# backend/ai_features/face_index.py
+import logging
+import threading
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+
+from .index_version import SharedVersion
+
+try:
+    import hnswlib
+except ImportError:  # Optional ANN backend
+    hnswlib = None
+
+logger = logging.getLogger(__name__)
+
+ENCODING_SIZE = 128
+VERSION_KEY = 'ai_features:face_index_version'
+_MISSING = object()
+
+DEFAULT_INDEX_SETTINGS = {
+    'BACKEND': 'flat',            # 'flat' (exact), 'ivf' (pure NumPy) or 'hnsw' (needs hnswlib)
+    'SEARCH_SCOPE': 'org',        # Non-admins match within their 'org' or its 'subtree'
+    'RERANK_K': 10,               # Candidates re-ranked with exact distances (hnsw)
+    'EXACT_FALLBACK_ON_MISS': True,  # Flat scan when the ANN candidates hold no match
+    'IVF_NLIST': None,            # Coarse clusters; None = 4 * sqrt(N)
+    'IVF_NPROBE': 8,              # Clusters scanned per probe; higher = better recall, slower
+    'IVF_MIN_TRAIN_SIZE': 1000,   # Below this the IVF index scans everything
+    'HNSW_M': 16,
+    'HNSW_EF_CONSTRUCTION': 200,
+    'HNSW_EF_SEARCH': 64,
+    'SAMPLE_MARGIN': 0.08,        # Centroid distances this close to the tolerance are re-checked on enrollment samples
+    'SAMPLE_RERANK_K': 5,         # Nearest centroids re-checked for a borderline probe
+}
+
+
+class FaceIndex:
+    """Matrix of enrolled face encodings for 1:N search.
+
+    Encodings live in one contiguous float32 matrix with a parallel array of
+    user ids, so a probe is matched with a single vectorized distance pass
+    instead of decoding every FaceEncoding row per request. This base class is
+    the exact (flat) backend; approximate backends only narrow the candidate
+    rows, and the final decision is always made on exact distances.
+    """
+
+    backend = 'flat'
+
+    def __init__(self, dimension=ENCODING_SIZE, exact_fallback=True):
+        self.dimension = dimension
+        self.exact_fallback = exact_fallback
+        self._lock = threading.RLock()
+        self._reset(0)
+
+    def __len__(self):
+        return self._size
+
+    def _reset(self, capacity):
+        self._encodings = np.empty((capacity, self.dimension), dtype=np.float32)
+        self._sq_norms = np.empty(capacity, dtype=np.float32)
+        self._user_ids = np.empty(capacity, dtype=np.int64)
+        self._positions = {}
+        self._size = 0
+
+    def _grow(self, min_capacity):
+        capacity = max(min_capacity, 2 * len(self._user_ids), 64)
+        encodings = np.empty((capacity, self.dimension), dtype=np.float32)
+        sq_norms = np.empty(capacity, dtype=np.float32)
+        user_ids = np.empty(capacity, dtype=np.int64)
+        encodings[:self._size] = self._encodings[:self._size]
+        sq_norms[:self._size] = self._sq_norms[:self._size]
+        user_ids[:self._size] = self._user_ids[:self._size]
+        self._encodings, self._sq_norms, self._user_ids = encodings, sq_norms, user_ids
+        self._on_grow(capacity)
+
+    def load(self, rows):
+        """Replace the index contents with (user_id, encoding) pairs"""
+        rows = list(rows)
+        with self._lock:
+            self._reset(len(rows))
+            for user_id, encoding in rows:
+                self._put(user_id, encoding, build=False)
+            self._on_load()
+
+    def get(self, user_id):
+        """Copy of a user's indexed encoding, or None"""
+        with self._lock:
+            position = self._positions.get(user_id)
+            return None if position is None else self._encodings[position].copy()
+
+    def add(self, user_id, encoding):
+        """Insert or replace the encoding for a user"""
+        with self._lock:
+            self._put(user_id, encoding)
+
+    def remove(self, user_id):
+        """Drop a user's encoding, moving the last row into its slot"""
+        with self._lock:
+            position = self._positions.pop(user_id, None)
+            if position is None:
+                return
+            last = self._size - 1
+            if position != last:
+                moved_user = int(self._user_ids[last])
+                self._encodings[position] = self._encodings[last]
+                self._sq_norms[position] = self._sq_norms[last]
+                self._user_ids[position] = moved_user
+                self._positions[moved_user] = position
+                self._on_move(last, position)
+            self._size = last
+            self._on_remove(user_id)
+
+    def _put(self, user_id, encoding, build=True):
+        vector = np.asarray(encoding, dtype=np.float32).reshape(self.dimension)
+        position = self._positions.get(user_id)
+        if position is None:
+            if self._size == len(self._user_ids):
+                self._grow(self._size + 1)
+            position = self._size
+            self._size += 1
+            self._positions[user_id] = position
+            self._user_ids[position] = user_id
+        self._encodings[position] = vector
+        self._sq_norms[position] = vector @ vector
+        if build:
+            self._on_put(user_id, position)
+
+    # Hooks for approximate backends
+    def _on_grow(self, capacity):
+        pass
+
+    def _on_load(self):
+        pass
+
+    def _on_put(self, user_id, position):
+        pass
+
+    def _on_move(self, source, target):
+        pass
+
+    def _on_remove(self, user_id):
+        pass
+
+    def _candidates(self, probe):
+        """Row positions worth scoring exactly for this probe; None means all rows"""
+        return None
+
+    def _exact_best(self, probe, positions=None):
+        n = self._size
+        if positions is None:
+            # |a - b|^2 = |a|^2 - 2ab + |b|^2, with |a|^2 precomputed per row
+            sq = self._sq_norms[:n] - 2 * (self._encodings[:n] @ probe) + probe @ probe
+            user_ids = self._user_ids[:n]
+        else:
+            sq = self._sq_norms[positions] - 2 * (self._encodings[positions] @ probe) + probe @ probe
+            user_ids = self._user_ids[positions]
+        best = int(np.argmin(sq))
+        return int(user_ids[best]), float(np.sqrt(max(sq[best], 0)))
+
+    def distances(self, encoding):
+        """Exact Euclidean distance from a probe to every indexed encoding"""
+        probe = np.asarray(encoding, dtype=np.float32)
+        with self._lock:
+            n = self._size
+            sq = self._sq_norms[:n] - 2 * (self._encodings[:n] @ probe) + probe @ probe
+            user_ids = self._user_ids[:n].copy()
+        return np.sqrt(np.maximum(sq, 0)), user_ids
+
+    def search(self, encoding, tolerance=0.6):
+        """Return the closest enrolled user within tolerance, or None"""
+        probe = np.asarray(encoding, dtype=np.float32)
+        with self._lock:
+            if not self._size:
+                return None
+            best = None
+            positions = self._candidates(probe)
+            if positions is not None and len(positions):
+                best = self._exact_best(probe, positions)
+            missed = best is None or best[1] > tolerance
+            if positions is None or (missed and self.exact_fallback):
+                # Flat index, or the approximate candidates held no match
+                best = self._exact_best(probe)
+        if best is None or best[1] > tolerance:
+            return None
+        user_id, distance = best
+        return {'user_id': user_id, 'distance': distance}
+
+    def nearest(self, encoding, k=5, max_distance=None):
+        """Up to k (user_id, distance) pairs closest to a probe, nearest first"""
+        probe = np.asarray(encoding, dtype=np.float32)
+        with self._lock:
+            if not self._size:
+                return []
+            positions = self._candidates(probe)
+            if positions is None or not len(positions):
+                positions = np.arange(self._size)
+            sq = self._sq_norms[positions] - 2 * (self._encodings[positions] @ probe) + probe @ probe
+            user_ids = self._user_ids[positions]
+        order = np.argsort(sq)[:k]
+        distances = np.sqrt(np.maximum(sq[order], 0))
+        return [
+            (int(user_id), float(distance)) for user_id, distance in zip(user_ids[order], distances)
+            if max_distance is None or distance <= max_distance
+        ]
+
+    def search_batch(self, encodings, tolerance=0.6):
+        """search() for many probes; the flat backend scores them in one matrix product"""
+        if type(self)._candidates is not FaceIndex._candidates:
+            return [self.search(encoding, tolerance) for encoding in encodings]
+        probes = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dimension)
+        with self._lock:
+            n = self._size
+            if not n or not len(probes):
+                return [None] * len(probes)
+            sq = (self._sq_norms[:n][None, :] - 2 * (probes @ self._encodings[:n].T)
+                  + np.einsum('ij,ij->i', probes, probes)[:, None])
+            best = np.argmin(sq, axis=1)
+            user_ids = self._user_ids[best]
+        distances = np.sqrt(np.maximum(sq[np.arange(len(probes)), best], 0))
+        return [
+            {'user_id': int(user_id), 'distance': float(distance)} if distance <= tolerance else None
+            for user_id, distance in zip(user_ids, distances)
+        ]
+
+class IVFFaceIndex(FaceIndex):
+    """Inverted-file index: k-means cells, only the nearest cells are scanned"""
+
+    backend = 'ivf'
+
+    def __init__(self, nlist=None, nprobe=8, min_train_size=1000, train_iterations=10,
+                 max_train_samples=20000, seed=0, **kwargs):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.train_iterations = train_iterations
+        self.max_train_samples = max_train_samples
+        self._rng = np.random.default_rng(seed)
+        self._centroids = None
+        self._trained_size = 0
+        self._assignments = np.empty(0, dtype=np.int32)
+        super().__init__(**kwargs)
+
+    def _reset(self, capacity):
+        super()._reset(capacity)
+        self._assignments = np.empty(capacity, dtype=np.int32)
+
+    def _on_grow(self, capacity):
+        assignments = np.empty(capacity, dtype=np.int32)
+        assignments[:self._size] = self._assignments[:self._size]
+        self._assignments = assignments
+
+    def _nearest_cells(self, vectors, count=1):
+        centroid_norms = np.einsum('ij,ij->i', self._centroids, self._centroids)
+        scores = centroid_norms - 2 * (vectors @ self._centroids.T)
+        if count == 1:
+            return np.argmin(scores, axis=1)
+        return np.argpartition(scores, count - 1, axis=1)[:, :count]
+
+    def _assign(self, start, stop, chunk=8192):
+        for offset in range(start, stop, chunk):
+            end = min(offset + chunk, stop)
+            self._assignments[offset:end] = self._nearest_cells(self._encodings[offset:end])
+
+    def _train(self):
+        n = self._size
+        if n < self.min_train_size:
+            self._centroids = None
+            return
+        nlist = min(self.nlist or int(4 * np.sqrt(n)), n)
+        sample = self._encodings[self._rng.choice(n, min(n, self.max_train_samples), replace=False)]
+        centroids = sample[self._rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(self.train_iterations):
+            self._centroids = centroids
+            labels = self._nearest_cells(sample)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=nlist)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+        self._centroids = centroids
+        self._trained_size = n
+        self._assign(0, n)
+
+    def _on_load(self):
+        self._train()
+
+    def _on_put(self, user_id, position):
+        if self._centroids is None or self._size > 2 * self._trained_size:
+            self._train()
+        else:
+            self._assign(position, position + 1)
+
+    def _on_move(self, source, target):
+        self._assignments[target] = self._assignments[source]
+
+    def _candidates(self, probe):
+        if self._centroids is None:
+            return None
+        nprobe = min(self.nprobe, len(self._centroids))
+        selected = np.zeros(len(self._centroids), dtype=bool)
+        selected[self._nearest_cells(probe[None, :], nprobe)[0]] = True
+        return np.flatnonzero(selected[self._assignments[:self._size]])
+
+
+class HNSWFaceIndex(FaceIndex):
+    """Graph-based approximate index backed by the optional hnswlib package"""
+
+    backend = 'hnsw'
+
+    def __init__(self, m=16, ef_construction=200, ef_search=64, rerank_k=10, **kwargs):
+        if hnswlib is None:
+            raise ImportError("hnswlib is required for the 'hnsw' face index backend")
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.rerank_k = rerank_k
+        self._graph = None
+        self._deleted = set()
+        super().__init__(**kwargs)
+
+    def _new_graph(self, capacity):
+        graph = hnswlib.Index(space='l2', dim=self.dimension)
+        graph.init_index(max_elements=max(capacity, 1024), M=self.m, ef_construction=self.ef_construction)
+        graph.set_ef(max(self.ef_search, self.rerank_k))
+        return graph
+
+    def _on_load(self):
+        n = self._size
+        self._graph = self._new_graph(2 * n)
+        self._deleted = set()
+        if n:
+            self._graph.add_items(self._encodings[:n], self._user_ids[:n])
+
+    def _on_put(self, user_id, position):
+        if self._graph is None:
+            self._graph = self._new_graph(1024)
+        if self._graph.get_current_count() >= self._graph.get_max_elements():
+            self._graph.resize_index(2 * self._graph.get_max_elements())
+        if user_id in self._deleted:
+            self._graph.unmark_deleted(user_id)
+            self._deleted.discard(user_id)
+        self._graph.add_items(self._encodings[position:position + 1], [user_id])
+
+    def _on_remove(self, user_id):
+        if self._graph is not None:
+            self._graph.mark_deleted(user_id)
+            self._deleted.add(user_id)
+
+    def _candidates(self, probe):
+        if self._graph is None:
+            return None
+        labels, _ = self._graph.knn_query(probe, k=min(self.rerank_k, self._size))
+        return np.array([self._positions[label] for label in labels[0] if label in self._positions], dtype=np.int64)
+
+
+def create_face_index(config=None):
+    """Build the face index backend selected in AI_SETTINGS['FACE_INDEX']"""
+    if config is None:
+        config = getattr(settings, 'AI_SETTINGS', {}).get('FACE_INDEX', {})
+    config = {**DEFAULT_INDEX_SETTINGS, **config}
+    backend = config['BACKEND']
+    common = {'exact_fallback': config['EXACT_FALLBACK_ON_MISS']}
+
+    if backend == 'ivf':
+        return IVFFaceIndex(
+            nlist=config['IVF_NLIST'],
+            nprobe=config['IVF_NPROBE'],
+            min_train_size=config['IVF_MIN_TRAIN_SIZE'],
+            **common
+        )
+    if backend == 'hnsw':
+        if hnswlib is None:
+            logger.warning("hnswlib is not installed; falling back to the flat face index")
+            return FaceIndex(**common)
+        return HNSWFaceIndex(
+            m=config['HNSW_M'],
+            ef_construction=config['HNSW_EF_CONSTRUCTION'],
+            ef_search=config['HNSW_EF_SEARCH'],
+            rerank_k=config['RERANK_K'],
+            **common
+        )
+    return FaceIndex(**common)
+
+
+def rescore(distance, probe, samples):
+    """A centroid distance, lowered to the closest enrollment sample's if that one is nearer"""
+    if samples is None or len(samples) < 2:
+        return distance
+    probe = np.asarray(probe, dtype=np.float32)
+    return min(distance, float(np.sqrt(((samples - probe) ** 2).sum(axis=1).min())))
+
+
+class ShardedFaceIndex:
+    """Face index partitioned by organization.
+
+    Each organization's encodings live in their own backend index, so a probe
+    only scans the shards its requester may match against. Also owns loading
+    from the database and cross-process reloads.
+
+    Shards hold one encoding per user: the centroid of their enrollment
+    samples. Users enrolled with several samples keep those on the side,
+    outside the search matrices. A probe whose best centroid distance is within
+    SAMPLE_MARGIN of the tolerance (either way) is re-checked against the
+    samples of its nearest centroids, since a face in poor light may sit closer
+    to one enrollment shot than to their average.
+    """
+
+    def __init__(self, config=None):
+        self.config = config
+        self._lock = threading.RLock()
+        self._shards = {}
+        self._user_shards = {}
+        self._samples = {}  # user_id -> (n, 128) samples, multi-sample enrollments only
+        self._loaded = False
+        self._version = None
+        self.version = SharedVersion(VERSION_KEY)
+
+    def __len__(self):
+        return sum(len(shard) for shard in list(self._shards.values()))
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def count(self, org_ids=None):
+        """Number of encodings in the given organizations' shards"""
+        return sum(len(shard) for shard in self._select(org_ids))
+
+    def shard_of(self, user_id, default=None):
+        """Organization id of the shard holding a user's encoding"""
+        return self._user_shards.get(user_id, default)
+
+    def _select(self, org_ids):
+        shards = self._shards
+        if org_ids is None:
+            return list(shards.values())
+        return [shards[org_id] for org_id in set(org_ids) if org_id in shards]
+
+    def load(self, rows):
+        """Replace the contents with (user_id, org_id, encoding[, samples]) rows"""
+        grouped = defaultdict(list)
+        user_shards = {}
+        user_samples = {}
+        for user_id, org_id, encoding, *samples in rows:
+            grouped[org_id].append((user_id, encoding))
+            user_shards[user_id] = org_id
+            if samples and samples[0] is not None and len(samples[0]) > 1:
+                user_samples[user_id] = np.asarray(samples[0], dtype=np.float32)
+        shards = {}
+        for org_id, shard_rows in grouped.items():
+            shards[org_id] = create_face_index(self.config)
+            shards[org_id].load(shard_rows)
+        with self._lock:
+            self._shards = shards
+            self._user_shards = user_shards
+            self._samples = user_samples
+            self._loaded = True
+        logger.info(f"Face index loaded with {len(user_shards)} encodings in {len(shards)} organization shards")
+
+    def load_from_db(self):
+        """Rebuild the index from all active FaceEncoding rows"""
+        from .models import FaceEncoding, unpack_encoding
+
+        version = self.version.get()
+        rows = FaceEncoding.objects.filter(is_active=True).values_list(
+            'user_id', 'user__org_id', 'encoding_vector', 'encoding_data', 'samples_vector', 'sample_count'
+        )
+        self.load(
+            (
+                user_id, org_id, unpack_encoding(vector, data),
+                None if samples is None else unpack_encoding(samples).reshape(count, -1),
+            )
+            for user_id, org_id, vector, data, samples, count in rows.iterator()
+        )
+        self._version = version
+
+    def ensure_loaded(self):
+        """Load on first use, and reload when another process changed enrollments"""
+        if not self._loaded or self.version.is_stale(self._version):
+            self.load_from_db()
+
+    def add(self, user_id, encoding, org_id=None, samples=None):
+        """Insert or replace a user's encoding (and enrollment samples) in their organization's shard"""
+        with self._lock:
+            current = self._user_shards.get(user_id, _MISSING)
+            if current is not _MISSING and current != org_id:
+                self._shards[current].remove(user_id)
+            shard = self._shards.get(org_id)
+            if shard is None:
+                shard = self._shards[org_id] = create_face_index(self.config)
+            shard.add(user_id, encoding)
+            self._user_shards[user_id] = org_id
+            if samples is not None and len(samples) > 1:
+                self._samples[user_id] = np.asarray(samples, dtype=np.float32)
+            else:
+                self._samples.pop(user_id, None)
+
+    def remove(self, user_id):
+        """Drop a user's encoding from whichever shard holds it"""
+        with self._lock:
+            org_id = self._user_shards.pop(user_id, _MISSING)
+            if org_id is not _MISSING:
+                self._shards[org_id].remove(user_id)
+            self._samples.pop(user_id, None)
+
+    def move(self, user_id, org_id):
+        """Re-home a user's encoding after their organization changed"""
+        with self._lock:
+            current = self._user_shards.get(user_id, _MISSING)
+            if current is _MISSING or current == org_id:
+                return
+            encoding = self._shards[current].get(user_id)
+            self.add(user_id, encoding, org_id, self._samples.get(user_id))
+
+    def samples_of(self, user_id):
+        """A user's enrollment samples, or None when they enrolled a single one"""
+        return self._samples.get(user_id)
+
+    def _sample_settings(self):
+        config = self.config
+        if config is None:
+            config = getattr(settings, 'AI_SETTINGS', {}).get('FACE_INDEX', {})
+        config = {**DEFAULT_INDEX_SETTINGS, **config}
+        return config['SAMPLE_MARGIN'], config['SAMPLE_RERANK_K']
+
+    def sample_margin(self):
+        """Distance below the tolerance from which a centroid match is re-checked on samples"""
+        return self._sample_settings()[0]
+
+    def _settle(self, encoding, best, tolerance, org_ids, margin, rerank_k):
+        """Final match for a probe, given its best centroid match within tolerance + margin"""
+        if best is None:
+            return None
+        if best['distance'] <= tolerance - margin or not self._samples:
+            return best if best['distance'] <= tolerance else None
+        # Borderline: the samples behind the nearest centroids decide
+        candidates = [(best['user_id'], best['distance'])]
+        for shard in self._select(org_ids):
+            candidates.extend(shard.nearest(encoding, rerank_k, tolerance + margin))
+        user_id, distance = min(
+            ((user_id, rescore(distance, encoding, self._samples.get(user_id))) for user_id, distance in candidates),
+            key=lambda candidate: candidate[1],
+        )
+        if distance > tolerance:
+            return None
+        return {'user_id': user_id, 'distance': distance}
+
+    def search(self, encoding, tolerance=0.6, org_ids=None):
+        """Closest user within tolerance across the given shards (None = all)"""
+        margin, rerank_k = self._sample_settings()
+        best = None
+        for shard in self._select(org_ids):
+            match = shard.search(encoding, tolerance + margin)
+            if match and (best is None or match['distance'] < best['distance']):
+                best = match
+        return self._settle(encoding, best, tolerance, org_ids, margin, rerank_k)
+
+    def search_batch(self, encodings, tolerance=0.6, org_ids=None):
+        """Closest user within tolerance for each probe (None entries for misses)"""
+        margin, rerank_k = self._sample_settings()
+        best = [None] * len(encodings)
+        for shard in self._select(org_ids):
+            for i, match in enumerate(shard.search_batch(encodings, tolerance + margin)):
+                if match and (best[i] is None or match['distance'] < best[i]['distance']):
+                    best[i] = match
+        return [
+            self._settle(encoding, match, tolerance, org_ids, margin, rerank_k)
+            for encoding, match in zip(encodings, best)
+        ]
+
+    def mark_changed(self):
+        """Publish an enrollment change so other processes reload their index"""
+        previous = self._version
+        version = self.version.bump()
+        if isinstance(previous, int) and version == previous + 1:
+            self._version = version
+        else:
+            # Someone else changed enrollments in between; rebuild on next search
+            self._loaded = False
+
+
+def search_scope(user, scope=None):
+    """Organization ids whose faces a user may match against; None means all.
+
+    Admins search every shard. Everyone else searches their own organization,
+    or its whole subtree when AI_SETTINGS['FACE_INDEX']['SEARCH_SCOPE'] is 'subtree',
+    or everything when it is 'all'.
+    """
+    if user.role == 'ADMIN':
+        return None
+    if scope is None:
+        config = getattr(settings, 'AI_SETTINGS', {}).get('FACE_INDEX', {})
+        scope = config.get('SEARCH_SCOPE', DEFAULT_INDEX_SETTINGS['SEARCH_SCOPE'])
+    if scope == 'all':
+        return None
+    if scope == 'subtree' and user.org_id:
+        return user.org.subtree_ids()
+    return [user.org_id]
+
+
+face_index = ShardedFaceIndex()
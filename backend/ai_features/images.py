@@ -0,0 +1,103 @@
+# backend/ai_features/images.py
+"""
+Image upload handling shared by the AI and vehicle endpoints.
+
+Images arrive three ways:
+- base64 strings in JSON or form fields (the original API)
+- multipart file parts
+- a raw image/* request body (ImageUploadParser)
+
+Uploaded files are streamed by Django's upload handlers into memory or a
+temporary file, and PIL decodes straight from that file object. No base64 copy
+of the body is ever built.
+"""
+import base64
+import io
+import logging
+
+import numpy as np
+from PIL import Image
+from rest_framework.parsers import FileUploadParser, FormParser, JSONParser, MultiPartParser
+
+logger = logging.getLogger(__name__)
+
+# request.FILES key used by ImageUploadParser for raw bodies
+RAW_UPLOAD_FIELD = 'file'
+
+
+class ImageUploadParser(FileUploadParser):
+    """Raw image body (Content-Type: image/jpeg, image/png, ...); the filename is optional"""
+
+    media_type = 'image/*'
+
+    def get_filename(self, stream, media_type, parser_context):
+        return super().get_filename(stream, media_type, parser_context) or 'upload'
+
+
+# Image endpoints take base64 JSON, multipart files or a raw image/* body
+IMAGE_PARSERS = [JSONParser, MultiPartParser, FormParser, ImageUploadParser]
+
+
+def get_image_upload(request, field='image'):
+    """The image sent as `field`: an uploaded file, a raw body, or a base64 string"""
+    # Only the main 'image' field can arrive as a raw body
+    upload = request.FILES.get(field)
+    if upload is None and field == 'image':
+        upload = request.FILES.get(RAW_UPLOAD_FIELD)
+    if upload is not None:
+        return upload
+    return request.data.get(field)
+
+
+def get_field(request, name, default=None):
+    """A form or JSON field, falling back to the query string (raw bodies carry only the image)"""
+    value = request.data.get(name)
+    if value is None:
+        value = request.query_params.get(name, default)
+    return value
+
+
+def get_image_uploads(request, field='images'):
+    """All images sent under `field`, as uploaded files or base64 strings"""
+    uploads = request.FILES.getlist(field)
+    if uploads:
+        return uploads
+    values = request.data.get(field)
+    return values if isinstance(values, list) else None
+
+
+def _base64_bytes(value):
+    # Remove data URL prefix if present
+    if ',' in value:
+        value = value.split(',', 1)[1]
+    return base64.b64decode(value)
+
+
+def decode_image(source, mode=None):
+    """Decode a base64 string, bytes or file-like object to a numpy array"""
+    try:
+        if isinstance(source, str):
+            stream = io.BytesIO(_base64_bytes(source))
+        elif isinstance(source, (bytes, bytearray, memoryview)):
+            stream = io.BytesIO(source)
+        else:
+            source.seek(0)
+            stream = source
+        image = Image.open(stream)
+        if mode and image.mode != mode:
+            image = image.convert(mode)
+        return np.array(image)
+    except Exception as e:
+        logger.error(f"Failed to decode image: {str(e)}")
+        raise ValueError(f"Invalid image data: {str(e)}")
+
+
+def image_bytes(source):
+    """The encoded image bytes of an upload or base64 string"""
+    if isinstance(source, str):
+        return _base64_bytes(source)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    source.seek(0)
+    return source.read()
+
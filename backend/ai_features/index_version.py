@@ -0,0 +1,66 @@
+# backend/ai_features/index_version.py
+"""
+Version counters telling every worker when a per-process table went stale.
+
+The face index and the plate lookup are built in each worker's memory. A
+change made in one worker bumps a counter in the INDEX_VERSION_CACHE_ALIAS
+cache (Redis in production, shared by all workers); the others compare it with
+the version they loaded and rebuild on their next request. The 'default'
+cache is per-process and would hide the change from every other worker.
+
+While the shared cache is unreachable, loaded tables keep serving and a worker
+that made a change rebuilds its own; every worker rebuilds once the cache is
+back.
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import caches, InvalidCacheBackendError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VERSION_CACHE_ALIAS = 'index'
+
+# Returned by get() when the shared cache could not be read
+UNAVAILABLE = object()
+
+
+class SharedVersion:
+    """A change counter for one table, kept in the shared cache"""
+
+    def __init__(self, key):
+        self.key = key
+
+    @property
+    def cache(self):
+        alias = getattr(settings, 'AI_SETTINGS', {}).get('INDEX_VERSION_CACHE_ALIAS', DEFAULT_VERSION_CACHE_ALIAS)
+        try:
+            return caches[alias]
+        except InvalidCacheBackendError:
+            return caches['default']
+
+    def get(self):
+        """Current version, None before the first change, or UNAVAILABLE"""
+        try:
+            return self.cache.get(self.key)
+        except Exception as e:
+            logger.warning(f"Version {self.key} not read: {e}")
+            return UNAVAILABLE
+
+    def bump(self):
+        """Count a change and return the new version, or None if it could not be counted"""
+        cache = self.cache
+        try:
+            cache.add(self.key, 0, timeout=None)
+            return cache.incr(self.key)
+        except ValueError:
+            # Evicted between add and incr
+            return None
+        except Exception as e:
+            logger.warning(f"Version {self.key} not bumped: {e}")
+            return None
+
+    def is_stale(self, loaded_version):
+        """Whether a table loaded at loaded_version missed a change; False while the cache is unreachable"""
+        version = self.get()
+        return version is not UNAVAILABLE and version != loaded_version
@@ -0,0 +1,83 @@
+# backend/ai_features/management/commands/migrate_images_to_blobs.py
+"""
+Move inline base64 images out of database rows into the blob store.
+
+Rows are walked in primary-key order, batch by batch. Each batch is one short
+query plus one bulk_update, so the command never holds a long cursor or a
+whole table in memory, and it can be stopped and re-run: rows that already have
+a ref are skipped.
+
+Moved scan images (postprocess.SCAN_IMAGE_FIELDS) are queued for their archive
+copy and thumbnail, one task per batch, as bulk_update sends no post_save.
+"""
+import binascii
+
+from django.core.management.base import BaseCommand
+
+from ai_features.blobs import blob_store
+from ai_features.images import image_bytes
+from ai_features.models import FaceAttendanceLog, LicensePlateRecord
+from ai_features.postprocess import SCAN_IMAGE_FIELDS, schedule_batch_processing
+from vehicles.models import AttendanceLog, VehicleVerification
+
+# (model, legacy base64 column, ref column)
+IMAGE_COLUMNS = [
+    (FaceAttendanceLog, 'scanned_image', 'scanned_image_ref'),
+    (LicensePlateRecord, 'original_image', 'original_image_ref'),
+    (LicensePlateRecord, 'processed_image', 'processed_image_ref'),
+    (AttendanceLog, 'face_image', 'face_image_ref'),
+    (VehicleVerification, 'license_plate_image', 'license_plate_image_ref'),
+    (VehicleVerification, 'driver_face_image', 'driver_face_image_ref'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Move base64 image columns into the content-addressed blob store'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='Rows read and updated per query')
+        parser.add_argument('--keep-legacy', action='store_true', help='Leave the base64 text in place after copying')
+        parser.add_argument('--dry-run', action='store_true', help='Count the rows that would be moved')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for model, column, ref_column in IMAGE_COLUMNS:
+            label = f'{model._meta.label}.{column}'
+            is_scan = SCAN_IMAGE_FIELDS.get(model._meta.label) == column
+            pending = model.objects.with_images().exclude(**{column: ''}).filter(**{ref_column: ''})
+            if options['dry_run']:
+                self.stdout.write(f'{label}: {pending.count()} rows to move')
+                continue
+
+            moved = failed = moved_bytes = 0
+            refs = set()
+            last_id = 0
+            while True:
+                rows = list(pending.filter(pk__gt=last_id).order_by('pk').only('pk', column)[:batch_size])
+                if not rows:
+                    break
+                last_id = rows[-1].pk
+                updated = []
+                for row in rows:
+                    try:
+                        data = image_bytes(getattr(row, column))
+                    except (binascii.Error, ValueError) as e:
+                        self.stderr.write(f'{label} id={row.pk}: not valid base64 ({e}), left in place')
+                        failed += 1
+                        continue
+                    ref = blob_store.put(data)
+                    setattr(row, ref_column, ref)
+                    if not options['keep_legacy']:
+                        setattr(row, column, '')
+                    updated.append(row)
+                    refs.add(ref)
+                    moved_bytes += len(data)
+                model.objects.bulk_update(updated, [ref_column] if options['keep_legacy'] else [ref_column, column])
+                if is_scan:
+                    schedule_batch_processing(model, [row.pk for row in updated])
+                moved += len(updated)
+
+            self.stdout.write(
+                f'{label}: moved {moved} rows ({moved_bytes / 1024 / 1024:.1f} MB) '
+                f'into {len(refs)} blobs, {failed} failed'
+            )
@@ -0,0 +1,100 @@
+# backend/ai_features/management/commands/prune_blobs.py
+"""
+Delete blobs that no row references any more.
+
+Replaced scan originals and images of deleted rows stay in the blob store
+until this runs. A blob is live while a *_ref column or the payload of an
+unfinished task (queued, retrying or failed; finished tasks are deleted) names
+it. A blob younger than the grace period is always kept, because an upload
+that was just stored may not have its row or task committed yet; re-uploading
+existing content touches the blob, so the grace period counts from its last
+use. The store is listed a shard directory at a time, and each batch of names
+is checked with one IN query per ref column.
+"""
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ai_features.blobs import blob_store
+from tasks.models import Task
+
+BATCH_SIZE = 500
+
+
+def ref_columns():
+    """(model, field name) of every blob reference column (CharField(64) named *_ref)"""
+    return [
+        (model, field.name)
+        for model in apps.get_models()
+        for field in model._meta.get_fields()
+        if field.name.endswith('_ref') and getattr(field, 'max_length', None) == 64
+    ]
+
+
+def task_refs():
+    """Blob refs named by *_ref keys anywhere in the payloads of unfinished tasks"""
+    refs = set()
+
+    def collect(value):
+        if isinstance(value, dict):
+            for key, item in value.items():
+                if key.endswith('_ref') and isinstance(item, str):
+                    refs.add(item)
+                else:
+                    collect(item)
+        elif isinstance(value, list):
+            for item in value:
+                collect(item)
+
+    for payload in Task.objects.values_list('payload', flat=True).iterator():
+        collect(payload)
+    return refs
+
+
+class Command(BaseCommand):
+    help = 'Delete unreferenced blobs older than a grace period'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=24, help='Keep blobs younger than this')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be deleted')
+
+    def referenced(self, refs):
+        # Tasks are re-read per batch so ones queued while the store is listed count too
+        found = task_refs().intersection(refs)
+        for model, column in self.columns:
+            found.update(model._base_manager.filter(**{f'{column}__in': refs}).values_list(column, flat=True))
+        return found
+
+    def prune(self, refs, cutoff, dry_run):
+        referenced = self.referenced(refs)
+        deleted = 0
+        for ref in refs:
+            if ref in referenced or blob_store.storage.get_modified_time(blob_store.path(ref)) > cutoff:
+                continue
+            if not dry_run:
+                blob_store.delete(ref)
+            deleted += 1
+        return deleted
+
+    def handle(self, *args, **options):
+        storage = blob_store.storage
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+        self.columns = ref_columns()
+        scanned = deleted = 0
+        batch = []
+        outers = storage.listdir('')[0] if storage.exists('') else []
+        for outer in outers:
+            for inner in storage.listdir(outer)[0]:
+                batch.extend(storage.listdir(f'{outer}/{inner}')[1])
+                while len(batch) >= BATCH_SIZE:
+                    deleted += self.prune(batch[:BATCH_SIZE], cutoff, options['dry_run'])
+                    scanned += BATCH_SIZE
+                    batch = batch[BATCH_SIZE:]
+        if batch:
+            deleted += self.prune(batch, cutoff, options['dry_run'])
+            scanned += len(batch)
+
+        verb = 'would delete' if options['dry_run'] else 'deleted'
+        self.stdout.write(f'Scanned {scanned} blobs, {verb} {deleted}')
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.2 on 2026-10-17 22:16
+
+import json
+
+import numpy as np
+from django.db import migrations, models
+
+
+BATCH_SIZE = 500
+
+
+def json_to_binary(apps, schema_editor):
+    FaceEncoding = apps.get_model('ai_features', 'FaceEncoding')
+    batch = []
+    for face_data in FaceEncoding.objects.exclude(encoding_data='').only('id', 'encoding_data').iterator(chunk_size=BATCH_SIZE):
+        try:
+            encoding = np.asarray(json.loads(face_data.encoding_data), dtype=np.float32)
+        except (ValueError, TypeError):
+            continue
+        if encoding.size == 0:
+            continue
+        face_data.encoding_vector = encoding.tobytes()
+        face_data.encoding_data = ''
+        batch.append(face_data)
+        if len(batch) >= BATCH_SIZE:
+            FaceEncoding.objects.bulk_update(batch, ['encoding_vector', 'encoding_data'])
+            batch = []
+    if batch:
+        FaceEncoding.objects.bulk_update(batch, ['encoding_vector', 'encoding_data'])
+
+
+def binary_to_json(apps, schema_editor):
+    FaceEncoding = apps.get_model('ai_features', 'FaceEncoding')
+    batch = []
+    for face_data in FaceEncoding.objects.filter(encoding_vector__isnull=False).only('id', 'encoding_vector').iterator(chunk_size=BATCH_SIZE):
+        face_data.encoding_data = json.dumps(np.frombuffer(face_data.encoding_vector, dtype=np.float32).tolist())
+        batch.append(face_data)
+        if len(batch) >= BATCH_SIZE:
+            FaceEncoding.objects.bulk_update(batch, ['encoding_data'])
+            batch = []
+    if batch:
+        FaceEncoding.objects.bulk_update(batch, ['encoding_data'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_features', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='faceencoding',
+            name='encoding_vector',
+            field=models.BinaryField(blank=True, help_text='Face encoding as raw float32 bytes', null=True),
+        ),
+        migrations.AlterField(
+            model_name='faceencoding',
+            name='encoding_data',
+            field=models.TextField(blank=True, help_text='Legacy JSON array of face encoding vectors'),
+        ),
+        migrations.RunPython(json_to_binary, binary_to_json),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.2 on 2026-10-17 23:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_features', '0002_faceencoding_encoding_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='faceattendancelog',
+            name='scanned_image_ref',
+            field=models.CharField(blank=True, help_text='SHA-256 of the scanned image in the blob store', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='licenseplaterecord',
+            name='original_image_ref',
+            field=models.CharField(blank=True, help_text='SHA-256 of the original image in the blob store', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='licenseplaterecord',
+            name='processed_image_ref',
+            field=models.CharField(blank=True, help_text='SHA-256 of the processed image in the blob store', max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='faceattendancelog',
+            name='scanned_image',
+            field=models.TextField(blank=True, help_text='Legacy base64 encoded scanned image'),
+        ),
+        migrations.AlterField(
+            model_name='licenseplaterecord',
+            name='original_image',
+            field=models.TextField(blank=True, help_text='Legacy base64 encoded original image'),
+        ),
+        migrations.AlterField(
+            model_name='licenseplaterecord',
+            name='processed_image',
+            field=models.TextField(blank=True, help_text='Legacy base64 encoded processed image'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.2 on 2026-10-17 23:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_features', '0003_image_blob_refs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='faceattendancelog',
+            name='raw_image_ref',
+            field=models.CharField(blank=True, help_text='SHA-256 of the full upload, when originals are kept', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='faceattendancelog',
+            name='thumbnail_ref',
+            field=models.CharField(blank=True, help_text='SHA-256 of the list-view thumbnail', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='licenseplaterecord',
+            name='raw_image_ref',
+            field=models.CharField(blank=True, help_text='SHA-256 of the full upload, when originals are kept', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='licenseplaterecord',
+            name='thumbnail_ref',
+            field=models.CharField(blank=True, help_text='SHA-256 of the list-view thumbnail', max_length=64),
+        ),
+    ]
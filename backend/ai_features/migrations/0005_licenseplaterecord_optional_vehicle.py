@@ -0,0 +1,20 @@
+# Generated by Django 5.2.2 on 2026-10-17 23:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_features', '0004_scan_image_thumbnails'),
+        ('vehicles', '0004_image_blob_refs'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='licenseplaterecord',
+            name='vehicle',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='plate_records', to='vehicles.vehicle'),
+        ),
+    ]
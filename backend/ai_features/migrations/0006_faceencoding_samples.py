@@ -0,0 +1,28 @@
+# Generated by Django 5.2.2 on 2026-10-17 23:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_features', '0005_licenseplaterecord_optional_vehicle'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='faceencoding',
+            name='sample_count',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='faceencoding',
+            name='samples_vector',
+            field=models.BinaryField(blank=True, help_text='All enrollment samples as raw float32 bytes, when there are several', null=True),
+        ),
+        migrations.AlterField(
+            model_name='faceencoding',
+            name='encoding_vector',
+            field=models.BinaryField(blank=True, help_text="Face encoding as raw float32 bytes (the samples' centroid)", null=True),
+        ),
+    ]
@@ -1,13 +1,44 @@
 # backend/ai_features/models.py
+import json
+import numpy as np
 from django.db import models
 from django.contrib.auth import get_user_model
-from vehicles.models import Vehicle
+from vehicles.models import ImageLogManager, Vehicle
 
 User = get_user_model()
 
+ENCODING_DTYPE = np.float32
+
+def pack_encoding(encoding):
+    """Serialize a face encoding to raw float32 bytes (512 bytes for 128-d)"""
+    return np.asarray(encoding, dtype=ENCODING_DTYPE).tobytes()
+
+def face_centroid(encodings):
+    """Normalized centroid of enrollment samples.
+
+    The mean of the unit-length samples, scaled back to their mean length:
+    a plain mean of scattered samples is shorter than any of them, which
+    would shift every distance measured against it.
+    """
+    samples = np.asarray(encodings, dtype=ENCODING_DTYPE).reshape(len(encodings), -1)
+    norms = np.linalg.norm(samples, axis=1)
+    direction = (samples / norms[:, None]).mean(axis=0)
+    return (direction / np.linalg.norm(direction) * norms.mean()).astype(ENCODING_DTYPE)
+
+def unpack_encoding(vector, legacy_json=''):
+    """Zero-copy view of stored encoding bytes, falling back to legacy JSON text"""
+    if vector is not None:
+        return np.frombuffer(vector, dtype=ENCODING_DTYPE)
+    if legacy_json:
+        return np.asarray(json.loads(legacy_json), dtype=ENCODING_DTYPE)
+    return None
+
 class FaceEncoding(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='face_data')
-    encoding_data = models.TextField(help_text="JSON array of face encoding vectors")
+    encoding_data = models.TextField(blank=True, help_text="Legacy JSON array of face encoding vectors")
+    encoding_vector = models.BinaryField(null=True, blank=True, help_text="Face encoding as raw float32 bytes (the samples' centroid)")
+    samples_vector = models.BinaryField(null=True, blank=True, help_text="All enrollment samples as raw float32 bytes, when there are several")
+    sample_count = models.PositiveSmallIntegerField(default=1)
     photo_url = models.URLField(blank=True, help_text="URL to the original registration photo")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -16,6 +47,28 @@ class FaceEncoding(models.Model):
     def __str__(self):
         return f"Face data for {self.user.username}"
 
+    @property
+    def encoding(self):
+        return unpack_encoding(self.encoding_vector, self.encoding_data)
+
+    @property
+    def samples(self):
+        """Enrollment samples as an (n, 128) array; single-sample rows only have the encoding"""
+        if self.samples_vector is not None:
+            return unpack_encoding(self.samples_vector).reshape(self.sample_count, -1)
+        encoding = self.encoding
+        return None if encoding is None else encoding[None, :]
+
+    def set_encoding(self, encoding):
+        self.set_samples([encoding])
+
+    def set_samples(self, encodings):
+        """Store enrollment samples and their centroid as the matching encoding"""
+        self.encoding_vector = pack_encoding(face_centroid(encodings))
+        self.samples_vector = pack_encoding(encodings) if len(encodings) > 1 else None
+        self.sample_count = len(encodings)
+        self.encoding_data = ''
+
 class FaceAttendanceLog(models.Model):
     SCAN_TYPE_CHOICES = [
         ('CHECK_IN', 'Check In'),
@@ -26,12 +79,18 @@ class FaceAttendanceLog(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     scan_type = models.CharField(max_length=20, choices=SCAN_TYPE_CHOICES)
     confidence_score = models.FloatField(help_text="Face recognition confidence (0-100)")
-    scanned_image = models.TextField(help_text="Base64 encoded scanned image")
+    scanned_image = models.TextField(blank=True, help_text="Legacy base64 encoded scanned image")
+    scanned_image_ref = models.CharField(max_length=64, blank=True, help_text="SHA-256 of the scanned image in the blob store")
+    thumbnail_ref = models.CharField(max_length=64, blank=True, help_text="SHA-256 of the list-view thumbnail")
+    raw_image_ref = models.CharField(max_length=64, blank=True, help_text="SHA-256 of the full upload, when originals are kept")
     timestamp = models.DateTimeField(auto_now_add=True)
     location = models.CharField(max_length=100, blank=True)
     verified_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='verifications_done')
     notes = models.TextField(blank=True)
     
+    IMAGE_FIELDS = ['scanned_image']
+    objects = ImageLogManager()
+    
     class Meta:
         ordering = ['-timestamp']
 
@@ -39,17 +98,24 @@ class FaceAttendanceLog(models.Model):
         return f"{self.user.username} - {self.scan_type} - {self.timestamp.strftime('%Y-%m-%d %H:%M')}"
 
 class LicensePlateRecord(models.Model):
-    vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name='plate_records')
+    vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, null=True, blank=True, related_name='plate_records')
     detected_plate = models.CharField(max_length=20, help_text="OCR detected license plate")
     confidence_score = models.FloatField(help_text="OCR confidence (0-100)")
-    original_image = models.TextField(help_text="Base64 encoded original image")
-    processed_image = models.TextField(blank=True, help_text="Base64 encoded processed image")
+    original_image = models.TextField(blank=True, help_text="Legacy base64 encoded original image")
+    original_image_ref = models.CharField(max_length=64, blank=True, help_text="SHA-256 of the original image in the blob store")
+    thumbnail_ref = models.CharField(max_length=64, blank=True, help_text="SHA-256 of the list-view thumbnail")
+    raw_image_ref = models.CharField(max_length=64, blank=True, help_text="SHA-256 of the full upload, when originals are kept")
+    processed_image = models.TextField(blank=True, help_text="Legacy base64 encoded processed image")
+    processed_image_ref = models.CharField(max_length=64, blank=True, help_text="SHA-256 of the processed image in the blob store")
     timestamp = models.DateTimeField(auto_now_add=True)
     scanned_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     location = models.CharField(max_length=100, blank=True)
     entry_type = models.CharField(max_length=10, choices=[('ENTRY', 'Entry'), ('EXIT', 'Exit')])
     verified = models.BooleanField(default=False)
     
+    IMAGE_FIELDS = ['original_image', 'processed_image']
+    objects = ImageLogManager()
+    
     class Meta:
         ordering = ['-timestamp']
 
@@ -0,0 +1,168 @@
+# backend/ai_features/ocr.py
+"""
+OCR engines behind one image_to_string(image, config) call, plus
+image_to_chars(image, config) for (character, confidence) pairs.
+
+pytesseract starts a new tesseract process per call, which reloads the language
+data every time. TesserocrEngine keeps a warm in-process Tesseract API per
+thread instead, and releases the GIL while recognising. The engine is picked by
+AI_SETTINGS['OCR_ENGINE']: 'tesserocr', 'pytesseract' or 'auto' (tesserocr if
+installed).
+
+Confidences are Tesseract's own, 0-100. tesserocr reports them per symbol.
+pytesseract only gets word-level confidences from image_to_data, so each
+character carries its word's.
+"""
+import logging
+import shlex
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+from PIL import Image
+import pytesseract
+from django.conf import settings
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OEM = 3
+DEFAULT_PSM = 3
+
+
+def parse_config(config):
+    """Split a tesseract CLI config string into (oem, psm, {variable: value})"""
+    oem, psm, variables = DEFAULT_OEM, DEFAULT_PSM, {}
+    tokens = shlex.split(config or '')
+    for i, token in enumerate(tokens):
+        if i + 1 >= len(tokens):
+            break
+        value = tokens[i + 1]
+        if token == '--oem':
+            oem = int(value)
+        elif token == '--psm':
+            psm = int(value)
+        elif token == '-c' and '=' in value:
+            name, _, setting = value.partition('=')
+            variables[name] = setting
+    return oem, psm, variables
+
+
+class PytesseractEngine:
+    """One tesseract subprocess per call"""
+
+    name = 'pytesseract'
+
+    def __init__(self, tesseract_cmd=None):
+        if tesseract_cmd:
+            pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+
+    def image_to_string(self, image, config=''):
+        return pytesseract.image_to_string(image, config=config)
+
+    def image_to_chars(self, image, config=''):
+        data = pytesseract.image_to_data(image, config=config, output_type=pytesseract.Output.DICT)
+        return [
+            (char, float(confidence))
+            for word, confidence in zip(data['text'], data['conf'])
+            if float(confidence) >= 0
+            for char in str(word).strip()
+            if not char.isspace()
+        ]
+
+
+class TesserocrEngine:
+    """Warm in-process Tesseract, one API instance per thread and OEM"""
+
+    name = 'tesserocr'
+
+    def __init__(self, tessdata_path=None, lang='eng'):
+        if tesserocr is None:
+            raise ImportError('tesserocr is not installed')
+        self.tessdata_path = tessdata_path
+        self.lang = lang
+        self._local = threading.local()
+        # Fail here (and fall back) if the language data cannot be loaded
+        self._api(DEFAULT_OEM)
+
+    def _api(self, oem):
+        apis = self._local.__dict__.setdefault('apis', {})
+        if oem not in apis:
+            kwargs = {'lang': self.lang, 'oem': oem}
+            if self.tessdata_path:
+                kwargs['path'] = self.tessdata_path
+            apis[oem] = tesserocr.PyTessBaseAPI(**kwargs)
+            logger.debug(f"Initialised Tesseract API (oem {oem}) in thread {threading.get_ident()}")
+        return apis[oem]
+
+    @contextmanager
+    def _recognizing(self, image, config):
+        """The thread's API with config applied and image set, restored afterwards"""
+        oem, psm, variables = parse_config(config)
+        api = self._api(oem)
+        if isinstance(image, np.ndarray):
+            image = Image.fromarray(image)
+
+        # Variables persist on the API, so put back whatever this call changed
+        previous = {name: api.GetVariableAsString(name) or '' for name in variables}
+        try:
+            api.SetPageSegMode(psm)
+            for name, value in variables.items():
+                api.SetVariable(name, value)
+            api.SetImage(image)
+            yield api
+        finally:
+            for name, value in previous.items():
+                api.SetVariable(name, value)
+            api.Clear()
+
+    def image_to_string(self, image, config=''):
+        with self._recognizing(image, config) as api:
+            return api.GetUTF8Text()
+
+    def image_to_chars(self, image, config=''):
+        with self._recognizing(image, config) as api:
+            api.Recognize()
+            iterator = api.GetIterator()
+            if iterator is None:
+                return []
+            level = tesserocr.RIL.SYMBOL
+            chars = []
+            for symbol in tesserocr.iterate_level(iterator, level):
+                char = symbol.GetUTF8Text(level)
+                if char and not char.isspace():
+                    chars.append((char, symbol.Confidence(level)))
+            return chars
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def _create_engine(name, ai_settings):
+    if name == 'tesserocr':
+        try:
+            return TesserocrEngine(ai_settings.get('TESSDATA_PATH'), ai_settings.get('OCR_LANGUAGE', 'eng'))
+        except (ImportError, RuntimeError) as e:
+            logger.warning(f"tesserocr unavailable ({e}), falling back to pytesseract")
+            name = 'pytesseract'
+    if name == 'pytesseract':
+        return PytesseractEngine(ai_settings.get('TESSERACT_PATH'))
+    raise ValueError(f"Unknown OCR engine: {name}")
+
+
+def get_ocr_engine(name=None):
+    """The process-wide engine for AI_SETTINGS['OCR_ENGINE'] (or name)"""
+    ai_settings = getattr(settings, 'AI_SETTINGS', {})
+    name = name or ai_settings.get('OCR_ENGINE', 'auto')
+    if name == 'auto':
+        name = 'tesserocr' if tesserocr is not None else 'pytesseract'
+
+    with _engines_lock:
+        if name not in _engines:
+            _engines[name] = _create_engine(name, ai_settings)
+        return _engines[name]
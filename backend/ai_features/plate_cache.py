@@ -0,0 +1,156 @@
+# backend/ai_features/plate_cache.py
+"""
+Perceptual-hash cache of plate OCR results.
+
+Gate cameras resend near-identical frames of a stationary car. The normalized
+plate crop is reduced to a 128-bit perceptual hash (pHash); a new frame reuses
+a cached OCR result when some stored hash is within PLATE_CACHE_MAX_DISTANCE
+bits of it. Only localized crops are cached: one character changes a crop's
+hash by 6-20 bits, but a whole frame's by only a few, so frames of different
+cars in front of a fixed camera would share results. Entries live in a shared Django cache (the 'ocr' alias, Redis in
+production) so every worker benefits.
+
+Near neighbours are found with multi-index hashing: the hash is split into
+max_distance + 1 bands and each band value keeps a short bucket of full hashes.
+Two hashes within max_distance bits agree exactly on at least one band, so one
+get_many over the bands finds every candidate.
+"""
+import logging
+
+import numpy as np
+import cv2
+from django.conf import settings
+from django.core.cache import caches, InvalidCacheBackendError
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = (64, 32)
+HASH_WIDTH = 16
+HASH_HEIGHT = 8
+HASH_BITS = HASH_WIDTH * HASH_HEIGHT
+KEY_PREFIX = 'plate_ocr'
+
+DEFAULT_CACHE_SETTINGS = {
+    'PLATE_CACHE_ENABLED': True,
+    'PLATE_CACHE_ALIAS': 'ocr',
+    'PLATE_CACHE_TTL': 300,
+    'PLATE_CACHE_MAX_DISTANCE': 5,
+    'PLATE_CACHE_BUCKET_SIZE': 32,
+}
+
+
+def plate_hash(image):
+    """128-bit pHash: signs of the low-frequency DCT of a 64x32 thumbnail against their median"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
+    thumbnail = cv2.resize(gray, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32)
+    coefficients = cv2.dct(thumbnail)[:HASH_HEIGHT, :HASH_WIDTH].flatten()
+    # The DC term only tracks brightness, so it always hashes to 0
+    ac = coefficients[1:]
+    bits = np.concatenate([[False], ac > np.median(ac)])
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class PlateResultCache:
+    """OCR results keyed by plate hash, matched within a Hamming distance"""
+
+    def __init__(self, alias=None, ttl=None, max_distance=None, bucket_size=None, enabled=None):
+        config = {**DEFAULT_CACHE_SETTINGS, **getattr(settings, 'AI_SETTINGS', {})}
+        self.alias = alias or config['PLATE_CACHE_ALIAS']
+        self.ttl = config['PLATE_CACHE_TTL'] if ttl is None else ttl
+        self.max_distance = config['PLATE_CACHE_MAX_DISTANCE'] if max_distance is None else max_distance
+        self.bucket_size = config['PLATE_CACHE_BUCKET_SIZE'] if bucket_size is None else bucket_size
+        self.enabled = config['PLATE_CACHE_ENABLED'] if enabled is None else enabled
+
+    @property
+    def cache(self):
+        try:
+            return caches[self.alias]
+        except InvalidCacheBackendError:
+            return caches['default']
+
+    def _bands(self, value):
+        """(band key, band value) pairs covering all HASH_BITS bits"""
+        count = self.max_distance + 1
+        edges = np.linspace(0, HASH_BITS, count + 1).astype(int)
+        for band, (start, end) in enumerate(zip(edges[:-1], edges[1:])):
+            chunk = (value >> int(start)) & ((1 << int(end - start)) - 1)
+            yield f'{KEY_PREFIX}:band:{count}:{band}:{chunk:x}'
+
+    def _entry_key(self, value):
+        return f'{KEY_PREFIX}:entry:{value:032x}'
+
+    def _count(self, name):
+        key = f'{KEY_PREFIX}:stats:{name}'
+        try:
+            self.cache.add(key, 0, timeout=None)
+            self.cache.incr(key)
+        except Exception as e:
+            logger.warning(f"Plate cache counter {name} not updated: {e}")
+
+    def lookup(self, value):
+        """(result, distance) of the nearest cached hash within max_distance, else (None, None)"""
+        if not self.enabled:
+            return None, None
+        try:
+            buckets = self.cache.get_many(list(self._bands(value)))
+            candidates = {stored for bucket in buckets.values() for stored in bucket}
+            near = sorted(
+                (distance, stored) for stored in candidates
+                if (distance := hamming(value, stored)) <= self.max_distance
+            )
+            if near:
+                entries = self.cache.get_many([self._entry_key(stored) for _, stored in near])
+                for distance, stored in near:
+                    result = entries.get(self._entry_key(stored))
+                    if result is not None:
+                        # Sliding expiry: plates still being scanned stay cached, idle ones age out.
+                        # The bands are refreshed too, or the entry would outlive the way to find it.
+                        for key in [self._entry_key(stored), *self._bands(stored)]:
+                            self.cache.touch(key, self.ttl)
+                        self._count('hits')
+                        return result, distance
+        except Exception as e:
+            logger.warning(f"Plate cache lookup failed: {e}")
+        self._count('misses')
+        return None, None
+
+    def store(self, value, result):
+        """Cache an OCR result under a plate hash"""
+        if not self.enabled:
+            return
+        try:
+            self.cache.set(self._entry_key(value), result, timeout=self.ttl)
+            band_keys = list(self._bands(value))
+            buckets = self.cache.get_many(band_keys)
+            updated = {}
+            for key in band_keys:
+                # Most recent first; the oldest hashes fall off a full bucket
+                bucket = [stored for stored in buckets.get(key, []) if stored != value]
+                updated[key] = [value] + bucket[:self.bucket_size - 1]
+            self.cache.set_many(updated, timeout=self.ttl)
+        except Exception as e:
+            logger.warning(f"Plate cache store failed: {e}")
+
+    def stats(self):
+        try:
+            counts = self.cache.get_many([f'{KEY_PREFIX}:stats:hits', f'{KEY_PREFIX}:stats:misses'])
+        except Exception as e:
+            logger.warning(f"Plate cache stats unavailable: {e}")
+            counts = {}
+        hits = counts.get(f'{KEY_PREFIX}:stats:hits', 0)
+        misses = counts.get(f'{KEY_PREFIX}:stats:misses', 0)
+        return {
+            'enabled': self.enabled,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None,
+            'max_distance': self.max_distance,
+            'ttl': self.ttl,
+        }
+
+    def reset_stats(self):
+        self.cache.delete_many([f'{KEY_PREFIX}:stats:hits', f'{KEY_PREFIX}:stats:misses'])
@@ -0,0 +1,175 @@
+# backend/ai_features/plate_consensus.py
+"""
+Multi-frame plate reading for camera sessions.
+
+A camera posts successive frames of the same vehicle under one session id.
+Each frame gets only PLATE_CONSENSUS_VARIANTS_PER_FRAME OCR variants. The
+schedule rotates through preprocessing methods, so consecutive frames try
+different ones; single stills instead brute-force all 24 variants.
+Every read votes for:
+- its length, weighted by its confidence
+- the character at each position, among reads of that length, weighted by
+  Tesseract's confidence in that character
+
+The consensus is the most voted character per position of the most voted
+length. The session ends once the consensus is stable, or when
+PLATE_CONSENSUS_MAX_FRAMES frames have been spent. Stable means:
+- at least PLATE_CONSENSUS_MIN_FRAMES frames have been seen
+- every position's leading character holds PLATE_CONSENSUS_AGREEMENT of its
+  votes
+- the text did not change with the last frame
+
+Tallies live in the shared cache (PLATE_SESSION_CACHE_ALIAS), so any worker
+can take a session's next frame. Sessions are keyed by user as well as id, so
+one user cannot add frames to, or read, another user's session. Frames of one
+session are expected one at a time, as a camera sends them.
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import caches, InvalidCacheBackendError
+
+from .utils import OCR_CONFIGS, PREPROCESS_METHODS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONSENSUS_SETTINGS = {
+    'PLATE_CONSENSUS_MIN_FRAMES': 3,
+    'PLATE_CONSENSUS_MAX_FRAMES': 10,
+    'PLATE_CONSENSUS_AGREEMENT': 0.6,
+    'PLATE_CONSENSUS_VARIANTS_PER_FRAME': 2,
+    'PLATE_SESSION_CACHE_ALIAS': 'ocr',
+    'PLATE_SESSION_TTL': 120,
+}
+
+# (method index, config index) pairs, every method with the first config before any second config
+VARIANT_SCHEDULE = [(i, j) for j in range(len(OCR_CONFIGS)) for i in range(len(PREPROCESS_METHODS))]
+
+def _config():
+    return {**DEFAULT_CONSENSUS_SETTINGS, **getattr(settings, 'AI_SETTINGS', {})}
+
+
+def frame_variants(frame, per_frame):
+    """The variants OCR'd for a session's frame'th frame (0-based)"""
+    start = frame * per_frame
+    return [VARIANT_SCHEDULE[(start + t) % len(VARIANT_SCHEDULE)] for t in range(per_frame)]
+
+
+class PlateConsensus:
+    """Confidence-weighted length and per-position character votes over a session's frames"""
+
+    def __init__(self, state=None):
+        state = state or {}
+        self.frames = state.get('frames', 0)
+        self.ocr_calls = state.get('ocr_calls', 0)
+        self.lengths = state.get('lengths', {})      # length -> vote weight
+        self.reads = state.get('reads', {})          # length -> reads of that length
+        self.positions = state.get('positions', {})  # length -> [{char: vote weight}] per position
+        self.history = state.get('history', [])      # consensus text after each frame
+
+    def state(self):
+        return {
+            'frames': self.frames,
+            'ocr_calls': self.ocr_calls,
+            'lengths': self.lengths,
+            'reads': self.reads,
+            'positions': self.positions,
+            'history': self.history[-2:],
+        }
+
+    def add_frame(self, reads, ocr_calls=0):
+        """Count one frame's (text, confidence, per-character confidences or None) reads.
+
+        A text read twice in a frame votes once, with its most confident read.
+        """
+        best = {}
+        for text, confidence, char_confidences in reads:
+            if text and confidence >= best.get(text, (-1, None))[0]:
+                best[text] = (confidence, char_confidences or [confidence] * len(text))
+        for text, (confidence, char_confidences) in best.items():
+            length = len(text)
+            self.lengths[length] = self.lengths.get(length, 0) + confidence / 100
+            self.reads[length] = self.reads.get(length, 0) + 1
+            columns = self.positions.setdefault(length, [{} for _ in range(length)])
+            for column, char, char_confidence in zip(columns, text, char_confidences):
+                column[char] = column.get(char, 0) + char_confidence / 100
+        self.frames += 1
+        self.ocr_calls += ocr_calls
+        self.history.append(self.result()['text'])
+
+    def result(self):
+        """{'text', 'confidence', 'agreement'} of the current consensus (text None before any read)"""
+        if not self.lengths:
+            return {'text': None, 'confidence': 0, 'agreement': 0}
+        length = max(self.lengths, key=self.lengths.get)
+        chars, shares, support = [], [], []
+        for column in self.positions[length]:
+            char = max(column, key=column.get)
+            chars.append(char)
+            shares.append(column[char] / sum(column.values()))
+            support.append(column[char])
+        # Confidence-weighted share of this length's reads that back the weakest position
+        return {
+            'text': ''.join(chars),
+            'confidence': round(100 * min(support) / self.reads[length], 2),
+            'agreement': round(min(shares), 3),
+        }
+
+    def stable(self, min_frames, agreement):
+        result = self.result()
+        return (
+            result['text'] is not None
+            and self.frames >= min_frames
+            and result['agreement'] >= agreement
+            and len(self.history) >= 2 and self.history[-1] == self.history[-2]
+        )
+
+
+def _session_store(alias):
+    try:
+        return caches[alias]
+    except InvalidCacheBackendError:
+        return caches['default']
+
+
+def _session_key(user_id, session_id):
+    return f'ai_features:plate_session:{user_id}:{session_id}'
+
+
+def submit_frame(user_id, session_id, image_array, processor):
+    """OCR one frame of a session and update its consensus.
+
+    Returns {'session_id', 'frames', 'ocr_calls', 'done', 'stable', 'consensus', 'ocr'}.
+    A done session is removed from the cache; the next frame with the same id starts over.
+    """
+    config = _config()
+    store = _session_store(config['PLATE_SESSION_CACHE_ALIAS'])
+    key = _session_key(user_id, session_id)
+    consensus = PlateConsensus(store.get(key))
+
+    variants = frame_variants(consensus.frames, config['PLATE_CONSENSUS_VARIANTS_PER_FRAME'])
+    # Near-identical frames would otherwise replay the cached read instead of casting a fresh vote
+    ocr_result = processor.extract_text(image_array, variants=variants, use_cache=False)
+    reads = [(plate['text'], plate['confidence'], plate.get('char_confidences')) for plate in ocr_result.get('plates', [])]
+    ocr_calls = sum(1 for variant in ocr_result.get('variants', []) if variant['status'] != 'cancelled')
+    consensus.add_frame(reads, ocr_calls)
+
+    stable = consensus.stable(config['PLATE_CONSENSUS_MIN_FRAMES'], config['PLATE_CONSENSUS_AGREEMENT'])
+    done = stable or consensus.frames >= config['PLATE_CONSENSUS_MAX_FRAMES']
+    if done:
+        store.delete(key)
+    else:
+        store.set(key, consensus.state(), timeout=config['PLATE_SESSION_TTL'])
+
+    return {
+        'session_id': session_id,
+        'frames': consensus.frames,
+        'ocr_calls': consensus.ocr_calls,
+        'done': done,
+        'stable': stable,
+        'consensus': consensus.result(),
+        'ocr': {
+            'variants': ocr_result.get('variants', []),
+            'total_ms': ocr_result.get('total_ms'),
+        },
+    }
@@ -0,0 +1,288 @@
+# backend/ai_features/plate_lookup.py
+"""
+In-memory plate -> vehicle lookup that tolerates OCR confusions.
+
+Tesseract commonly swaps look-alike characters (O/0, I/1, B/8, S/5, ...).
+Every plate is reduced to its confusion skeleton: the plate with each
+character replaced by a representative of its look-alike class, so OCR0 and
+0CRO share the skeleton 0CR0. Each organization's shard files its plates
+under the skeleton and every one-character deletion of it (a SymSpell-style
+deletion neighbourhood). A read is resolved in two steps:
+- a handful of dict lookups find every plate in scope that is at most one
+  real edit plus any number of look-alike swaps away
+- a weighted edit distance over the confusion matrix ranks those candidates.
+  Likely swaps cost less than a full substitution, and candidates above
+  PLATE_CANDIDATE_MAX_COST are dropped.
+
+resolve_vehicle() only hands back a vehicle when the best match costs at most
+PLATE_MATCH_MAX_COST, which by default admits look-alike swaps but no real
+edit. A dearer match (one genuinely different character) is returned as an
+unverified candidate for a guard to confirm, and the scan is logged without a
+vehicle.
+
+The table is kept fresh by Vehicle signals. Like the face index, other
+processes notice changes through a version counter in the shared
+INDEX_VERSION_CACHE_ALIAS cache (see index_version).
+"""
+import logging
+import threading
+
+from django.conf import settings
+from vehicles.models import normalize_plate
+
+from .index_version import SharedVersion
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'ai_features:plate_lookup_version'
+
+DEFAULT_LOOKUP_SETTINGS = {
+    'PLATE_LOOKUP_IN_MEMORY': True,
+    'PLATE_MATCH_MAX_COST': 0.8,
+    'PLATE_CANDIDATE_MAX_COST': 1.0,
+}
+
+# Substitution cost of characters OCR mistakes for each other (a full substitution costs 1)
+CONFUSION_COSTS = {
+    ('O', '0'): 0.2, ('D', '0'): 0.4, ('Q', '0'): 0.4, ('D', 'O'): 0.4, ('Q', 'O'): 0.4,
+    ('I', '1'): 0.2, ('L', '1'): 0.4, ('T', '1'): 0.5, ('I', 'L'): 0.4, ('J', '1'): 0.5,
+    ('B', '8'): 0.2, ('S', '5'): 0.3, ('Z', '2'): 0.3, ('G', '6'): 0.4, ('A', '4'): 0.5,
+    ('U', 'V'): 0.5, ('E', 'F'): 0.6, ('M', 'N'): 0.6,
+}
+
+
+def lookup_settings():
+    return {**DEFAULT_LOOKUP_SETTINGS, **getattr(settings, 'AI_SETTINGS', {})}
+
+
+def _confusion_classes():
+    """Map each character to a representative of its look-alike class (union-find over CONFUSION_COSTS)"""
+    parent = {}
+
+    def find(char):
+        while parent.setdefault(char, char) != char:
+            char = parent[char]
+        return char
+
+    for a, b in CONFUSION_COSTS:
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+    return {char: find(char) for char in parent}
+
+
+SKELETON_TABLE = str.maketrans(_confusion_classes())
+SUBSTITUTION_COSTS = {**CONFUSION_COSTS, **{(b, a): cost for (a, b), cost in CONFUSION_COSTS.items()}}
+
+
+def plate_skeleton(normalized):
+    return normalized.translate(SKELETON_TABLE)
+
+
+def _neighbourhood(skeleton):
+    """The skeleton and every copy with one character deleted.
+
+    Two skeletons within one edit share a key, so one lookup per key finds every
+    plate one real substitution, insertion or deletion away (plus any number of
+    look-alike swaps) without scanning the table.
+    """
+    return {skeleton} | {skeleton[:i] + skeleton[i + 1:] for i in range(len(skeleton))}
+
+
+def confusion_distance(a, b, max_cost=None):
+    """Weighted edit distance: look-alike swaps per CONFUSION_COSTS, other edits 1"""
+    if a == b:
+        return 0.0
+    previous = [float(j) for j in range(len(b) + 1)]
+    for i, char_a in enumerate(a, 1):
+        current = [float(i)]
+        for j, char_b in enumerate(b, 1):
+            substitution = 0.0 if char_a == char_b else SUBSTITUTION_COSTS.get((char_a, char_b), 1.0)
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + substitution))
+        if max_cost is not None and min(current) > max_cost:
+            return min(current)
+        previous = current
+    return previous[-1]
+
+
+class PlateLookup:
+    """Registered plates, sharded by organization and indexed by skeleton deletion neighbourhood"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._vehicles = {}  # normalized plate -> {vehicle_id: org_id}
+        self._plates = {}    # vehicle_id -> normalized plate
+        # org_id -> {skeleton or skeleton minus one character -> plate, or tuple of plates on collisions}.
+        # Around 11 keys per plate, so bare strings instead of containers keep 100k plates compact.
+        self._shards = {}
+        self._loaded = False
+        self._version = None
+        self.version = SharedVersion(VERSION_KEY)
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def __len__(self):
+        return len(self._plates)
+
+    def load(self, rows):
+        """Replace the table with (vehicle_id, plate, org_id) rows"""
+        with self._lock:
+            self._vehicles, self._plates, self._shards = {}, {}, {}
+            for vehicle_id, plate, org_id in rows:
+                self._add(vehicle_id, plate, org_id)
+            self._loaded = True
+
+    def load_from_db(self):
+        from vehicles.models import Vehicle
+
+        version = self.version.get()
+        rows = Vehicle.objects.exclude(plate_normalized='').values_list('id', 'plate_normalized', 'org_id')
+        self.load(rows.iterator())
+        self._version = version
+
+    def ensure_loaded(self):
+        """Load on first use, and reload when another process changed vehicles"""
+        if not self._loaded or self.version.is_stale(self._version):
+            self.load_from_db()
+
+    def _add(self, vehicle_id, plate, org_id):
+        normalized = normalize_plate(plate)
+        if not normalized:
+            return
+        self._plates[vehicle_id] = normalized
+        vehicles = self._vehicles.setdefault(normalized, {})
+        if org_id not in vehicles.values():
+            shard = self._shards.setdefault(org_id, {})
+            for key in _neighbourhood(plate_skeleton(normalized)):
+                current = shard.get(key)
+                if current is None:
+                    shard[key] = normalized
+                else:
+                    shard[key] = (current, normalized) if isinstance(current, str) else current + (normalized,)
+        vehicles[vehicle_id] = org_id
+
+    def _remove(self, vehicle_id):
+        normalized = self._plates.pop(vehicle_id, None)
+        if normalized is None:
+            return
+        vehicles = self._vehicles[normalized]
+        org_id = vehicles.pop(vehicle_id)
+        if not vehicles:
+            del self._vehicles[normalized]
+        if org_id in vehicles.values():
+            return
+        shard = self._shards[org_id]
+        for key in _neighbourhood(plate_skeleton(normalized)):
+            current = shard[key]
+            remaining = () if isinstance(current, str) else tuple(plate for plate in current if plate != normalized)
+            if not remaining:
+                del shard[key]
+            else:
+                shard[key] = remaining[0] if len(remaining) == 1 else remaining
+        if not shard:
+            del self._shards[org_id]
+
+    def add(self, vehicle_id, plate, org_id=None):
+        """Insert or replace a vehicle's plate"""
+        with self._lock:
+            self._remove(vehicle_id)
+            self._add(vehicle_id, plate, org_id)
+
+    def remove(self, vehicle_id):
+        with self._lock:
+            self._remove(vehicle_id)
+
+    def nearest(self, text, k=5, max_cost=None, org_ids=None):
+        """Up to k registered plates within max_cost of an OCR read, cheapest first.
+
+        org_ids limits the search to those organizations' shards; None searches all.
+        Each match is {'vehicle_id', 'plate', 'cost', 'exact'}; a plate registered
+        to several vehicles reports the oldest one in scope.
+        """
+        if max_cost is None:
+            max_cost = lookup_settings()['PLATE_CANDIDATE_MAX_COST']
+        normalized = normalize_plate(text)
+        if not normalized:
+            return []
+        keys = _neighbourhood(plate_skeleton(normalized))
+        with self._lock:
+            shards = self._shards.values() if org_ids is None else [self._shards.get(org_id, {}) for org_id in org_ids]
+            plates = set()
+            for shard in shards:
+                for key in keys:
+                    found = shard.get(key)
+                    if found is None:
+                        continue
+                    if isinstance(found, str):
+                        plates.add(found)
+                    else:
+                        plates.update(found)
+            scored = sorted(
+                (cost, plate) for cost, plate in
+                ((confusion_distance(normalized, plate, max_cost), plate) for plate in plates)
+                if cost <= max_cost
+            )[:k]
+            matches = []
+            for cost, plate in scored:
+                vehicle_ids = [
+                    vehicle_id for vehicle_id, org_id in self._vehicles[plate].items()
+                    if org_ids is None or org_id in org_ids
+                ]
+                matches.append({'vehicle_id': min(vehicle_ids), 'plate': plate, 'cost': round(cost, 2), 'exact': cost == 0})
+        return matches
+
+    def resolve(self, text, max_cost=None, org_ids=None):
+        """Best vehicle for an OCR read, or None if there is no unique match"""
+        found = self.nearest(text, k=2, max_cost=max_cost, org_ids=org_ids)
+        if not found:
+            return None
+        if len(found) > 1 and found[1]['cost'] == found[0]['cost']:
+            # Two registered plates are equally close; guessing could log the wrong car
+            logger.info(f"Ambiguous plate read {text}: {[match['plate'] for match in found]}")
+            return None
+        return found[0]
+
+    def mark_changed(self):
+        """Publish a vehicle change so other processes reload their table"""
+        previous = self._version
+        version = self.version.bump()
+        if isinstance(previous, int) and version == previous + 1:
+            self._version = version
+        else:
+            self._loaded = False
+
+
+plate_lookup = PlateLookup()
+
+
+def resolve_vehicle(text, max_cost=None, org_ids=None):
+    """Match an OCR read to a vehicle in org_ids (None = all): (vehicle_id or None, match details or None).
+
+    A match dearer than PLATE_MATCH_MAX_COST comes back with verified=False and
+    no vehicle_id, so the scan is not attributed to that vehicle.
+    """
+    config = lookup_settings()
+    if not config['PLATE_LOOKUP_IN_MEMORY']:
+        from vehicles.models import Vehicle
+
+        # Indexed exact match only
+        normalized = normalize_plate(text)
+        vehicles = Vehicle.objects.filter(plate_normalized=normalized)
+        if org_ids is not None:
+            vehicles = vehicles.filter(org_id__in=org_ids)
+        vehicle_id = vehicles.order_by('id').values_list('id', flat=True).first()
+        if vehicle_id is None:
+            return None, None
+        return vehicle_id, {'vehicle_id': vehicle_id, 'plate': normalized, 'cost': 0.0, 'exact': True, 'verified': True}
+
+    if max_cost is None:
+        max_cost = config['PLATE_MATCH_MAX_COST']
+    plate_lookup.ensure_loaded()
+    match = plate_lookup.resolve(text, max(max_cost, config['PLATE_CANDIDATE_MAX_COST']), org_ids)
+    if match is None:
+        return None, None
+    if match['cost'] > max_cost:
+        return None, {**match, 'verified': False}
+    return match['vehicle_id'], {**match, 'verified': True}
@@ -0,0 +1,160 @@
+# backend/ai_features/plates.py
+"""
+Plate localization ahead of OCR.
+
+A black-hat transform picks out dark characters on a light plate, a horizontal
+gradient and closing merge them into plate-shaped blobs, and contours are kept
+when their rotated box has a plate-like aspect ratio. Each candidate is
+deskewed with a perspective warp and normalized to a fixed height, so
+Tesseract only reads small, level crops instead of the whole frame. An optional
+Haar cascade (AI_SETTINGS['PLATE_CASCADE']) adds its detections as candidates.
+"""
+import logging
+import threading
+
+import numpy as np
+import cv2
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOCALIZATION_SETTINGS = {
+    'PLATE_CROP_HEIGHT': 64,
+    'PLATE_MAX_CANDIDATES': 3,
+    'PLATE_ASPECT_RANGE': (2.0, 6.5),
+    'PLATE_MIN_AREA': 0.002,
+    'PLATE_CASCADE': None,
+}
+
+# Room kept around a candidate so edge characters are not clipped
+CROP_PADDING = 0.15
+
+_cascades = {}
+_cascades_lock = threading.Lock()
+
+
+def _config():
+    return {**DEFAULT_LOCALIZATION_SETTINGS, **getattr(settings, 'AI_SETTINGS', {})}
+
+
+def _cascade(path):
+    with _cascades_lock:
+        if path not in _cascades:
+            classifier = cv2.CascadeClassifier(path)
+            if classifier.empty():
+                logger.warning(f"Could not load plate cascade {path}")
+                classifier = None
+            _cascades[path] = classifier
+        return _cascades[path]
+
+
+def _order_points(points):
+    """Box corners as top-left, top-right, bottom-right, bottom-left"""
+    points = points[np.argsort(points[:, 0])]
+    left, right = points[:2], points[2:]
+    top_left, bottom_left = left[np.argsort(left[:, 1])]
+    top_right, bottom_right = right[np.argsort(right[:, 1])]
+    return np.array([top_left, top_right, bottom_right, bottom_left], dtype=np.float32)
+
+
+def _plate_rect(rect):
+    """minAreaRect result with width along the plate's long side"""
+    (cx, cy), (w, h), angle = rect
+    if h > w:
+        w, h, angle = h, w, angle - 90
+    return (cx, cy), (w, h), angle
+
+
+def deskew_crop(gray, rect, crop_height):
+    """Warp a rotated rectangle (padded) to a level crop crop_height pixels tall"""
+    (cx, cy), (w, h), angle = _plate_rect(rect)
+    pad = CROP_PADDING * h
+    corners = _order_points(cv2.boxPoints(((cx, cy), (w + 2 * pad, h + 2 * pad), angle)))
+    width = max(1, int(round(crop_height * (w + 2 * pad) / (h + 2 * pad))))
+    target = np.array([[0, 0], [width - 1, 0], [width - 1, crop_height - 1], [0, crop_height - 1]], dtype=np.float32)
+    matrix = cv2.getPerspectiveTransform(corners, target)
+    return cv2.warpPerspective(gray, matrix, (width, crop_height), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+
+
+def _refine_rect(blackhat, rect):
+    """Re-fit the box to the dark strokes inside it.
+
+    The horizontal closing biases blob angles towards level; the character
+    pixels themselves give the real skew.
+    """
+    (cx, cy), (w, h), angle = rect
+    region = np.zeros(blackhat.shape, dtype=np.uint8)
+    cv2.fillPoly(region, [cv2.boxPoints(((cx, cy), (w * 1.2, h * 1.6), angle)).astype(np.int32)], 255)
+    values = blackhat[region > 0].reshape(-1, 1)
+    if values.size < 64:
+        return rect
+    threshold, _ = cv2.threshold(values, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    points = cv2.findNonZero(((blackhat > threshold) & (region > 0)).astype(np.uint8))
+    if points is None or len(points) < 32:
+        return rect
+    refined = _plate_rect(cv2.minAreaRect(points))
+    return refined if refined[1][1] >= 8 else rect
+
+
+def _contour_candidates(gray, blackhat, rect_kernel, aspect_range, min_area):
+    height, width = gray.shape[:2]
+
+    # Text has strong vertical edges; close them horizontally into one blob per plate
+    gradient = np.absolute(cv2.Sobel(blackhat, cv2.CV_32F, 1, 0, ksize=-1))
+    gradient = cv2.normalize(gradient, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+    gradient = cv2.GaussianBlur(gradient, (5, 5), 0)
+    closed = cv2.morphologyEx(gradient, cv2.MORPH_CLOSE, rect_kernel)
+    _, mask = cv2.threshold(closed, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    mask = cv2.erode(mask, None, iterations=2)
+    mask = cv2.dilate(mask, None, iterations=2)
+
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    candidates = []
+    for contour in contours:
+        rect = _plate_rect(cv2.minAreaRect(contour))
+        (_, _), (w, h), _ = rect
+        if h < 8 or w * h < min_area * width * height:
+            continue
+        aspect = w / h
+        if aspect_range[0] <= aspect <= aspect_range[1]:
+            # Prefer large, well-filled boxes
+            fill = cv2.contourArea(contour) / (w * h)
+            refined = _refine_rect(blackhat, rect)
+            if not aspect_range[0] <= refined[1][0] / refined[1][1] <= aspect_range[1]:
+                refined = rect
+            candidates.append((w * h * fill, refined))
+    return candidates
+
+
+def localize_plates(image_array, max_candidates=None, crop_height=None):
+    """Candidate plate crops, best first: [{'image', 'box', 'angle', 'aspect'}]"""
+    config = _config()
+    max_candidates = max_candidates or config['PLATE_MAX_CANDIDATES']
+    crop_height = crop_height or config['PLATE_CROP_HEIGHT']
+    gray = cv2.cvtColor(image_array, cv2.COLOR_BGR2GRAY) if len(image_array.shape) == 3 else image_array
+
+    # Character strokes are small and dark: black-hat keeps them, drops the background
+    kernel_w = max(9, gray.shape[1] // 40) | 1
+    rect_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (kernel_w, max(3, kernel_w // 3)))
+    blackhat = cv2.morphologyEx(gray, cv2.MORPH_BLACKHAT, rect_kernel)
+
+    candidates = _contour_candidates(gray, blackhat, rect_kernel, config['PLATE_ASPECT_RANGE'], config['PLATE_MIN_AREA'])
+    if config['PLATE_CASCADE']:
+        cascade = _cascade(config['PLATE_CASCADE'])
+        if cascade is not None:
+            for x, y, w, h in cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=4):
+                # Detector hits rank ahead of contour guesses of the same size
+                candidates.append((2.0 * w * h, ((x + w / 2, y + h / 2), (float(w), float(h)), 0.0)))
+
+    candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+    plates = []
+    for _, rect in candidates[:max_candidates]:
+        (cx, cy), (w, h), angle = rect
+        x, y, box_w, box_h = cv2.boundingRect(cv2.boxPoints(rect).astype(np.int32))
+        plates.append({
+            'image': deskew_crop(gray, rect, crop_height),
+            'box': [int(x), int(y), int(box_w), int(box_h)],
+            'angle': round(float(angle), 1),
+            'aspect': round(float(w / h), 2),
+        })
+    return plates
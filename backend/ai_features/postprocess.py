@@ -0,0 +1,101 @@
+# backend/ai_features/postprocess.py
+"""
+Post-processing of stored scan images.
+
+Scans are first saved as the raw upload, whatever its resolution. Once the row
+is committed, a background task (tasks.queue) makes two derived copies:
+- an archive copy: longest side at most SCAN_ARCHIVE_MAX_SIDE, re-encoded as
+  JPEG or WebP. It replaces the row's image ref.
+- a small thumbnail for list views.
+
+The raw upload is kept (raw_image_ref) only when SCAN_KEEP_ORIGINALS is set.
+Otherwise it loses its last reference, and prune_blobs deletes it once it is
+past its grace period.
+"""
+import io
+import logging
+
+from django.apps import apps
+from django.conf import settings
+from PIL import Image, ImageOps
+
+from tasks.queue import enqueue
+from .blobs import blob_store
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POSTPROCESS_SETTINGS = {
+    'SCAN_ARCHIVE_MAX_SIDE': 1280,
+    'SCAN_ARCHIVE_FORMAT': 'JPEG',
+    'SCAN_ARCHIVE_QUALITY': 80,
+    'SCAN_THUMBNAIL_SIZE': 160,
+    'SCAN_KEEP_ORIGINALS': False,
+}
+
+# Model label -> image field whose *_ref gets an archive copy and thumbnail
+SCAN_IMAGE_FIELDS = {
+    'ai_features.FaceAttendanceLog': 'scanned_image',
+    'ai_features.LicensePlateRecord': 'original_image',
+}
+
+def _config():
+    return {**DEFAULT_POSTPROCESS_SETTINGS, **getattr(settings, 'AI_SETTINGS', {})}
+
+
+def _encode(image, image_format, quality):
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, quality=quality, optimize=image_format == 'JPEG')
+    return buffer.getvalue()
+
+
+def derive_images(data, max_side=None, thumbnail_size=None, image_format=None, quality=None):
+    """(archive bytes, thumbnail bytes) of an encoded image"""
+    config = _config()
+    max_side = max_side or config['SCAN_ARCHIVE_MAX_SIDE']
+    thumbnail_size = thumbnail_size or config['SCAN_THUMBNAIL_SIZE']
+    image_format = (image_format or config['SCAN_ARCHIVE_FORMAT']).upper()
+    quality = quality or config['SCAN_ARCHIVE_QUALITY']
+
+    with Image.open(io.BytesIO(data)) as source:
+        source_format = source.format
+        # Phone cameras store rotation in EXIF; bake it in before EXIF is dropped
+        image = ImageOps.exif_transpose(source).convert('RGB')
+    archive = image.copy()
+    archive.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+    encoded = _encode(archive, image_format, quality)
+    if archive.size == image.size and source_format == image_format and len(data) <= len(encoded):
+        # Already small enough in the archive format; re-encoding would only lose quality
+        encoded = data
+    thumbnail = image
+    thumbnail.thumbnail((thumbnail_size, thumbnail_size), Image.Resampling.LANCZOS)
+    return encoded, _encode(thumbnail, image_format, quality)
+
+
+def process_scan_image(label, pk):
+    """Replace a scan's raw image with its archive copy and add a thumbnail (idempotent)"""
+    model = apps.get_model(label)
+    field = SCAN_IMAGE_FIELDS[label]
+    ref_field = f'{field}_ref'
+    row = model.objects.filter(pk=pk).only('pk', ref_field, 'thumbnail_ref', 'raw_image_ref').first()
+    if row is None or row.thumbnail_ref or not getattr(row, ref_field):
+        return False
+
+    raw_ref = getattr(row, ref_field)
+    archive, thumbnail = derive_images(blob_store.read(raw_ref))
+    setattr(row, ref_field, blob_store.put(archive))
+    row.thumbnail_ref = blob_store.put(thumbnail)
+    if _config()['SCAN_KEEP_ORIGINALS']:
+        row.raw_image_ref = raw_ref
+    row.save(update_fields=[ref_field, 'thumbnail_ref', 'raw_image_ref'])
+    return True
+
+
+def schedule_scan_processing(instance):
+    """Queue post-processing of a scan's image; it runs once the surrounding transaction commits"""
+    enqueue('ai_features.process_scan_image', label=instance._meta.label, pk=instance.pk)
+
+
+def schedule_batch_processing(model, pks):
+    """Queue post-processing of several scans' images as one task, for rows written without post_save"""
+    if pks:
+        enqueue('ai_features.process_scan_images', label=model._meta.label, pks=list(pks))
@@ -0,0 +1,166 @@
+# backend/ai_features/preprocess.py
+"""
+Shared OCR preprocessing: one lazy DAG of named stages per image.
+
+    source ── gray ─┬─ blur ─┬─ adaptive_thresh
+                    │        └─ otsu_thresh ── morphological
+                    ├─ edges
+                    ├─ enhanced
+                    └─ bilateral ── bilateral_otsu
+
+stages = Preprocessor(image); stages['otsu_thresh'] computes that stage and
+whatever it depends on. Every result is memoized for the life of the
+Preprocessor, so a request asking for several variants converts to grayscale
+and blurs once. Stages nobody asks for are never computed. 'original' is the
+grayscale image, as LicensePlateProcessor names it.
+
+Each stage writes into a dst= array of its own instead of letting OpenCV
+allocate intermediates. Given a BufferPool, those arrays come from per-thread
+free lists and go back on close(), so steady traffic on same-sized crops stops
+allocating. Without a pool, the arrays belong to the caller.
+"""
+import threading
+import time
+
+import cv2
+import numpy as np
+
+ALIASES = {'original': 'gray'}
+
+MORPH_KERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+
+
+def _gray(stages, source):
+    if source.ndim == 2:
+        # Already grayscale (plate crops): no copy
+        return source
+    if source.shape[2] == 4:
+        code = cv2.COLOR_BGRA2GRAY if stages.color_order == 'BGR' else cv2.COLOR_RGBA2GRAY
+    else:
+        code = cv2.COLOR_BGR2GRAY if stages.color_order == 'BGR' else cv2.COLOR_RGB2GRAY
+    return cv2.cvtColor(source, code, dst=stages.buffer(source.shape[:2], source.dtype))
+
+
+def _blur(stages, gray):
+    return cv2.GaussianBlur(gray, (5, 5), 0, dst=stages.buffer(gray.shape))
+
+
+def _adaptive_thresh(stages, blur):
+    return cv2.adaptiveThreshold(
+        blur, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2, dst=stages.buffer(blur.shape)
+    )
+
+
+def _otsu(stages, image):
+    return cv2.threshold(image, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=stages.buffer(image.shape))[1]
+
+
+def _morphological(stages, otsu):
+    return cv2.morphologyEx(otsu, cv2.MORPH_OPEN, MORPH_KERNEL, dst=stages.buffer(otsu.shape), iterations=1)
+
+
+def _edges(stages, gray):
+    return cv2.Canny(gray, 50, 150, edges=stages.buffer(gray.shape))
+
+
+def _enhanced(stages, gray):
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    return clahe.apply(gray, dst=stages.buffer(gray.shape))
+
+
+def _bilateral(stages, gray):
+    return cv2.bilateralFilter(gray, 11, 17, 17, dst=stages.buffer(gray.shape))
+
+
+# name -> (input stages, function(preprocessor, *inputs))
+STAGES = {
+    'gray': (('source',), _gray),
+    'blur': (('gray',), _blur),
+    'adaptive_thresh': (('blur',), _adaptive_thresh),
+    'otsu_thresh': (('blur',), _otsu),
+    'morphological': (('otsu_thresh',), _morphological),
+    'edges': (('gray',), _edges),
+    'enhanced': (('gray',), _enhanced),
+    'bilateral': (('gray',), _bilateral),
+    'bilateral_otsu': (('bilateral',), _otsu),
+}
+
+
+class BufferPool:
+    """Per-thread free lists of arrays by (shape, dtype), at most max_buffers per thread"""
+
+    def __init__(self, max_buffers=64):
+        self.max_buffers = max_buffers
+        self._local = threading.local()
+
+    def _free(self):
+        if not hasattr(self._local, 'free'):
+            self._local.free, self._local.count = {}, 0
+        return self._local.free
+
+    def acquire(self, shape, dtype=np.uint8):
+        """(array, freshly allocated?)"""
+        free = self._free().get((tuple(shape), np.dtype(dtype)))
+        if free:
+            self._local.count -= 1
+            return free.pop(), False
+        return np.empty(shape, dtype), True
+
+    def release(self, array):
+        free = self._free()
+        if self._local.count >= self.max_buffers:
+            # Crop widths vary; drop rather than hoard every size ever seen
+            return
+        free.setdefault((array.shape, array.dtype), []).append(array)
+        self._local.count += 1
+
+
+class Preprocessor:
+    """Memoized preprocessing stages of one image (see the module docstring)"""
+
+    def __init__(self, image, color_order='BGR', pool=None):
+        self.color_order = color_order
+        self.pool = pool
+        self.timings = {}      # stage -> ms spent computing it
+        self.allocated = 0     # bytes of newly allocated stage buffers
+        self._results = {'source': image}
+        self._owned = []
+
+    def __getitem__(self, name):
+        name = ALIASES.get(name, name)
+        if name not in self._results:
+            inputs, compute = STAGES[name]
+            args = [self[input_name] for input_name in inputs]
+            start = time.perf_counter()
+            self._results[name] = compute(self, *args)
+            self.timings[name] = round((time.perf_counter() - start) * 1000, 3)
+        return self._results[name]
+
+    def get(self, *names):
+        return [self[name] for name in names]
+
+    def buffer(self, shape, dtype=np.uint8):
+        """A dst= array for a stage, recycled through the pool if there is one"""
+        if self.pool is not None:
+            array, fresh = self.pool.acquire(shape, dtype)
+            self._owned.append(array)
+        else:
+            array, fresh = np.empty(shape, dtype), True
+        if fresh:
+            self.allocated += array.nbytes
+        return array
+
+    def close(self, recycle=True):
+        """Give the buffers back to the pool. recycle=False drops them instead,
+        when something may still be reading them (e.g. a cancelled OCR call that had already started)."""
+        if recycle and self.pool is not None:
+            for array in self._owned:
+                self.pool.release(array)
+        self._owned = []
+        self._results = {'source': self._results['source']}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,8 +1,13 @@
 # backend/ai_features/signals.py
-from django.db.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
-from .models import FaceEncoding
+from .models import FaceAttendanceLog, FaceEncoding, LicensePlateRecord
+from .face_index import face_index
+from .plate_lookup import plate_lookup
+from vehicles.models import Vehicle
+from .postprocess import schedule_scan_processing
 
 User = get_user_model()
 
@@ -12,4 +17,85 @@ def create_face_encoding_placeholder(sender, instance, created, **kwargs):
     if created and instance.role in ['GUARD', 'DRIVER']:
         # Don't create actual encoding, just mark as not registered
         instance.is_face_registered = False
-        instance.save(update_fields=['is_face_registered'])
\ No newline at end of file
+        instance.save(update_fields=['is_face_registered'])
+
+@receiver(post_save, sender=User)
+def sync_face_index_on_user_save(sender, instance, created, update_fields=None, **kwargs):
+    """Move a user's encoding to their new organization's shard"""
+    if created or (update_fields is not None and 'org' not in update_fields):
+        return
+    user_id, org_id = instance.id, instance.org_id
+
+    if face_index.loaded:
+        if face_index.shard_of(user_id, org_id) == org_id:
+            return
+
+        def apply():
+            face_index.move(user_id, org_id)
+            face_index.mark_changed()
+    elif instance.is_face_registered:
+        # Nothing to compare against here; let processes with an index reload
+        apply = face_index.mark_changed
+    else:
+        return
+
+    transaction.on_commit(apply)
+
+@receiver(post_save, sender=FaceEncoding)
+def sync_face_index_on_save(sender, instance, **kwargs):
+    """Keep the in-memory face index in step with saved encodings"""
+    user_id = instance.user_id
+    org_id = instance.user.org_id
+    encoding = instance.encoding if instance.is_active else None
+    samples = instance.samples if instance.sample_count > 1 else None
+
+    def apply():
+        if encoding is not None:
+            face_index.add(user_id, encoding, org_id, samples)
+        else:
+            face_index.remove(user_id)
+        face_index.mark_changed()
+
+    transaction.on_commit(apply)
+
+@receiver(post_delete, sender=FaceEncoding)
+def sync_face_index_on_delete(sender, instance, **kwargs):
+    """Drop deleted encodings from the in-memory face index"""
+    user_id = instance.user_id
+
+    def apply():
+        face_index.remove(user_id)
+        face_index.mark_changed()
+
+    transaction.on_commit(apply)
+
+@receiver(post_save, sender=Vehicle)
+def sync_plate_lookup_on_save(sender, instance, update_fields=None, **kwargs):
+    """Keep the in-memory plate lookup in step with vehicle plates"""
+    if update_fields is not None and not {'license_plate', 'org'} & set(update_fields):
+        return
+    vehicle_id, plate, org_id = instance.id, instance.plate_normalized, instance.org_id
+
+    def apply():
+        plate_lookup.add(vehicle_id, plate, org_id)
+        plate_lookup.mark_changed()
+
+    transaction.on_commit(apply)
+
+@receiver(post_delete, sender=Vehicle)
+def sync_plate_lookup_on_delete(sender, instance, **kwargs):
+    """Drop deleted vehicles from the in-memory plate lookup"""
+    vehicle_id = instance.id
+
+    def apply():
+        plate_lookup.remove(vehicle_id)
+        plate_lookup.mark_changed()
+
+    transaction.on_commit(apply)
+
+@receiver(post_save, sender=FaceAttendanceLog)
+@receiver(post_save, sender=LicensePlateRecord)
+def postprocess_scan_image(sender, instance, created, **kwargs):
+    """Archive copy and thumbnail for newly stored scan images"""
+    if created and not instance.thumbnail_ref:
+        schedule_scan_processing(instance)
@@ -0,0 +1,47 @@
+# backend/ai_features/tasks.py
+"""Background handlers for recognition side effects (see tasks.queue)"""
+from tasks.queue import task
+from .models import FaceAttendanceLog, LicensePlateRecord
+from .postprocess import process_scan_image, schedule_batch_processing
+
+
+@task('ai_features.record_face_attendance')
+def record_face_attendance(logs):
+    """Write the attendance logs of one or more face matches in one INSERT"""
+    created = FaceAttendanceLog.objects.bulk_create([
+        FaceAttendanceLog(
+            user_id=log['user_id'],
+            scan_type=log['scan_type'],
+            confidence_score=log['confidence'],
+            scanned_image_ref=log['image_ref'],
+            verified_by_id=log.get('verified_by_id'),
+        )
+        for log in logs
+    ])
+    # bulk_create sends no post_save, so the scans' image post-processing is queued here
+    schedule_batch_processing(FaceAttendanceLog, [log.pk for log in created if log.scanned_image_ref])
+
+
+@task('ai_features.record_plate_scan')
+def record_plate_scan(detected_plate, confidence, image_ref, entry_type, scanned_by_id, vehicle_id=None):
+    """Write the LicensePlateRecord of a plate scan"""
+    LicensePlateRecord.objects.create(
+        vehicle_id=vehicle_id,
+        detected_plate=detected_plate,
+        confidence_score=confidence,
+        original_image_ref=image_ref,
+        entry_type=entry_type,
+        scanned_by_id=scanned_by_id,
+        verified=vehicle_id is not None,
+    )
+
+
+@task('ai_features.process_scan_image')
+def process_scan_image_task(label, pk):
+    process_scan_image(label, pk)
+
+
+@task('ai_features.process_scan_images')
+def process_scan_images_task(label, pks):
+    for pk in pks:
+        process_scan_image(label, pk)
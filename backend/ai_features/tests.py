@@ -1,22 +1,87 @@
 # backend/ai_features/tests.py
-from django.test import TestCase
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
 from rest_framework.test import APIClient
 from rest_framework import status
-from vehicles.models import Organization, Vehicle
-from .models import FaceEncoding, FaceAttendanceLog, LicensePlateRecord
+from vehicles.models import Organization, Vehicle, normalize_plate
+from .models import FaceEncoding, FaceAttendanceLog, LicensePlateRecord, face_centroid, pack_encoding, unpack_encoding
 from .utils import ImageProcessor, FaceRecognitionProcessor, LicensePlateProcessor
+from .blobs import BlobStore, blob_store, store_image
+from .images import decode_image
+from .postprocess import derive_images, process_scan_image
+from .tasks import record_face_attendance
+from .preprocess import BufferPool, Preprocessor
+from tasks.models import Task
+from tasks.queue import drain
+from .plates import localize_plates
+from .plate_cache import PlateResultCache, hamming, plate_hash
+from .plate_consensus import PlateConsensus, frame_variants
+from .plate_lookup import PlateLookup, confusion_distance, plate_lookup, plate_skeleton, VERSION_KEY as PLATE_LOOKUP_VERSION_KEY
+from .ocr import PytesseractEngine, TesserocrEngine, parse_config, tesserocr
+from .workers import RecognitionBusy, RecognitionPool, detect_and_encode, detect_faces, encode_faces
+from .quality import DEFAULT_QUALITY_SETTINGS, FrameRejected, check_frame
+from .face_index import (
+    FaceIndex, IVFFaceIndex, HNSWFaceIndex, ShardedFaceIndex, create_face_index, face_index, hnswlib, search_scope,
+    VERSION_KEY as FACE_INDEX_VERSION_KEY,
+)
+from .index_version import UNAVAILABLE
 import base64
 import json
+import os
+import pickle
+import tempfile
+import time
 import numpy as np
+import cv2
 from unittest.mock import patch, MagicMock
-from PIL import Image
+from PIL import Image, ImageDraw, ImageFont
 import io
 
 User = get_user_model()
 
+# Plate OCR results and index versions are cached in-process here; OCR results are cleared before each test
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'ocr': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'plate-ocr-tests'},
+    'index': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'index-version-tests'},
+}
+
+def tesseract_data(text, confidence=90):
+    """pytesseract.image_to_data(output_type=DICT) of a read, every word at one confidence"""
+    words = text.split()
+    return {'text': ['', *words], 'conf': [-1, *[confidence] * len(words)]}
+
+def use_temp_blob_storage(test_case):
+    """Point the 'blobs' storage at a temporary directory for one test"""
+    directory = tempfile.TemporaryDirectory()
+    test_case.addCleanup(directory.cleanup)
+    storages = {**settings.STORAGES, 'blobs': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        'OPTIONS': {'location': directory.name},
+    }}
+    override = override_settings(STORAGES=storages)
+    override.enable()
+    test_case.addCleanup(override.disable)
+    return directory.name
+
+def without_quality_gate(test):
+    """Run a test with the face quality gate off, for flat synthetic frames that stand in for faces"""
+    return override_settings(AI_SETTINGS={**settings.AI_SETTINGS, 'FACE_QUALITY': {'ENABLED': False}})(test)
+
+@override_settings(CACHES=TEST_CACHES)
 class AIFeaturesTestCase(TestCase):
     def setUp(self):
+        caches['ocr'].clear()
+        use_temp_blob_storage(self)
+        
         # Create test organization
         self.org = Organization.objects.create(
             name='Test Org',
@@ -64,6 +129,9 @@ class AIFeaturesTestCase(TestCase):
             org=self.org
         )
         
+        # Vehicle signals refresh the lookup on commit, which TestCase never reaches
+        plate_lookup.load_from_db()
+        
         self.client = APIClient()
         
         # Create a test base64 image
@@ -223,6 +291,48 @@ class AIFeaturesTestCase(TestCase):
                 self.assertIn('confidence', data[0])
                 self.assertIn('entry_type', data[0])
     
+    def test_log_endpoints_do_not_select_image_columns(self):
+        """Test list endpoints leave the inline base64 image columns out of their SQL"""
+        from vehicles.models import AttendanceLog, Shift, VehicleVerification
+        FaceAttendanceLog.objects.create(
+            user=self.driver_user, scan_type='CHECK_IN', confidence_score=95.0, scanned_image=self.test_image
+        )
+        LicensePlateRecord.objects.create(
+            vehicle=self.vehicle, detected_plate='TEST123', confidence_score=88.5,
+            original_image=self.test_image, processed_image=self.test_image, entry_type='ENTRY'
+        )
+        shift = Shift.objects.create(
+            user=self.driver_user, shift_type='DRIVER', date=timezone.now().date(),
+            start_time='08:00', end_time='16:00', vehicle=self.vehicle, org=self.org
+        )
+        AttendanceLog.objects.create(user=self.driver_user, action='LOGIN', shift=shift, face_image=self.test_image)
+        VehicleVerification.objects.create(
+            vehicle=self.vehicle, driver=self.driver_user, guard=self.guard_user, shift=shift,
+            license_plate_image=self.test_image, driver_face_image=self.test_image
+        )
+        image_columns = [
+            '"scanned_image"', '"original_image"', '"processed_image"',
+            '"face_image"', '"license_plate_image"', '"driver_face_image"',
+        ]
+        
+        for user, url in [
+            (self.admin_user, '/api/ai/face-attendance-logs/'),
+            (self.admin_user, '/api/ai/license-plate-logs/'),
+            (self.org_manager, '/api/org-dashboard/'),
+        ]:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, **self.get_auth_headers(user))
+            self.assertEqual(response.status_code, 200)
+            sql = '\n'.join(query['sql'] for query in queries.captured_queries)
+            for column in image_columns:
+                self.assertNotIn(column, sql, f'{url} selects {column}')
+        
+        # Images are still there for callers that opt in
+        log = FaceAttendanceLog.objects.with_images().get()
+        with self.assertNumQueries(0):
+            self.assertEqual(log.scanned_image, self.test_image)
+        self.assertEqual(FaceAttendanceLog.objects.get().scanned_image, self.test_image)
+    
     def test_face_registration_validation(self):
         """Test face registration validation"""
         headers = self.get_auth_headers(self.admin_user)
@@ -292,6 +402,358 @@ class AIFeaturesTestCase(TestCase):
         # Should still process even with invalid vehicle_id
         self.assertNotEqual(response.status_code, 400)
     
+    @patch('ai_features.views.face_recognition.face_encodings')
+    @patch('ai_features.views.face_recognition.face_locations')
+    @without_quality_gate
+    def test_face_verification_uses_index(self, mock_locations, mock_encodings):
+        """Test 1:N verification matches against the in-memory face index"""
+        encoding = np.random.rand(128)
+        mock_locations.return_value = [(10, 90, 90, 10)]
+        mock_encodings.return_value = [encoding + 0.001]
+        face_index.load_from_db()
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            FaceEncoding.objects.create(user=self.driver_user, encoding_vector=pack_encoding(encoding))
+        
+        headers = self.get_auth_headers(self.guard_user)
+        response = self.client.post('/api/ai/verify-face/', {
+            'image': self.test_image,
+            'scan_type': 'CHECK_IN'
+        }, **headers)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['match'])
+        self.assertEqual(response.json()['user']['id'], self.driver_user.id)
+        
+        # The attendance log is written by the task queue
+        self.assertFalse(FaceAttendanceLog.objects.filter(user=self.driver_user).exists())
+        self.assertEqual(Task.objects.get(id=response.json()['task_id']).name, 'ai_features.record_face_attendance')
+        drain()
+        self.assertTrue(FaceAttendanceLog.objects.filter(user=self.driver_user).exists())
+    
+    @patch('ai_features.views.face_recognition.face_encodings')
+    @patch('ai_features.views.face_recognition.face_locations')
+    @without_quality_gate
+    def test_face_verification_is_scoped_to_org(self, mock_locations, mock_encodings):
+        """Test guards only match faces registered in their own organization"""
+        encoding = np.random.rand(128)
+        mock_locations.return_value = [(10, 90, 90, 10)]
+        mock_encodings.return_value = [encoding]
+        other_org = Organization.objects.create(name='Other Org', account='OTHER001', website='https://other.com')
+        other_driver = User.objects.create_user(username='other_driver', password='testpass123', role='DRIVER', org=other_org)
+        face_index.load_from_db()
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            FaceEncoding.objects.create(user=other_driver, encoding_vector=pack_encoding(encoding))
+        
+        # Same face enrolled only in another organization: not visible to this guard
+        headers = self.get_auth_headers(self.guard_user)
+        response = self.client.post('/api/ai/verify-face/', {'image': self.test_image}, **headers)
+        self.assertEqual(response.status_code, 404)
+        
+        # Admins search every organization
+        headers = self.get_auth_headers(self.admin_user)
+        response = self.client.post('/api/ai/verify-face/', {'image': self.test_image}, **headers)
+        self.assertEqual(response.json()['user']['id'], other_driver.id)
+        
+        # Moving the user into the guard's organization moves their encoding too
+        with self.captureOnCommitCallbacks(execute=True):
+            other_driver.org = self.org
+            other_driver.save()
+        headers = self.get_auth_headers(self.guard_user)
+        response = self.client.post('/api/ai/verify-face/', {'image': self.test_image}, **headers)
+        self.assertEqual(response.json()['user']['id'], other_driver.id)
+
+    def test_attendance_logs_are_written_in_one_insert(self):
+        """Test a batch's logs are bulk-created and their post-processing queued as one task"""
+        logs = [
+            {'user_id': self.driver_user.id, 'scan_type': 'CHECK_IN', 'confidence': 90.0, 'image_ref': store_image(self.test_image)}
+            for _ in range(3)
+        ]
+        # One INSERT for the logs, one for the post-processing task
+        with self.assertNumQueries(2):
+            record_face_attendance(logs)
+        task = Task.objects.get(name='ai_features.process_scan_images')
+        self.assertEqual(len(task.payload['pks']), 3)
+        drain()
+        self.assertFalse(FaceAttendanceLog.objects.filter(user=self.driver_user, thumbnail_ref='').exists())
+
+    @patch('ai_features.utils.face_recognition.face_encodings')
+    @patch('ai_features.utils.face_recognition.face_locations')
+    @without_quality_gate
+    def test_batch_face_verification(self, mock_locations, mock_encodings):
+        """Test a batch of frames is matched and logged in one request"""
+        encoding = np.random.rand(128)
+        found = iter([[(10, 90, 90, 10)], []])
+
+        def slow_locations(*args, **kwargs):
+            time.sleep(0.1)
+            return next(found)
+
+        mock_locations.side_effect = slow_locations
+        mock_encodings.return_value = [encoding]
+        face_index.load_from_db()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            FaceEncoding.objects.create(user=self.driver_user, encoding_vector=pack_encoding(encoding))
+
+        headers = self.get_auth_headers(self.guard_user)
+        response = self.client.post('/api/ai/verify-faces-batch/', {
+            'images': [self.test_image, self.test_image, 'not-an-image'],
+            'scan_type': 'CHECK_IN'
+        }, format='json', **headers)
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertTrue(results[0]['match'])
+        self.assertEqual(results[0]['user']['id'], self.driver_user.id)
+        self.assertEqual(results[1]['error'], 'No face detected')
+        self.assertIn('error', results[2])
+        self.assertEqual(response.json()['matched'], 1)
+        self.assertIn('total_ms', response.json()['timings'])
+        # Each frame's detection is timed on its own, not from the start of the batch
+        self.assertLess(results[1]['timings']['detect_ms'], 190)
+        drain()
+        log = FaceAttendanceLog.objects.get(user=self.driver_user)
+        # bulk_create skips post_save; the batch task queues the thumbnails itself
+        self.assertTrue(log.thumbnail_ref)
+
+        # Oversized batches are rejected
+        with self.settings(AI_SETTINGS={**settings.AI_SETTINGS, 'MAX_BATCH_IMAGES': 1}):
+            response = self.client.post('/api/ai/verify-faces-batch/', {
+                'images': [self.test_image, self.test_image]
+            }, format='json', **headers)
+        self.assertEqual(response.status_code, 400)
+
+    @patch('ai_features.views.FaceRecognitionProcessor.detect_and_encode_many')
+    def test_face_registration_with_several_samples(self, mock_detect):
+        """Test registration stores every usable sample and matches on their centroid"""
+        samples = [np.random.rand(128) for _ in range(3)]
+        location = (10, 90, 90, 10)
+        mock_detect.return_value = [([location], [samples[0]]), ([], []), ([location], [samples[1]]), ([location], [samples[2]])]
+        headers = self.get_auth_headers(self.admin_user)
+        
+        response = self.client.post('/api/ai/register-face/', {
+            'user_id': self.driver_user.id,
+            'images': [self.test_image] * 4
+        }, format='json', **headers)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['samples'], 3)
+        self.assertEqual(response.json()['rejected'], [{'index': 1, 'error': 'No face detected in image'}])
+        face_data = FaceEncoding.objects.get(user=self.driver_user)
+        self.assertEqual(face_data.sample_count, 3)
+        np.testing.assert_allclose(face_data.samples, samples, rtol=1e-6)
+        np.testing.assert_allclose(face_data.encoding, face_centroid(samples), rtol=1e-6)
+        
+        # No usable sample at all, or more images than allowed
+        mock_detect.return_value = [([], []), ([location, location], samples[:2])]
+        response = self.client.post('/api/ai/register-face/', {
+            'user_id': self.driver_user.id,
+            'images': [self.test_image] * 2
+        }, format='json', **headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(response.json()['rejected']), 2)
+        with self.settings(AI_SETTINGS={**settings.AI_SETTINGS, 'MAX_ENROLLMENT_IMAGES': 1}):
+            response = self.client.post('/api/ai/register-face/', {
+                'images': [self.test_image] * 2
+            }, format='json', **headers)
+        self.assertEqual(response.status_code, 400)
+
+    @patch('ai_features.workers.face_recognition.face_locations')
+    def test_face_verification_quality_gate(self, mock_locations):
+        """Test poor frames get a 422 with the reason, without a detection pass"""
+        headers = self.get_auth_headers(self.guard_user)
+        response = self.client.post('/api/ai/verify-face/', {'image': self.test_image}, **headers)
+        
+        # The flat red frame fails the luminance check first (red weighs little in gray)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.json()['reason'], 'too_dark')
+        mock_locations.assert_not_called()
+        
+        # Batches report the reason per frame
+        response = self.client.post('/api/ai/verify-faces-batch/', {
+            'images': [self.test_image]
+        }, format='json', **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['reason'], 'too_dark')
+        mock_locations.assert_not_called()
+
+    @patch('ai_features.views.FaceRecognitionProcessor.detect_and_encode')
+    def test_face_verification_busy(self, mock_detect):
+        """Test a saturated recognition pool answers 503 with Retry-After"""
+        mock_detect.side_effect = RecognitionBusy('Face recognition is busy, try again shortly', retry_after=2)
+        headers = self.get_auth_headers(self.guard_user)
+        response = self.client.post('/api/ai/verify-face/', {'image': self.test_image}, **headers)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '2')
+
+    @patch('ai_features.ocr.pytesseract.image_to_data')
+    @patch('ai_features.utils.get_ocr_engine', lambda: PytesseractEngine())
+    def test_license_plate_scan_reports_ocr_timings(self, mock_ocr):
+        """Test plate scans match vehicles and report per-variant OCR timings"""
+        mock_ocr.return_value = tesseract_data("TEST123")
+        headers = self.get_auth_headers(self.guard_user)
+        response = self.client.post('/api/ai/scan-license-plate/', {
+            'image': self.test_image,
+            'entry_type': 'ENTRY'
+        }, **headers)
+        
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['plate_number'], 'TEST123')
+        self.assertEqual(data['matched_vehicle']['id'], self.vehicle.id)
+        self.assertIn('early_exit', data['ocr'])
+        self.assertIn('total_ms', data['ocr'])
+        self.assertIn('method', data['ocr']['variants'][0])
+
+    @patch('ai_features.ocr.pytesseract.image_to_data')
+    @patch('ai_features.utils.get_ocr_engine', lambda: PytesseractEngine())
+    def test_license_plate_scan_corrects_confusions(self, mock_ocr):
+        """Test a read with look-alike swaps still matches the registered plate"""
+        mock_ocr.return_value = tesseract_data("TE5T1Z3")
+        headers = self.get_auth_headers(self.guard_user)
+        response = self.client.post('/api/ai/scan-license-plate/', {
+            'image': self.test_image,
+            'entry_type': 'ENTRY'
+        }, **headers)
+        
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['plate_number'], 'TE5T1Z3')
+        self.assertEqual(data['matched_vehicle']['id'], self.vehicle.id)
+        self.assertEqual(data['plate_match']['plate'], 'TEST123')
+        self.assertFalse(data['plate_match']['exact'])
+        self.assertTrue(data['plate_match']['verified'])
+        drain(max_tasks=1)
+        self.assertEqual(LicensePlateRecord.objects.get().vehicle_id, self.vehicle.id)
+
+    @patch('ai_features.ocr.pytesseract.image_to_data')
+    @patch('ai_features.utils.get_ocr_engine', lambda: PytesseractEngine())
+    def test_license_plate_scan_does_not_verify_real_edits(self, mock_ocr):
+        """Test a read one non-look-alike character off is only a candidate, not attributed to the vehicle"""
+        mock_ocr.return_value = tesseract_data("TEST1X3")
+        headers = self.get_auth_headers(self.guard_user)
+        response = self.client.post('/api/ai/scan-license-plate/', {
+            'image': self.test_image,
+            'entry_type': 'ENTRY'
+        }, **headers)
+        
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertIsNone(data['matched_vehicle'])
+        self.assertEqual(data['plate_match']['plate'], 'TEST123')
+        self.assertEqual(data['plate_match']['cost'], 1.0)
+        self.assertFalse(data['plate_match']['verified'])
+        drain(max_tasks=1)
+        record = LicensePlateRecord.objects.get()
+        self.assertIsNone(record.vehicle_id)
+        self.assertFalse(record.verified)
+
+    @patch('ai_features.ocr.pytesseract.image_to_data')
+    @patch('ai_features.utils.get_ocr_engine', lambda: PytesseractEngine())
+    def test_license_plate_stream_votes_across_frames(self, mock_ocr):
+        """Test a camera session ends once its consensus is stable, using a few OCR calls per frame"""
+        mock_ocr.return_value = tesseract_data("TEST123")
+        headers = self.get_auth_headers(self.guard_user)
+        
+        response = self.client.post('/api/ai/scan-license-plate-stream/', {'image': self.test_image}, **headers)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        session_id = data['session_id']
+        self.assertEqual((data['frames'], data['done'], data['plate_number']), (1, False, 'TEST123'))
+        self.assertNotIn('task_id', data)
+        
+        # Another user's frame under the same id opens a session of its own
+        other = self.client.post('/api/ai/scan-license-plate-stream/', {
+            'image': self.test_image,
+            'session_id': session_id
+        }, **self.get_auth_headers(self.admin_user)).json()
+        self.assertEqual(other['frames'], 1)
+        
+        for frame in (2, 3):
+            data = self.client.post('/api/ai/scan-license-plate-stream/', {
+                'image': self.test_image,
+                'session_id': session_id,
+                'entry_type': 'EXIT'
+            }, **headers).json()
+            self.assertEqual(data['frames'], frame)
+        
+        self.assertTrue(data['done'])
+        self.assertTrue(data['stable'])
+        self.assertLessEqual(data['ocr_calls'], 6)
+        self.assertEqual(data['matched_vehicle']['id'], self.vehicle.id)
+        drain(max_tasks=1)
+        record = LicensePlateRecord.objects.get()
+        self.assertEqual((record.detected_plate, record.entry_type, record.vehicle_id), ('TEST123', 'EXIT', self.vehicle.id))
+        
+        # A finished session starts over
+        data = self.client.post('/api/ai/scan-license-plate-stream/', {
+            'image': self.test_image,
+            'session_id': session_id
+        }, **headers).json()
+        self.assertEqual(data['frames'], 1)
+
+    @patch('ai_features.ocr.pytesseract.image_to_data')
+    @patch('ai_features.utils.get_ocr_engine', lambda: PytesseractEngine())
+    def test_license_plate_scan_is_scoped_to_org(self, mock_ocr):
+        """Test guards only match vehicles of their own organization"""
+        mock_ocr.return_value = tesseract_data("TEST123")
+        other_org = Organization.objects.create(name='Other Org', account='OTHER001', website='https://other.com')
+        other_guard = User.objects.create_user(username='other_guard', password='testpass123', role='GUARD', org=other_org)
+        
+        response = self.client.post('/api/ai/scan-license-plate/', {
+            'image': self.test_image,
+            'entry_type': 'ENTRY'
+        }, **self.get_auth_headers(other_guard))
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.json()['matched_vehicle'])
+        
+        with override_settings(AI_SETTINGS={**settings.AI_SETTINGS, 'PLATE_SEARCH_SCOPE': 'all'}):
+            response = self.client.post('/api/ai/scan-license-plate/', {
+                'image': self.test_image,
+                'entry_type': 'ENTRY'
+            }, **self.get_auth_headers(other_guard))
+        self.assertEqual(response.json()['matched_vehicle']['id'], self.vehicle.id)
+
+    @patch('ai_features.ocr.pytesseract.image_to_data')
+    @patch('ai_features.utils.get_ocr_engine', lambda: PytesseractEngine())
+    def test_license_plate_scan_accepts_file_uploads(self, mock_ocr):
+        """Test plate scans accept multipart files and raw image bodies"""
+        mock_ocr.return_value = tesseract_data("TEST123")
+        headers = self.get_auth_headers(self.guard_user)
+        image_bytes = base64.b64decode(self.test_image.split(',')[1])
+        
+        # Multipart file part
+        response = self.client.post('/api/ai/scan-license-plate/', {
+            'image': SimpleUploadedFile('plate.jpg', image_bytes, content_type='image/jpeg'),
+            'entry_type': 'EXIT'
+        }, format='multipart', **headers)
+        self.assertEqual(response.status_code, 200)
+        drain(max_tasks=1)
+        record = LicensePlateRecord.objects.latest('id')
+        self.assertEqual(record.entry_type, 'EXIT')
+        self.assertEqual(record.original_image, '')
+        self.assertEqual(blob_store.read(record.original_image_ref), image_bytes)
+        
+        # Raw body, other fields in the query string
+        response = self.client.generic(
+            'POST', '/api/ai/scan-license-plate/?entry_type=EXIT', image_bytes, content_type='image/jpeg', **headers
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['plate_number'], 'TEST123')
+        Task.objects.filter(name='ai_features.process_scan_image').delete()
+        drain(max_tasks=1)
+        record = LicensePlateRecord.objects.latest('id')
+        self.assertEqual(record.entry_type, 'EXIT')
+        
+        # Same bytes, same blob
+        self.assertEqual(LicensePlateRecord.objects.values('original_image_ref').distinct().count(), 1)
+        
+        # Multipart request without the image
+        response = self.client.post('/api/ai/scan-license-plate/', {'entry_type': 'ENTRY'}, format='multipart', **headers)
+        self.assertEqual(response.status_code, 400)
+
     def test_unauthenticated_access(self):
         """Test that unauthenticated users cannot access AI endpoints"""
         endpoints = [
@@ -314,6 +776,88 @@ class AIFeaturesTestCase(TestCase):
             response = self.client.get(endpoint)
             self.assertEqual(response.status_code, 401)
 
+    def test_async_endpoints_authenticate_like_drf(self):
+        """Test the async endpoints answer auth and method errors as the DRF views do"""
+        for endpoint in ['register-face', 'verify-face', 'scan-license-plate']:
+            response = self.client.post(f'/api/ai/async/{endpoint}/', {'image': self.test_image})
+            self.assertEqual(response.status_code, 401)
+            self.assertEqual(response.json(), self.client.post(f'/api/ai/{endpoint}/', {'image': self.test_image}).json())
+            self.assertIn('Bearer', response['WWW-Authenticate'])
+
+        response = self.client.post('/api/ai/async/verify-face/', {'image': self.test_image}, HTTP_AUTHORIZATION='Bearer junk')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['code'], 'token_not_valid')
+
+        headers = self.get_auth_headers(self.guard_user)
+        self.assertEqual(self.client.get('/api/ai/async/verify-face/', **headers).status_code, 405)
+        response = self.client.post('/api/ai/async/verify-face/', {}, format='json', **headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'No image provided')
+
+    @patch('ai_features.ocr.pytesseract.image_to_data')
+    @patch('ai_features.utils.get_ocr_engine', lambda: PytesseractEngine())
+    async def test_async_license_plate_scan(self, mock_ocr):
+        """Test the async plate scan returns the sync response and queues the record"""
+        mock_ocr.return_value = tesseract_data("TE5T1Z3")
+        headers = {'Authorization': self.get_auth_headers(self.guard_user)['HTTP_AUTHORIZATION']}
+        body = {'image': self.test_image, 'entry_type': 'EXIT'}
+
+        response = await self.async_client.post(
+            '/api/ai/async/scan-license-plate/', body, content_type='application/json', headers=headers
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['plate_number'], 'TE5T1Z3')
+        self.assertEqual(data['matched_vehicle']['id'], self.vehicle.id)
+        self.assertEqual(data['plate_match']['plate'], 'TEST123')
+        self.assertIn('variants', data['ocr'])
+        task = await Task.objects.aget(id=data['task_id'])
+        self.assertEqual(task.payload['entry_type'], 'EXIT')
+
+        sync_data = await self.async_client.post(
+            '/api/ai/scan-license-plate/', body, content_type='application/json', headers=headers
+        )
+        self.assertEqual(set(sync_data.json()), set(data))
+
+    @patch('ai_features.views.FaceRecognitionProcessor.detect_and_encode')
+    async def test_async_face_registration_and_verification(self, mock_detect):
+        """Test async registration feeds the index that async verification searches"""
+        encoding = np.random.rand(128)
+        mock_detect.return_value = ([(10, 90, 90, 10)], [encoding])
+        await sync_to_async(face_index.load_from_db)()
+        admin = {'Authorization': self.get_auth_headers(self.admin_user)['HTTP_AUTHORIZATION']}
+        driver = {'Authorization': self.get_auth_headers(self.driver_user)['HTTP_AUTHORIZATION']}
+
+        response = await self.async_client.post('/api/ai/async/register-face/', {
+            'user_id': self.admin_user.id, 'image': self.test_image
+        }, content_type='application/json', headers=driver)
+        self.assertEqual(response.status_code, 403)
+
+        response = await self.async_client.post('/api/ai/async/register-face/', {
+            'user_id': self.driver_user.id, 'image': self.test_image
+        }, content_type='application/json', headers=admin)
+        self.assertEqual(response.status_code, 200)
+        face = await FaceEncoding.objects.aget(user=self.driver_user)
+        self.assertEqual(response.json()['face_id'], face.id)
+        # TestCase never commits, so hand the index the encoding the signal would have added
+        face_index.add(self.driver_user.id, face.encoding, self.org.id)
+
+        mock_detect.return_value = ([(10, 90, 90, 10)], [encoding + 0.001])
+        response = await self.async_client.post('/api/ai/async/verify-face/', {
+            'image': self.test_image, 'scan_type': 'CHECK_IN'
+        }, content_type='application/json', headers=admin)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user']['id'], self.driver_user.id)
+        task = await Task.objects.aget(id=response.json()['task_id'])
+        self.assertEqual(task.payload['logs'][0]['verified_by_id'], self.admin_user.id)
+
+        mock_detect.side_effect = RecognitionBusy('Face recognition is busy, try again shortly', retry_after=2)
+        response = await self.async_client.post('/api/ai/async/verify-face/', {
+            'image': self.test_image
+        }, content_type='application/json', headers=admin)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '2')
+
 class ImageProcessorTestCase(TestCase):
     """Test the ImageProcessor utility class"""
     
@@ -343,6 +887,18 @@ class ImageProcessorTestCase(TestCase):
         with self.assertRaises(ValueError):
             self.processor.decode_base64_image("invalid_base64")
     
+    def test_decode_image_sources(self):
+        """Test the shared decoder reads base64, bytes and uploaded files alike"""
+        upload = SimpleUploadedFile('blue.jpg', self.test_image_bytes, content_type='image/jpeg')
+        for source in (self.test_image_data_url, self.test_image_bytes, upload):
+            result = decode_image(source)
+            self.assertEqual(result.shape, (100, 100, 3))
+        
+        self.assertEqual(decode_image(upload, mode='L').shape, (100, 100))
+        
+        with self.assertRaises(ValueError):
+            decode_image(b'not an image')
+    
     def test_encode_image_to_base64(self):
         """Test image to base64 encoding"""
         # Create test numpy array
@@ -425,11 +981,316 @@ class FaceRecognitionProcessorTestCase(TestCase):
         self.assertEqual(result['confidence'], 0)
         self.assertEqual(len(result['matches']), 0)
 
+    @patch('ai_features.workers.face_recognition.face_locations')
+    def test_detect_faces_on_downscaled_copy(self, mock_locations):
+        """Test detection runs on a downscaled copy and boxes map back to full size"""
+        mock_locations.return_value = [(10, 60, 60, 10)]
+        image = np.zeros((960, 1280, 3), dtype=np.uint8)
+        
+        locations = detect_faces(image, max_side=640)
+        
+        self.assertEqual(mock_locations.call_args[0][0].shape, (480, 640, 3))
+        self.assertEqual(locations, [(20, 120, 120, 20)])
+        
+        # Small images are not upscaled
+        detect_faces(np.zeros((100, 100, 3), dtype=np.uint8), max_side=640)
+        self.assertEqual(mock_locations.call_args[0][0].shape, (100, 100, 3))
+    
+    @patch('ai_features.workers.face_recognition.face_encodings')
+    def test_encode_faces_on_crop(self, mock_encodings):
+        """Test encodings are computed on a crop around the face"""
+        mock_encodings.return_value = [np.random.rand(128)]
+        image = np.zeros((960, 1280, 3), dtype=np.uint8)
+        
+        encodings = encode_faces(image, [(200, 400, 400, 200)])
+        
+        crop, locations = mock_encodings.call_args[0]
+        self.assertEqual(crop.shape, (300, 300, 3))
+        self.assertEqual(locations, [(50, 250, 250, 50)])
+        self.assertEqual(len(encodings), 1)
+
+class FaceQualityTestCase(TestCase):
+    """Test the frame checks run before face detection and encoding"""
+    
+    def setUp(self):
+        self.config = {**DEFAULT_QUALITY_SETTINGS, 'ENABLED': True}
+        rng = np.random.default_rng(0)
+        self.textured = rng.integers(60, 200, (480, 640, 3), dtype=np.uint8)
+    
+    def assertRejected(self, image, reason):
+        with self.assertRaises(FrameRejected) as raised:
+            check_frame(image, self.config)
+        self.assertEqual(raised.exception.reason, reason)
+    
+    def test_check_frame_reasons(self):
+        """Test blurred, dark and overexposed frames are rejected and sharp ones scored"""
+        scores = check_frame(self.textured, self.config)
+        self.assertGreater(scores['sharpness'], self.config['MIN_SHARPNESS'])
+        self.assertAlmostEqual(scores['luminance'], 130, delta=5)
+        
+        self.assertRejected(cv2.GaussianBlur(self.textured, (0, 0), 8), 'blurry')
+        self.assertRejected(np.full((480, 640, 3), 128, dtype=np.uint8), 'blurry')
+        self.assertRejected(self.textured // 8, 'too_dark')
+        self.assertRejected(np.clip(self.textured.astype(np.int16) + 120, 0, 255).astype(np.uint8), 'overexposed')
+        self.assertIsNone(check_frame(self.textured // 8, {**self.config, 'ENABLED': False}))
+    
+    @patch('ai_features.workers.encode_faces')
+    @patch('ai_features.workers.detect_faces')
+    def test_small_faces_are_not_encoded(self, mock_detect, mock_encode):
+        """Test faces under MIN_FACE_SIZE are skipped, and frames with only those rejected"""
+        small, large = (10, 40, 40, 10), (100, 300, 300, 100)
+        mock_detect.return_value = [small, large]
+        mock_encode.return_value = [np.zeros(128)]
+        
+        locations, _ = detect_and_encode(self.textured, min_face_size=40)
+        self.assertEqual(locations, [large])
+        self.assertEqual(mock_encode.call_args[0][1], [large])
+        
+        mock_detect.return_value = [small]
+        mock_encode.reset_mock()
+        with self.assertRaises(FrameRejected) as raised:
+            detect_and_encode(self.textured, min_face_size=40)
+        self.assertEqual((raised.exception.reason, raised.exception.score), ('face_too_small', 30))
+        mock_encode.assert_not_called()
+        self.assertEqual(detect_and_encode(self.textured)[0], [small])
+        
+        # Rejections come back intact from pool processes
+        restored = pickle.loads(pickle.dumps(raised.exception))
+        self.assertEqual((str(restored), restored.reason), (str(raised.exception), 'face_too_small'))
+
+class RecognitionPoolTestCase(TestCase):
+    """Test the bounded face recognition process pool"""
+
+    def test_inline_pool_runs_in_process(self):
+        """Test workers=0 runs jobs in the calling thread"""
+        pool = RecognitionPool(workers=0)
+        self.assertEqual(pool.run(abs, -3), 3)
+        with self.assertRaises(ValueError):
+            pool.run(int, 'not a number')
+
+    def test_pool_rejects_when_full(self):
+        """Test jobs beyond workers + queue_size raise RecognitionBusy"""
+        pool = RecognitionPool(workers=1, queue_size=0, timeout=30, retry_after=3)
+        try:
+            self.assertEqual(pool.run(abs, -3), 3)
+            future = pool.submit(time.sleep, 1)
+            with self.assertRaises(RecognitionBusy) as raised:
+                pool.submit(abs, -1)
+            self.assertEqual(raised.exception.retry_after, 3)
+            pool.result(future)
+        finally:
+            pool.shutdown()
+
+@override_settings(CACHES=TEST_CACHES)
+class FaceIndexTestCase(TestCase):
+    """Test the in-memory FaceIndex"""
+    
+    def setUp(self):
+        self.index = FaceIndex()
+        self.encodings = {user_id: np.random.rand(128) for user_id in range(1, 6)}
+        self.index.load(self.encodings.items())
+    
+    def test_search_returns_closest_user(self):
+        """Test search finds the nearest enrolled encoding"""
+        result = self.index.search(self.encodings[3] + 0.001)
+        
+        self.assertEqual(result['user_id'], 3)
+        self.assertLess(result['distance'], 0.1)
+    
+    def test_search_respects_tolerance(self):
+        """Test search returns None when nothing is within tolerance"""
+        self.assertIsNone(self.index.search(self.encodings[3] + 1.0, tolerance=0.6))
+        self.assertIsNone(FaceIndex().search(self.encodings[3]))
+    
+    def test_distances_match_face_recognition(self):
+        """Test vectorized distances agree with face_recognition.face_distance"""
+        import face_recognition
+        probe = np.random.rand(128)
+        distances, user_ids = self.index.distances(probe)
+        expected = face_recognition.face_distance([self.encodings[u] for u in user_ids], probe)
+        
+        np.testing.assert_allclose(distances, expected, atol=1e-4)
+    
+    def test_add_and_remove(self):
+        """Test updates replace rows and removals keep the matrix compact"""
+        replacement = np.random.rand(128)
+        self.index.add(2, replacement)
+        self.assertEqual(len(self.index), 5)
+        self.assertEqual(self.index.search(replacement)['user_id'], 2)
+        
+        self.index.remove(1)
+        self.index.remove(99)
+        self.assertEqual(len(self.index), 4)
+        self.assertIsNone(self.index.search(self.encodings[1], tolerance=0.01))
+        self.assertEqual(self.index.search(self.encodings[5])['user_id'], 5)
+    
+    def test_signals_keep_index_in_sync(self):
+        """Test FaceEncoding save/delete signals update the shared index"""
+        org = Organization.objects.create(name='Index Org', account='IDX001', website='https://idx.com')
+        user = User.objects.create_user(username='index_user', password='testpass123', role='DRIVER', org=org)
+        encoding = np.random.rand(128)
+        face_index.load_from_db()
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            face_data = FaceEncoding.objects.create(user=user, encoding_vector=pack_encoding(encoding))
+        face_index.ensure_loaded()
+        self.assertEqual(face_index.search(encoding)['user_id'], user.id)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            face_data.delete()
+        face_index.ensure_loaded()
+        self.assertIsNone(face_index.search(encoding, tolerance=0.01))
+    
+    def test_other_workers_reload_after_a_change(self):
+        """Test an enrollment bumps the version in the shared cache, so another worker's index reloads"""
+        org = Organization.objects.create(name='Worker Org', account='WRK001', website='https://wrk.com')
+        user = User.objects.create_user(username='worker_user', password='testpass123', role='DRIVER', org=org)
+        encoding = np.random.rand(128)
+        face_index.load_from_db()
+        other_worker = ShardedFaceIndex()
+        other_worker.load_from_db()
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            FaceEncoding.objects.create(user=user, encoding_vector=pack_encoding(encoding))
+        self.assertNotEqual(caches['index'].get(FACE_INDEX_VERSION_KEY), other_worker._version)
+        self.assertIsNone(other_worker.search(encoding))
+        other_worker.ensure_loaded()
+        self.assertEqual(other_worker.search(encoding)['user_id'], user.id)
+        
+        # While the shared cache is unreachable the loaded index keeps serving
+        with patch('ai_features.index_version.SharedVersion.get', return_value=UNAVAILABLE):
+            other_worker.remove(user.id)
+            other_worker.ensure_loaded()
+            self.assertIsNone(other_worker.search(encoding))
+
+class ShardedFaceIndexTestCase(TestCase):
+    """Test the organization-partitioned face index"""
+    
+    def setUp(self):
+        self.encoding = np.random.rand(128)
+        self.index = ShardedFaceIndex({'BACKEND': 'flat'})
+        self.index.load([(1, 10, self.encoding), (2, 20, self.encoding + 0.01), (3, None, np.random.rand(128))])
+    
+    def test_search_only_scans_requested_shards(self):
+        """Test a probe only matches users in the requested organizations"""
+        self.assertEqual(self.index.search(self.encoding, org_ids=[10])['user_id'], 1)
+        self.assertEqual(self.index.search(self.encoding, org_ids=[20])['user_id'], 2)
+        self.assertEqual(self.index.search(self.encoding)['user_id'], 1)
+        self.assertIsNone(self.index.search(self.encoding, org_ids=[30]))
+        self.assertEqual(self.index.count([10, 20]), 2)
+        self.assertEqual(len(self.index), 3)
+    
+    def test_move_and_remove(self):
+        """Test users move between shards and removals drop them"""
+        self.index.move(1, 20)
+        self.assertEqual(self.index.shard_of(1), 20)
+        self.assertIsNone(self.index.search(self.encoding, org_ids=[10]))
+        self.assertEqual(self.index.search(self.encoding, org_ids=[20])['user_id'], 1)
+        
+        self.index.remove(1)
+        self.assertEqual(self.index.search(self.encoding, org_ids=[20])['user_id'], 2)
+        self.assertEqual(len(self.index), 2)
+    
+    def test_search_scope(self):
+        """Test search scope by role, organization and subtree"""
+        parent = Organization.objects.create(name='Parent Org', account='P001', website='https://p.com')
+        child = Organization.objects.create(name='Child Org', account='C001', website='https://c.com', parent=parent)
+        grandchild = Organization.objects.create(name='Grandchild Org', account='G001', website='https://g.com', parent=child)
+        guard = User.objects.create_user(username='scope_guard', password='testpass123', role='GUARD', org=parent)
+        admin = User.objects.create_user(username='scope_admin', password='testpass123', role='ADMIN')
+        
+        self.assertIsNone(search_scope(admin))
+        self.assertEqual(search_scope(guard, 'org'), [parent.id])
+        self.assertEqual(sorted(search_scope(guard, 'subtree')), sorted([parent.id, child.id, grandchild.id]))
+
+    def test_borderline_matches_use_enrollment_samples(self):
+        """Test probes near the tolerance are settled on the nearest users' samples"""
+        base = np.zeros(128)
+        base[0] = 1.0
+        spread = np.zeros(128)
+        spread[1] = 0.35
+        samples = np.array([base + spread, base - spread])
+        index = ShardedFaceIndex({'BACKEND': 'flat', 'SAMPLE_MARGIN': 0.1})
+        index.load([(1, 10, face_centroid(samples), samples), (2, 10, base * 2)])
+        
+        # 0.35 from the centroid: a miss at 0.3 without the samples, a match on the first one
+        probe = samples[0] + 0.001
+        self.assertIsNone(ShardedFaceIndex({'BACKEND': 'flat', 'SAMPLE_MARGIN': 0}).search(probe, tolerance=0.3))
+        match = index.search(probe, tolerance=0.3)
+        self.assertEqual(match['user_id'], 1)
+        self.assertLess(match['distance'], 0.05)
+        self.assertEqual(index.search_batch([probe, base * 3], tolerance=0.3), [match, None])
+        
+        # Clear centroid matches keep their centroid distance
+        self.assertAlmostEqual(index.search(base, tolerance=0.3)['distance'], np.linalg.norm(base - face_centroid(samples)), places=5)
+        
+        # Samples follow their user and go with them
+        index.move(1, 20)
+        self.assertEqual(index.search(probe, tolerance=0.3, org_ids=[20])['user_id'], 1)
+        index.remove(1)
+        self.assertIsNone(index.samples_of(1))
+
+class ApproximateFaceIndexTestCase(TestCase):
+    """Test the approximate face index backends against the flat index"""
+    
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        # Clustered encodings, like real face embeddings
+        centers = rng.normal(0, 0.3, (20, 128))
+        self.encodings = centers[rng.integers(0, 20, 2000)] + rng.normal(0, 0.05, (2000, 128))
+        self.probes = self.encodings[rng.choice(2000, 50, replace=False)] + rng.normal(0, 0.005, (50, 128))
+        self.flat = FaceIndex()
+        self.flat.load(enumerate(self.encodings, 1))
+    
+    def assert_same_decisions(self, index):
+        index.load(enumerate(self.encodings, 1))
+        for probe in self.probes:
+            self.assertEqual(index.search(probe, tolerance=0.6), self.flat.search(probe, tolerance=0.6))
+        # Probes that match nobody are confirmed by the exact fallback
+        self.assertIsNone(index.search(np.full(128, 5.0), tolerance=0.6))
+    
+    def test_ivf_matches_flat_decisions(self):
+        """Test IVF search with exact re-rank returns the brute-force decision"""
+        index = IVFFaceIndex(nprobe=4, min_train_size=100)
+        self.assert_same_decisions(index)
+        self.assertIsNotNone(index._candidates(self.probes[0].astype(np.float32)))
+    
+    def test_ivf_tracks_updates(self):
+        """Test IVF cell assignments follow adds and removals"""
+        index = IVFFaceIndex(nprobe=4, min_train_size=100)
+        index.load(enumerate(self.encodings, 1))
+        replacement = self.encodings[10] + 0.001
+        index.add(5000, replacement)
+        index.remove(1)
+        
+        self.assertEqual(index.search(replacement, tolerance=0.01)['user_id'], 5000)
+        self.assertIsNone(index.search(self.encodings[0], tolerance=0.001))
+    
+    def test_hnsw_matches_flat_decisions(self):
+        """Test HNSW search with exact re-rank returns the brute-force decision"""
+        if hnswlib is None:
+            self.skipTest('hnswlib is not installed')
+        index = HNSWFaceIndex(rerank_k=10)
+        self.assert_same_decisions(index)
+        index.remove(1)
+        index.add(1, self.encodings[0])
+        self.assertEqual(index.search(self.encodings[0], tolerance=0.01)['user_id'], 1)
+    
+    def test_create_face_index_backends(self):
+        """Test the configured backend is built, falling back to flat"""
+        self.assertEqual(create_face_index({'BACKEND': 'flat'}).backend, 'flat')
+        self.assertEqual(create_face_index({'BACKEND': 'ivf'}).backend, 'ivf')
+        with patch('ai_features.face_index.hnswlib', None):
+            self.assertEqual(create_face_index({'BACKEND': 'hnsw'}).backend, 'flat')
+
+@override_settings(CACHES=TEST_CACHES)
 class LicensePlateProcessorTestCase(TestCase):
     """Test the LicensePlateProcessor utility class"""
     
     def setUp(self):
-        self.processor = LicensePlateProcessor()
+        caches['ocr'].clear()
+        # Pin the subprocess engine so the pytesseract mocks apply
+        self.processor = LicensePlateProcessor(engine=PytesseractEngine())
     
     def test_preprocess_image(self):
         """Test image preprocessing methods"""
@@ -458,10 +1319,10 @@ class LicensePlateProcessorTestCase(TestCase):
         for plate in invalid_plates:
             self.assertFalse(self.processor.is_valid_license_plate(plate), f"{plate} should be invalid")
     
-    @patch('ai_features.utils.pytesseract.image_to_string')
+    @patch('ai_features.ocr.pytesseract.image_to_data')
     def test_extract_text_success(self, mock_ocr):
         """Test successful text extraction"""
-        mock_ocr.return_value = "ABC123"
+        mock_ocr.return_value = tesseract_data("ABC123")
         
         test_image = np.zeros((100, 100), dtype=np.uint8)
         result = self.processor.extract_text(test_image)
@@ -470,16 +1331,652 @@ class LicensePlateProcessorTestCase(TestCase):
         self.assertEqual(result['best_result']['text'], 'ABC123')
         self.assertGreater(result['best_result']['confidence'], 0)
     
-    @patch('ai_features.utils.pytesseract.image_to_string')
+    @patch('ai_features.ocr.pytesseract.image_to_data')
     def test_extract_text_no_valid_plate(self, mock_ocr):
         """Test text extraction when no valid plate is found"""
-        mock_ocr.return_value = "INVALID_TEXT_!!!"
+        mock_ocr.return_value = tesseract_data("INVALID_TEXT_!!!")
         
         test_image = np.zeros((100, 100), dtype=np.uint8)
         result = self.processor.extract_text(test_image)
         
         self.assertFalse(result['success'])
         self.assertIn('No license plate text detected', result['error'])
+    
+    @patch('ai_features.ocr.pytesseract.image_to_data')
+    def test_extract_text_early_exit(self, mock_ocr):
+        """Test a confident strict-pattern read cancels the remaining variants"""
+        def slow_ocr(image, config='', output_type=None):
+            time.sleep(0.05)
+            return tesseract_data("ABC123")
+        mock_ocr.side_effect = slow_ocr
+        
+        test_image = np.zeros((100, 100), dtype=np.uint8)
+        result = self.processor.extract_text(test_image)
+        
+        self.assertTrue(result['early_exit'])
+        self.assertEqual(result['best_result']['text'], 'ABC123')
+        # Settled on the plain crop, so no other preprocessing was tried
+        self.assertEqual({variant['method'] for variant in result['variants']}, {'original'})
+        self.assertGreaterEqual(result['preprocess_ms'], 0)
+        done = [variant for variant in result['variants'] if variant['status'] == 'done']
+        self.assertLess(len(done), 4)
+        self.assertIn('ms', done[0])
+        self.assertEqual(done[0]['confidence'], 90)
+    
+    @patch('ai_features.ocr.pytesseract.image_to_data')
+    def test_extract_text_drops_unconfident_reads(self, mock_ocr):
+        """Test reads Tesseract itself doubts are not reported as plates"""
+        mock_ocr.return_value = tesseract_data("ABC123", confidence=35)
+        
+        result = self.processor.extract_text(np.zeros((100, 100), dtype=np.uint8))
+        
+        self.assertFalse(result['success'])
+        self.assertEqual(mock_ocr.call_count, 24)
+        self.assertEqual(result['variants'][0]['confidence'], 35)
+    
+    @patch('ai_features.ocr.pytesseract.image_to_data')
+    def test_extract_text_runs_all_variants_without_strict_match(self, mock_ocr):
+        """Test generic-pattern reads do not stop the search early"""
+        mock_ocr.return_value = tesseract_data("A1B2C3")
+        
+        test_image = np.zeros((100, 100), dtype=np.uint8)
+        result = self.processor.extract_text(test_image)
+        
+        self.assertTrue(result['success'])
+        self.assertFalse(result['early_exit'])
+        self.assertEqual(mock_ocr.call_count, 24)
+        self.assertTrue(all(variant['status'] == 'done' for variant in result['variants']))
+
+class PreprocessorTestCase(TestCase):
+    """Test the shared preprocessing stages"""
+    
+    def setUp(self):
+        self.image = np.random.default_rng(0).integers(0, 256, (64, 200, 3), dtype=np.uint8)
+    
+    def test_stages_match_opencv(self):
+        stages = Preprocessor(self.image)
+        gray = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
+        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+        
+        np.testing.assert_array_equal(stages['original'], gray)
+        np.testing.assert_array_equal(stages['otsu_thresh'], cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1])
+        np.testing.assert_array_equal(stages['edges'], cv2.Canny(gray, 50, 150))
+        np.testing.assert_array_equal(
+            Preprocessor(self.image, color_order='RGB')['gray'], cv2.cvtColor(self.image, cv2.COLOR_RGB2GRAY)
+        )
+    
+    def test_stages_are_lazy_and_shared(self):
+        """Test a stage computes only its inputs, each once"""
+        stages = Preprocessor(self.image)
+        otsu = stages['otsu_thresh']
+        self.assertEqual(set(stages.timings), {'gray', 'blur', 'otsu_thresh'})
+        
+        stages['adaptive_thresh']
+        self.assertEqual(set(stages.timings), {'gray', 'blur', 'otsu_thresh', 'adaptive_thresh'})
+        self.assertIs(stages['otsu_thresh'], otsu)
+        
+        # Grayscale input is used as is
+        gray = stages['gray']
+        self.assertIs(Preprocessor(gray)['original'], gray)
+    
+    def test_pool_recycles_buffers(self):
+        pool = BufferPool()
+        with Preprocessor(self.image, pool=pool) as stages:
+            stages.get('morphological', 'edges', 'enhanced')
+            first = stages.allocated
+        self.assertGreater(first, 0)
+        
+        with Preprocessor(self.image, pool=pool) as stages:
+            stages.get('morphological', 'edges', 'enhanced')
+            self.assertEqual(stages.allocated, 0)
+        
+        # Buffers something may still read are not handed out again
+        pool = BufferPool()
+        stages = Preprocessor(self.image, pool=pool)
+        stages['gray']
+        stages.close(recycle=False)
+        with Preprocessor(self.image, pool=pool) as stages:
+            stages['gray']
+            self.assertGreater(stages.allocated, 0)
+
+def plate_scene(text='ABC123', angle=0):
+    """A dark 'car' frame with a light, rotated plate on it; the background is the same for every plate"""
+    scene = np.full((720, 1280), 90, dtype=np.uint8)
+    cv2.rectangle(scene, (200, 150), (1100, 650), 60, -1)
+    plate = Image.new('L', (300, 92), 235)
+    draw = ImageDraw.Draw(plate)
+    draw.rectangle((2, 2, 297, 89), outline=20, width=3)
+    draw.text((30, 10), text, fill=10, font=ImageFont.load_default(size=56))
+    rotated = np.array(plate.rotate(angle, expand=True, fillcolor=0))
+    mask = np.array(Image.new('L', plate.size, 255).rotate(angle, expand=True, fillcolor=0)) > 0
+    region = scene[400:400 + rotated.shape[0], 500:500 + rotated.shape[1]]
+    region[mask] = rotated[mask]
+    return cv2.cvtColor(scene, cv2.COLOR_GRAY2BGR)
+
+@override_settings(CACHES=TEST_CACHES)
+class PlateLocalizationTestCase(TestCase):
+    """Test plate localization ahead of OCR"""
+    
+    def setUp(self):
+        caches['ocr'].clear()
+    
+    def test_localize_and_deskew(self):
+        """Test a rotated plate is found, levelled and normalized to the crop height"""
+        for angle in (0, 10, -15):
+            plates = localize_plates(plate_scene(angle=angle))
+            
+            self.assertGreater(len(plates), 0)
+            best = plates[0]
+            x, y, w, h = best['box']
+            self.assertTrue(480 <= x <= 540 and 380 <= y <= 460, best['box'])
+            self.assertAlmostEqual(abs(best['angle']), abs(angle), delta=2)
+            self.assertEqual(best['image'].shape[0], settings.AI_SETTINGS.get('PLATE_CROP_HEIGHT', 64))
+            self.assertGreater(best['image'].shape[1], best['image'].shape[0] * 2)
+    
+    def test_no_plate_in_blank_frame(self):
+        """Test featureless frames yield no candidates"""
+        self.assertEqual(localize_plates(np.zeros((480, 640, 3), dtype=np.uint8)), [])
+    
+    @patch('ai_features.ocr.pytesseract.image_to_data')
+    def test_ocr_runs_on_crops_only(self, mock_ocr):
+        """Test OCR is fed the small plate crops rather than the frame"""
+        mock_ocr.return_value = tesseract_data("ABC123")
+        processor = LicensePlateProcessor(engine=PytesseractEngine())
+        
+        result = processor.extract_text(plate_scene(angle=5))
+        
+        self.assertTrue(result['success'])
+        self.assertGreater(len(result['candidates']), 0)
+        self.assertEqual(result['best_result']['candidate'], 0)
+        for call in mock_ocr.call_args_list:
+            self.assertEqual(call[0][0].shape[0], 64)
+
+@override_settings(CACHES=TEST_CACHES)
+class PlateResultCacheTestCase(TestCase):
+    """Test the perceptual-hash plate OCR cache"""
+    
+    def setUp(self):
+        caches['ocr'].clear()
+        self.plate_cache = PlateResultCache(alias='ocr', ttl=60, max_distance=16)
+        image = Image.new('L', (200, 64), 235)
+        ImageDraw.Draw(image).text((15, 8), 'ABC123', fill=10, font=ImageFont.load_default(size=44))
+        self.crop = np.array(image)
+    
+    def test_near_duplicate_crop_hits(self):
+        """Test a noisy, shifted copy of a cached crop reuses its result"""
+        result = {'success': True, 'plates': [], 'best_result': {'text': 'ABC123', 'confidence': 95}}
+        self.plate_cache.store(plate_hash(self.crop), result)
+        
+        noisy = np.clip(np.roll(self.crop, 1, axis=1) + np.random.default_rng(0).normal(0, 6, self.crop.shape), 0, 255)
+        cached, distance = self.plate_cache.lookup(plate_hash(noisy.astype(np.uint8)))
+        
+        self.assertEqual(cached['best_result']['text'], 'ABC123')
+        self.assertLessEqual(distance, 16)
+        self.assertEqual(self.plate_cache.stats()['hits'], 1)
+    
+    def test_repeated_hits_keep_entry_findable(self):
+        """Test hits refresh the band buckets with the entry, so a plate scanned past the TTL still hits"""
+        self.plate_cache.store(plate_hash(self.crop), {'success': True})
+        clock = [time.time()]
+        with patch('time.time', lambda: clock[0]):
+            for _ in range(4):
+                clock[0] += 40
+                self.assertIsNotNone(self.plate_cache.lookup(plate_hash(self.crop))[0])
+            clock[0] += 61
+            self.assertIsNone(self.plate_cache.lookup(plate_hash(self.crop))[0])
+    
+    def test_different_plate_misses(self):
+        """Test another plate's crop does not match"""
+        self.plate_cache.store(plate_hash(self.crop), {'success': True})
+        image = Image.new('L', (200, 64), 235)
+        ImageDraw.Draw(image).text((15, 8), 'XYZ789', fill=10, font=ImageFont.load_default(size=44))
+        
+        cached, distance = self.plate_cache.lookup(plate_hash(np.array(image)))
+        
+        self.assertIsNone(cached)
+        self.assertEqual(self.plate_cache.stats()['misses'], 1)
+    
+    def test_hamming_within_threshold_shares_a_band(self):
+        """Test every hash within max_distance bits is found through the bands"""
+        value = plate_hash(self.crop)
+        self.plate_cache.store(value, {'success': True})
+        flipped = value
+        for bit in range(0, 128, 8):
+            flipped ^= 1 << bit
+        self.assertEqual(hamming(value, flipped), 16)
+        self.assertIsNotNone(self.plate_cache.lookup(flipped)[0])
+    
+    @patch('ai_features.ocr.pytesseract.image_to_data')
+    def test_repeated_scan_skips_ocr(self, mock_ocr):
+        """Test a repeated frame is answered from the cache without OCR"""
+        mock_ocr.return_value = tesseract_data('ABC123')
+        processor = LicensePlateProcessor(engine=PytesseractEngine(), cache=self.plate_cache)
+        
+        first = processor.extract_text(plate_scene())
+        calls = mock_ocr.call_count
+        second = processor.extract_text(plate_scene())
+        
+        self.assertFalse(first['cache']['hit'])
+        self.assertTrue(second['cache']['hit'])
+        self.assertEqual(second['best_result']['text'], 'ABC123')
+        self.assertEqual(mock_ocr.call_count, calls)
+    
+    @patch('ai_features.ocr.pytesseract.image_to_data')
+    def test_other_plate_on_same_background_is_read(self, mock_ocr):
+        """Test a different plate in front of the same camera background gets its own OCR"""
+        processor = LicensePlateProcessor(engine=PytesseractEngine())
+        mock_ocr.return_value = tesseract_data('ABC123')
+        processor.extract_text(plate_scene('ABC123'))
+        
+        mock_ocr.return_value = tesseract_data('ABC128')
+        second = processor.extract_text(plate_scene('ABC128'))
+        self.assertFalse(second['cache']['hit'])
+        self.assertEqual(second['best_result']['text'], 'ABC128')
+    
+    @patch('ai_features.ocr.pytesseract.image_to_data')
+    def test_unlocalized_frames_are_not_cached(self, mock_ocr):
+        """Test frames without a localized plate are always OCR'd, as their hash is mostly background"""
+        mock_ocr.return_value = tesseract_data('ABC123')
+        processor = LicensePlateProcessor(engine=PytesseractEngine(), cache=self.plate_cache)
+        
+        frame = np.full((480, 640, 3), 120, dtype=np.uint8)
+        processor.extract_text(frame)
+        second = processor.extract_text(frame)
+        
+        self.assertEqual(second['candidates'], [])
+        self.assertFalse(second['cache']['hit'])
+        self.assertIsNone(second['cache']['hash'])
+        self.assertEqual(self.plate_cache.stats()['hits'], 0)
+    
+    def test_stats_endpoint_is_admin_only(self):
+        """Test the cache counters are exposed to admins"""
+        org = Organization.objects.create(name='Stats Org', account='STATS001', website='https://stats.com')
+        admin = User.objects.create_user(username='stats_admin', password='testpass123', role='ADMIN', org=org)
+        guard = User.objects.create_user(username='stats_guard', password='testpass123', role='GUARD', org=org)
+        client = APIClient()
+        
+        client.force_authenticate(guard)
+        self.assertEqual(client.get('/api/ai/plate-cache-stats/').status_code, 403)
+        
+        client.force_authenticate(admin)
+        response = client.get('/api/ai/plate-cache-stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('hit_rate', response.json())
+
+class PlateConsensusTestCase(TestCase):
+    """Test multi-frame plate voting"""
+    
+    def test_majority_outvotes_misreads(self):
+        """Test per-position votes fix characters no single frame read consistently"""
+        consensus = PlateConsensus()
+        consensus.add_frame([('A8C123', 90, None)])
+        consensus.add_frame([('ABC123', 80, None), ('ABC123', 60, None)])
+        consensus.add_frame([('ABC1Z3', 85, None)])
+        consensus.add_frame([('ABC23', 95, None)])
+        consensus.add_frame([('ABC123', 75, None)])
+        
+        result = consensus.result()
+        self.assertEqual(result['text'], 'ABC123')
+        self.assertEqual(result['agreement'], round(2.4 / 3.3, 3))
+        self.assertEqual(consensus.frames, 5)
+        self.assertTrue(consensus.stable(min_frames=3, agreement=0.6))
+        self.assertFalse(consensus.stable(min_frames=6, agreement=0.6))
+        self.assertFalse(consensus.stable(min_frames=3, agreement=0.8))
+    
+    def test_character_confidences_weight_votes(self):
+        """Test a doubtful character loses to a confidently read one"""
+        consensus = PlateConsensus()
+        consensus.add_frame([('A8C123', 90, [95, 20, 95, 95, 95, 95])])
+        consensus.add_frame([('A8C123', 85, [95, 30, 95, 95, 95, 95])])
+        consensus.add_frame([('ABC123', 80, [90, 80, 90, 90, 90, 90])])
+        self.assertEqual(consensus.result()['text'], 'ABC123')
+    
+    def test_state_round_trip(self):
+        consensus = PlateConsensus()
+        consensus.add_frame([('ABC123', 80, None)], ocr_calls=2)
+        consensus.add_frame([], ocr_calls=2)
+        restored = PlateConsensus(consensus.state())
+        self.assertEqual((restored.frames, restored.ocr_calls), (2, 4))
+        self.assertEqual(restored.result(), consensus.result())
+        self.assertEqual(PlateConsensus().result()['text'], None)
+    
+    def test_frames_rotate_through_variants(self):
+        self.assertEqual(frame_variants(0, 2), [(0, 0), (1, 0)])
+        self.assertEqual(frame_variants(3, 2), [(0, 1), (1, 1)])
+        self.assertEqual(frame_variants(12, 2), [(0, 0), (1, 0)])
+
+@override_settings(CACHES=TEST_CACHES)
+class PlateLookupTestCase(TestCase):
+    """Test the confusion-aware plate -> vehicle lookup"""
+    
+    def setUp(self):
+        self.lookup = PlateLookup()
+    
+    def test_normalize_plate(self):
+        self.assertEqual(normalize_plate(' ab-12 3 '), 'AB123')
+        self.assertEqual(normalize_plate(None), '')
+        self.assertEqual(plate_skeleton('OCR0'), plate_skeleton('0CRO'))
+    
+    def test_confusion_distance(self):
+        """Test look-alike swaps cost less than other edits"""
+        self.assertEqual(confusion_distance('OB1234', 'OB1234'), 0)
+        self.assertAlmostEqual(confusion_distance('0B1234', 'OB1234'), 0.2)
+        self.assertAlmostEqual(confusion_distance('08I234', 'OB1234'), 0.6)
+        self.assertEqual(confusion_distance('XB1234', 'OB1234'), 1)
+        self.assertEqual(confusion_distance('OB12345', 'OB1234'), 1)
+    
+    def test_resolve_tolerates_confusions(self):
+        self.lookup.load([(1, 'OB1234', None), (2, 'KA01AB1234', None)])
+        self.assertEqual(self.lookup.resolve('OB1234'), {'vehicle_id': 1, 'plate': 'OB1234', 'cost': 0.0, 'exact': True})
+        self.assertEqual(self.lookup.resolve('ob-1234')['vehicle_id'], 1)
+        self.assertEqual(self.lookup.resolve('08I234')['cost'], 0.6)
+        self.assertEqual(self.lookup.resolve('KAO1A81234')['vehicle_id'], 2)
+        self.assertIsNone(self.lookup.resolve('XY1234'))
+        self.assertIsNone(self.lookup.resolve('08I234', max_cost=0.5))
+    
+    def test_nearest_tolerates_one_real_edit(self):
+        """Test one non-look-alike substitution, insertion or deletion is still found"""
+        self.lookup.load([(1, 'ABC123', None), (2, 'ABC124', None), (3, 'XYZ789', None)])
+        self.assertEqual(self.lookup.resolve('ABC1X3')['vehicle_id'], 1)
+        self.assertEqual(self.lookup.resolve('ABC1Z3')['cost'], 0.3)
+        self.assertEqual(self.lookup.resolve('ABCC123')['vehicle_id'], 1)
+        self.assertEqual(self.lookup.resolve('AC123')['vehicle_id'], 1)
+        self.assertIsNone(self.lookup.resolve('AXC1Y3'))
+        
+        nearest = self.lookup.nearest('ABC12', k=5)
+        self.assertEqual([match['plate'] for match in nearest], ['ABC123', 'ABC124'])
+        self.assertEqual(len(self.lookup.nearest('ABC12', k=1)), 1)
+    
+    def test_search_is_scoped_per_organization(self):
+        """Test other organizations' plates are neither matched nor counted as ties"""
+        self.lookup.load([(1, 'ABC123', 10), (2, 'ABC123', 20), (3, 'ABC128', 20)])
+        self.assertEqual(self.lookup.resolve('ABC123', org_ids=[20])['vehicle_id'], 2)
+        self.assertEqual(self.lookup.resolve('ABC123')['vehicle_id'], 1)
+        self.assertEqual(self.lookup.resolve('ABC12B', org_ids=[10])['plate'], 'ABC123')
+        self.assertEqual(self.lookup.resolve('ABC12B', org_ids=[20])['plate'], 'ABC128')
+        self.assertIsNone(self.lookup.resolve('ABC123', org_ids=[30]))
+        
+        # Removing one organization's copy of a shared plate leaves the other
+        self.lookup.remove(1)
+        self.assertIsNone(self.lookup.resolve('ABC123', org_ids=[10]))
+        self.assertEqual(self.lookup.resolve('ABC123', org_ids=[20])['vehicle_id'], 2)
+        self.lookup.add(2, 'ABC123', 10)
+        self.assertEqual(self.lookup.resolve('ABC123', org_ids=[10])['vehicle_id'], 2)
+        self.assertEqual(self.lookup.resolve('ABC123', org_ids=[20])['plate'], 'ABC128')
+    
+    def test_ambiguous_read_is_not_resolved(self):
+        """Test a read equally close to two registered plates matches neither"""
+        self.lookup.load([(1, 'AB1O', None), (2, 'AB10', None)])
+        self.assertIsNone(self.lookup.resolve('AB1D'))
+        self.assertEqual(self.lookup.resolve('AB10')['vehicle_id'], 2)
+    
+    def test_vehicle_signals_keep_lookup_fresh(self):
+        """Test created, renamed and deleted vehicles reach the shared lookup"""
+        org = Organization.objects.create(name='Plate Org', account='PLATE001', website='https://plate.com')
+        plate_lookup.load_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            vehicle = Vehicle.objects.create(vin='PLATE123456789', license_plate='mh 12-ab 1234', org=org)
+        self.assertEqual(vehicle.plate_normalized, 'MH12AB1234')
+        self.assertEqual(plate_lookup.resolve('MH12AB1234')['vehicle_id'], vehicle.id)
+        
+        vehicle.license_plate = 'MH12CD5678'
+        with self.captureOnCommitCallbacks(execute=True):
+            vehicle.save(update_fields=['license_plate'])
+        self.assertEqual(Vehicle.objects.get(id=vehicle.id).plate_normalized, 'MH12CD5678')
+        self.assertIsNone(plate_lookup.resolve('MH12AB1234'))
+        self.assertEqual(plate_lookup.resolve('MHI2CD5678')['vehicle_id'], vehicle.id)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            vehicle.delete()
+        self.assertIsNone(plate_lookup.resolve('MH12CD5678'))
+    
+    def test_other_workers_reload_after_a_change(self):
+        """Test a vehicle change bumps the version in the shared cache, so another worker's lookup reloads"""
+        org = Organization.objects.create(name='Plate Org', account='PLATE001', website='https://plate.com')
+        plate_lookup.load_from_db()
+        self.lookup.load_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            vehicle = Vehicle.objects.create(vin='PLATE123456789', license_plate='MH12AB1234', org=org)
+        self.assertNotEqual(caches['index'].get(PLATE_LOOKUP_VERSION_KEY), self.lookup._version)
+        self.assertIsNone(self.lookup.resolve('MH12AB1234'))
+        self.lookup.ensure_loaded()
+        self.assertEqual(self.lookup.resolve('MH12AB1234')['vehicle_id'], vehicle.id)
+    
+    @override_settings(AI_SETTINGS={**settings.AI_SETTINGS, 'PLATE_LOOKUP_IN_MEMORY': False})
+    def test_database_lookup_uses_normalized_column(self):
+        from .plate_lookup import resolve_vehicle
+        
+        org = Organization.objects.create(name='Plate Org', account='PLATE001', website='https://plate.com')
+        vehicle = Vehicle.objects.create(vin='PLATE123456789', license_plate='AB 123', org=org)
+        self.assertEqual(resolve_vehicle('ab-123')[0], vehicle.id)
+        self.assertEqual(resolve_vehicle('AB12')[0], None)
+
+class OCREngineTestCase(TestCase):
+    """Test the OCR engine abstraction"""
+    
+    def test_parse_config(self):
+        """Test tesseract CLI configs are split into init and runtime settings"""
+        oem, psm, variables = parse_config('--oem 1 --psm 8 -c tessedit_char_whitelist=ABC123')
+        self.assertEqual((oem, psm), (1, 8))
+        self.assertEqual(variables, {'tessedit_char_whitelist': 'ABC123'})
+        self.assertEqual(parse_config(''), (3, 3, {}))
+    
+    @patch('ai_features.ocr.pytesseract.image_to_data')
+    def test_pytesseract_engine_confidences(self, mock_data):
+        """Test word confidences from image_to_data are spread over their characters"""
+        mock_data.return_value = {'text': ['', 'AB', ' ', 'C1'], 'conf': ['-1', '91.5', '-1', 40]}
+        engine = PytesseractEngine()
+        chars = engine.image_to_chars(np.zeros((10, 10), dtype=np.uint8), config='--psm 7')
+        self.assertEqual(chars, [('A', 91.5), ('B', 91.5), ('C', 40.0), ('1', 40.0)])
+        self.assertEqual(mock_data.call_args[1]['config'], '--psm 7')
+    
+    @patch('ai_features.ocr.pytesseract.image_to_string')
+    def test_pytesseract_engine(self, mock_ocr):
+        """Test the subprocess engine passes the config through"""
+        mock_ocr.return_value = 'ABC123\n'
+        engine = PytesseractEngine()
+        self.assertEqual(engine.image_to_string(np.zeros((10, 10), dtype=np.uint8), config='--psm 8'), 'ABC123\n')
+        self.assertEqual(mock_ocr.call_args[1]['config'], '--psm 8')
+    
+    def test_tesserocr_engine_reads_plate(self):
+        """Test the in-process engine reads a rendered plate and keeps one API per thread"""
+        if tesserocr is None:
+            self.skipTest('tesserocr is not installed')
+        try:
+            engine = TesserocrEngine(settings.AI_SETTINGS.get('TESSDATA_PATH'))
+        except RuntimeError:
+            self.skipTest('Tesseract language data is not installed')
+        image = Image.new('L', (320, 90), 255)
+        ImageDraw.Draw(image).text((20, 15), 'ABC123', fill=0, font=ImageFont.load_default(size=48))
+        config = '--oem 3 --psm 7 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+        
+        text = engine.image_to_string(np.array(image), config=config)
+        chars = engine.image_to_chars(np.array(image), config=config)
+        
+        self.assertEqual(text.strip().replace(' ', ''), 'ABC123')
+        self.assertEqual(''.join(char for char, _ in chars), 'ABC123')
+        self.assertTrue(all(0 < confidence <= 100 for _, confidence in chars))
+        self.assertIs(engine._api(3), engine._api(3))
+
+class BlobStoreTestCase(TestCase):
+    """Test the content-addressed image store and the row migration command"""
+    
+    def setUp(self):
+        self.blob_dir = use_temp_blob_storage(self)
+        image = Image.new('RGB', (40, 30), color='green')
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        self.image_bytes = buffer.getvalue()
+        self.image_b64 = f"data:image/png;base64,{base64.b64encode(self.image_bytes).decode()}"
+    
+    def stored_files(self):
+        return [name for _, _, files in os.walk(self.blob_dir) for name in files]
+    
+    def test_identical_content_is_stored_once(self):
+        """Test blobs are keyed by SHA-256 and deduplicated"""
+        ref = blob_store.put(self.image_bytes)
+        self.assertEqual(len(ref), 64)
+        self.assertEqual(blob_store.path(ref), f'{ref[:2]}/{ref[2:4]}/{ref}')
+        
+        upload = SimpleUploadedFile('green.png', self.image_bytes, content_type='image/png')
+        self.assertEqual(store_image(upload), ref)
+        self.assertEqual(store_image(self.image_b64), ref)
+        self.assertEqual(self.stored_files(), [ref])
+        
+        self.assertEqual(blob_store.read(ref), self.image_bytes)
+        self.assertEqual(store_image(None), '')
+    
+    def test_pluggable_storage(self):
+        """Test any Django storage can back the store"""
+        with tempfile.TemporaryDirectory() as directory:
+            from django.core.files.storage import FileSystemStorage
+            store = BlobStore(FileSystemStorage(location=directory))
+            ref = store.put(self.image_bytes)
+            self.assertTrue(os.path.exists(os.path.join(directory, store.path(ref))))
+            self.assertFalse(blob_store.exists(ref))
+    
+    def test_migrate_images_to_blobs(self):
+        """Test the migration command moves base64 columns into blobs in batches"""
+        org = Organization.objects.create(name='Blob Org', account='BLOB001', website='https://blob.com')
+        user = User.objects.create_user(username='blob_driver', password='testpass123', role='DRIVER', org=org)
+        vehicle = Vehicle.objects.create(vin='BLOB123456789', license_plate='BLB123', make='Test', model='Vehicle', year=2023, org=org)
+        for _ in range(5):
+            FaceAttendanceLog.objects.create(user=user, scan_type='CHECK_IN', confidence_score=90, scanned_image=self.image_b64)
+        bad = FaceAttendanceLog.objects.create(user=user, scan_type='CHECK_IN', confidence_score=90, scanned_image='not base64!')
+        record = LicensePlateRecord.objects.create(
+            vehicle=vehicle, detected_plate='BLB123', confidence_score=90, original_image=self.image_b64, entry_type='ENTRY'
+        )
+        
+        out, err = io.StringIO(), io.StringIO()
+        call_command('migrate_images_to_blobs', batch_size=2, stdout=out, stderr=err)
+        
+        ref = blob_store.put(self.image_bytes)
+        logs = FaceAttendanceLog.objects.exclude(id=bad.id)
+        self.assertEqual(set(logs.values_list('scanned_image_ref', flat=True)), {ref})
+        self.assertEqual(set(logs.values_list('scanned_image', flat=True)), {''})
+        record.refresh_from_db()
+        self.assertEqual((record.original_image_ref, record.original_image), (ref, ''))
+        self.assertEqual(self.stored_files(), [ref])
+        self.assertIn('moved 5 rows', out.getvalue())
+        
+        # Moved scans get their archive copy and thumbnail like new ones
+        drain()
+        self.assertFalse(logs.filter(thumbnail_ref='').exists())
+        record.refresh_from_db()
+        self.assertTrue(record.thumbnail_ref)
+        
+        # Undecodable rows are reported and left alone
+        bad.refresh_from_db()
+        self.assertEqual((bad.scanned_image_ref, bad.scanned_image), ('', 'not base64!'))
+        self.assertIn(f'id={bad.id}', err.getvalue())
+        
+        # Re-running finds nothing left to move
+        out = io.StringIO()
+        call_command('migrate_images_to_blobs', dry_run=True, stdout=out)
+        self.assertIn('FaceAttendanceLog.scanned_image: 1 rows to move', out.getvalue())
+
+def noise_image(width, height):
+    return np.random.default_rng(5).integers(0, 255, (height, width, 3), dtype=np.uint8)
+
+class ScanPostprocessTestCase(TestCase):
+    """Test archive copies, thumbnails and blob pruning"""
+    
+    def setUp(self):
+        self.blob_dir = use_temp_blob_storage(self)
+        self.org = Organization.objects.create(name='Scan Org', account='SCAN001', website='https://scan.com')
+        self.user = User.objects.create_user(username='scan_driver', password='testpass123', role='DRIVER', org=self.org)
+        buffer = io.BytesIO()
+        Image.fromarray(noise_image(2000, 1000)).save(buffer, format='PNG')
+        self.large_png = buffer.getvalue()
+    
+    def create_log(self):
+        return FaceAttendanceLog.objects.create(
+            user=self.user, scan_type='CHECK_IN', confidence_score=90, scanned_image_ref=store_image(self.large_png)
+        )
+    
+    def test_derive_images(self):
+        """Test archive copies are bounded and thumbnails small, in the configured format"""
+        archive, thumbnail = derive_images(self.large_png, max_side=1280, thumbnail_size=160, image_format='WEBP')
+        with Image.open(io.BytesIO(archive)) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (1280, 640)))
+        with Image.open(io.BytesIO(thumbnail)) as image:
+            self.assertEqual(image.size, (160, 80))
+        self.assertLess(len(archive), len(self.large_png))
+        
+        # Small JPEGs are not re-encoded
+        small = io.BytesIO()
+        Image.fromarray(noise_image(100, 100)).save(small, format='JPEG', quality=50)
+        archive, _ = derive_images(small.getvalue(), image_format='JPEG')
+        self.assertEqual(archive, small.getvalue())
+    
+    def test_scan_is_postprocessed_by_task(self):
+        """Test new scans get an archive copy and thumbnail, and the raw upload is dropped"""
+        raw_ref = blob_store.put(self.large_png)
+        log = self.create_log()
+        self.assertEqual(drain(), 1)
+        log.refresh_from_db()
+        
+        self.assertNotEqual(log.scanned_image_ref, raw_ref)
+        self.assertTrue(log.thumbnail_ref)
+        self.assertEqual(log.raw_image_ref, '')
+        with Image.open(blob_store.open(log.scanned_image_ref)) as image:
+            self.assertEqual((image.format, max(image.size)), ('JPEG', 1280))
+        
+        # Running again changes nothing
+        self.assertFalse(process_scan_image('ai_features.FaceAttendanceLog', log.pk))
+    
+    def test_originals_kept_by_policy(self):
+        """Test SCAN_KEEP_ORIGINALS keeps a reference to the full upload"""
+        log = self.create_log()
+        raw_ref = log.scanned_image_ref
+        with self.settings(AI_SETTINGS={**settings.AI_SETTINGS, 'SCAN_KEEP_ORIGINALS': True}):
+            self.assertTrue(process_scan_image('ai_features.FaceAttendanceLog', log.pk))
+        log.refresh_from_db()
+        self.assertEqual(log.raw_image_ref, raw_ref)
+        self.assertEqual(blob_store.read(raw_ref), self.large_png)
+    
+    def test_prune_blobs(self):
+        """Test only unreferenced blobs past the grace period are deleted"""
+        log = self.create_log()
+        raw_ref = log.scanned_image_ref
+        process_scan_image('ai_features.FaceAttendanceLog', log.pk)
+        log.refresh_from_db()
+        
+        out = io.StringIO()
+        call_command('prune_blobs', stdout=out)
+        self.assertIn('deleted 0', out.getvalue())
+        self.assertTrue(blob_store.exists(raw_ref))
+        
+        call_command('prune_blobs', grace_hours=0, stdout=out)
+        self.assertFalse(blob_store.exists(raw_ref))
+        self.assertTrue(blob_store.exists(log.scanned_image_ref))
+        self.assertTrue(blob_store.exists(log.thumbnail_ref))
+    
+    def test_prune_blobs_keeps_task_and_reused_blobs(self):
+        """Test blobs named only by unfinished tasks, or just re-uploaded, survive pruning"""
+        pending_ref = store_image(self.large_png)
+        Task.objects.create(name='ai_features.record_plate_scan', payload={'image_ref': pending_ref})
+        failed_ref = blob_store.put(b'failed scan')
+        Task.objects.create(name='ai_features.record_face_attendance', status='FAILED', payload={'logs': [{'image_ref': failed_ref}]})
+        
+        out = io.StringIO()
+        call_command('prune_blobs', grace_hours=0, stdout=out)
+        self.assertTrue(blob_store.exists(pending_ref))
+        self.assertTrue(blob_store.exists(failed_ref))
+        
+        # Re-uploading old content restarts its grace period
+        reused_ref = blob_store.put(b'reused scan')
+        old = time.time() - 48 * 3600
+        os.utime(os.path.join(self.blob_dir, blob_store.path(reused_ref)), (old, old))
+        self.assertEqual(blob_store.put(b'reused scan'), reused_ref)
+        call_command('prune_blobs', stdout=out)
+        self.assertTrue(blob_store.exists(reused_ref))
+        
+        Task.objects.all().delete()
+        call_command('prune_blobs', grace_hours=0, stdout=out)
+        self.assertFalse(blob_store.exists(pending_ref))
+        self.assertFalse(blob_store.exists(failed_ref))
+        self.assertFalse(blob_store.exists(reused_ref))
 
 class ModelTestCase(TestCase):
     """Test AI feature models"""
@@ -519,6 +2016,42 @@ class ModelTestCase(TestCase):
         self.assertTrue(face_data.is_active)
         self.assertIsNotNone(face_data.created_at)
     
+    def test_face_encoding_binary_storage(self):
+        """Test encodings round-trip through the float32 binary column"""
+        encoding = np.random.rand(128)
+        face_data = FaceEncoding.objects.create(user=self.user, encoding_vector=pack_encoding(encoding))
+        face_data.refresh_from_db()
+        
+        self.assertEqual(len(bytes(face_data.encoding_vector)), 128 * 4)
+        self.assertEqual(face_data.encoding.dtype, np.float32)
+        np.testing.assert_allclose(face_data.encoding, encoding, rtol=1e-6)
+        
+        # Rows not yet migrated still read from the legacy JSON column
+        self.assertEqual(unpack_encoding(None, json.dumps([1.0, 2.0])).tolist(), [1.0, 2.0])
+        self.assertIsNone(unpack_encoding(None, ''))
+    
+    def test_face_encoding_samples(self):
+        """Test several samples are stored with their normalized centroid"""
+        samples = np.random.rand(3, 128)
+        face_data = FaceEncoding(user=self.user)
+        face_data.set_samples(list(samples))
+        face_data.save()
+        face_data.refresh_from_db()
+        
+        self.assertEqual(face_data.sample_count, 3)
+        np.testing.assert_allclose(face_data.samples, samples, rtol=1e-6)
+        # The centroid points along the unit samples' mean, at their mean length
+        centroid = face_data.encoding
+        self.assertAlmostEqual(np.linalg.norm(centroid), np.linalg.norm(samples, axis=1).mean(), places=4)
+        direction = (samples / np.linalg.norm(samples, axis=1)[:, None]).mean(axis=0)
+        np.testing.assert_allclose(centroid / np.linalg.norm(centroid), direction / np.linalg.norm(direction), rtol=1e-5)
+        
+        # A single sample is its own centroid and is not stored twice
+        face_data.set_encoding(samples[0])
+        self.assertIsNone(face_data.samples_vector)
+        np.testing.assert_allclose(face_data.samples, samples[:1], rtol=1e-6)
+        np.testing.assert_allclose(face_centroid([samples[0]]), samples[0], rtol=1e-6)
+    
     def test_face_attendance_log_model(self):
         """Test FaceAttendanceLog model"""
         log = FaceAttendanceLog.objects.create(
@@ -1,10 +1,17 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     path('register-face/', views.register_face, name='register_face'),
     path('verify-face/', views.verify_face, name='verify_face'),
+    path('verify-faces-batch/', views.verify_faces_batch, name='verify_faces_batch'),
     path('scan-license-plate/', views.scan_license_plate, name='scan_license_plate'),
+    path('scan-license-plate-stream/', views.scan_license_plate_stream, name='scan_license_plate_stream'),
+    path('plate-cache-stats/', views.plate_cache_stats, name='plate_cache_stats'),
     path('face-attendance-logs/', views.face_attendance_logs, name='face_attendance_logs'),
     path('license-plate-logs/', views.license_plate_logs, name='license_plate_logs'),
+    # Async variants for ASGI workers (same requests and responses)
+    path('async/register-face/', async_views.register_face, name='register_face_async'),
+    path('async/verify-face/', async_views.verify_face, name='verify_face_async'),
+    path('async/scan-license-plate/', async_views.scan_license_plate, name='scan_license_plate_async'),
 ]
\ No newline at end of file
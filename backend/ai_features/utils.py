@@ -6,9 +6,20 @@ import cv2
 from PIL import Image
 import io
 import face_recognition
-import pytesseract
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from django.conf import settings
+from .models import unpack_encoding
+from .face_index import face_index
+from .images import decode_image
+from .ocr import get_ocr_engine
+from .plates import localize_plates
+from .plate_cache import PlateResultCache, plate_hash
+from .preprocess import BufferPool, Preprocessor
+from .quality import FrameRejected, check_frame, min_face_size, quality_settings
+from .workers import RecognitionBusy, detect_and_encode, detect_faces, encode_faces, recognition_pool
 import logging
 
 logger = logging.getLogger(__name__)
@@ -19,17 +30,7 @@ class ImageProcessor:
     @staticmethod
     def decode_base64_image(base64_string):
         """Convert base64 string to numpy array"""
-        try:
-            # Remove data URL prefix if present
-            if ',' in base64_string:
-                base64_string = base64_string.split(',')[1]
-            
-            image_bytes = base64.b64decode(base64_string)
-            image = Image.open(io.BytesIO(image_bytes))
-            return np.array(image)
-        except Exception as e:
-            logger.error(f"Failed to decode base64 image: {str(e)}")
-            raise ValueError(f"Invalid image data: {str(e)}")
+        return decode_image(base64_string)
     
     @staticmethod
     def encode_image_to_base64(image_array):
@@ -47,9 +48,54 @@ class ImageProcessor:
 class FaceRecognitionProcessor:
     """Face recognition utility class"""
     
-    def __init__(self, tolerance=0.6):
+    def __init__(self, tolerance=0.6, pool=None, max_side=None, quality_gate=False):
         self.tolerance = tolerance
+        self.pool = pool if pool is not None else recognition_pool
+        if max_side is None:
+            max_side = getattr(settings, 'AI_SETTINGS', {}).get('FACE_DETECTION_MAX_SIDE')
+        self.max_side = max_side
+        # Verification rejects poor frames (FrameRejected) before spending detection and encoding on them
+        self.quality = quality_settings() if quality_gate else None
+        self.min_face_size = min_face_size(self.quality) if quality_gate else 0
     
+    def check_frame(self, image_array):
+        """Raise FrameRejected for a blurred, dark or overexposed frame when the quality gate is on"""
+        if self.quality:
+            check_frame(image_array, self.quality)
+    
+    def detect_and_encode(self, image_array):
+        """Find faces and compute their encodings on the recognition pool"""
+        self.check_frame(image_array)
+        return self.pool.run(detect_and_encode, image_array, self.max_side, self.min_face_size)
+
+    def detect_and_encode_many(self, image_arrays):
+        """detect_and_encode() for several images, all in flight on the pool at once.
+
+        Returns one (face_locations, face_encodings) per image, or the exception
+        its job raised; RecognitionBusy, and FrameRejected from the quality gate's
+        frame checks, are raised for the whole call.
+        """
+        if len(image_arrays) == 1:
+            return [self.detect_and_encode(image_arrays[0])]
+        futures = []
+        try:
+            for image_array in image_arrays:
+                self.check_frame(image_array)
+                futures.append(self.pool.submit(detect_and_encode, image_array, self.max_side, self.min_face_size))
+        except (RecognitionBusy, FrameRejected):
+            for future in futures:
+                future.cancel()
+            raise
+        results = []
+        for future in futures:
+            try:
+                results.append(self.pool.result(future))
+            except RecognitionBusy:
+                raise
+            except Exception as e:
+                results.append(e)
+        return results
+
     def extract_face_encoding(self, image_array):
         """Extract face encoding from image"""
         try:
@@ -60,8 +106,8 @@ class FaceRecognitionProcessor:
             else:
                 rgb_image = image_array
             
-            # Find face locations
-            face_locations = face_recognition.face_locations(rgb_image)
+            # Find face locations on a downscaled copy
+            face_locations = detect_faces(rgb_image, self.max_side)
             
             if not face_locations:
                 raise ValueError("No face detected in image")
@@ -69,8 +115,8 @@ class FaceRecognitionProcessor:
             if len(face_locations) > 1:
                 raise ValueError("Multiple faces detected. Please use image with single face")
             
-            # Generate face encodings
-            face_encodings = face_recognition.face_encodings(rgb_image, face_locations)
+            # Generate face encodings from the cropped face region
+            face_encodings = encode_faces(rgb_image, face_locations)
             
             if not face_encodings:
                 raise ValueError("Could not generate face encoding")
@@ -97,13 +143,19 @@ class FaceRecognitionProcessor:
                 return {
                     'matches': [],
                     'distances': [],
-                    'best_match': None,
+                    'best_match_index': None,
                     'confidence': 0
                 }
             
-            # Perform comparison
-            matches = face_recognition.compare_faces(known_encodings, unknown_encoding, tolerance=self.tolerance)
+            # Stored encodings arrive as raw float32 bytes
+            known_encodings = [
+                unpack_encoding(encoding) if isinstance(encoding, (bytes, memoryview)) else encoding
+                for encoding in known_encodings
+            ]
+            
+            # Perform comparison (one distance pass; matches are derived from it)
             distances = face_recognition.face_distance(known_encodings, unknown_encoding)
+            matches = list(distances <= self.tolerance)
             
             best_match_index = None
             confidence = 0
@@ -130,113 +182,259 @@ class FaceRecognitionProcessor:
                 'confidence': 0,
                 'error': str(e)
             }
+    
+    def identify(self, unknown_encoding, index=None, org_ids=None):
+        """Find the enrolled user closest to an encoding using the face index.
+
+        org_ids limits the search to those organizations' shards (None = all).
+        """
+        index = index if index is not None else face_index
+        match = index.search(unknown_encoding, self.tolerance, org_ids=org_ids)
+        if not match:
+            return {'user_id': None, 'distance': None, 'confidence': 0}
+        return {
+            'user_id': match['user_id'],
+            'distance': match['distance'],
+            'confidence': max(0, (1 - match['distance']) * 100)
+        }
+
+    def identify_batch(self, unknown_encodings, index=None, org_ids=None):
+        """identify() for many probes, matched against the index in one pass"""
+        index = index if index is not None else face_index
+        matches = index.search_batch(unknown_encodings, self.tolerance, org_ids=org_ids)
+        return [
+            {
+                'user_id': match['user_id'],
+                'distance': match['distance'],
+                'confidence': max(0, (1 - match['distance']) * 100)
+            } if match else {'user_id': None, 'distance': None, 'confidence': 0}
+            for match in matches
+        ]
+
+# OCR configurations for license plates
+OCR_CONFIGS = [
+    r'--oem 3 --psm 8 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789',
+    r'--oem 3 --psm 7 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789',
+    r'--oem 3 --psm 6 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789',
+    r'--oem 3 --psm 13',
+]
+
+# Variant names produced by LicensePlateProcessor.preprocess_image, in order
+PREPROCESS_METHODS = ('original', 'adaptive_thresh', 'otsu_thresh', 'morphological', 'edges', 'enhanced')
+
+# Common license plate patterns (adjust based on your region)
+STRICT_PLATE_PATTERNS = [
+    r'^[A-Z]{2,3}[0-9]{3,4}$',  # ABC123, AB1234
+    r'^[0-9]{3}[A-Z]{3}$',      # 123ABC  
+    r'^[A-Z][0-9]{3}[A-Z]{3}$', # A123ABC
+    r'^[A-Z]{3}[0-9]{3}$',      # ABC123
+    r'^[0-9]{2}[A-Z]{2}[0-9]{2}$', # 12AB34
+]
+GENERIC_PLATE_PATTERN = r'^[A-Z0-9]{4,8}$'  # Generic alphanumeric
+
+_ocr_pool = None
+_ocr_pool_lock = threading.Lock()
+
+# Preprocessing buffers recycled between requests on the same thread
+ocr_buffers = BufferPool()
+
+def get_ocr_pool(threads):
+    """Long-lived OCR threads, so each keeps its warm Tesseract engine between requests"""
+    global _ocr_pool
+    with _ocr_pool_lock:
+        if _ocr_pool is None:
+            _ocr_pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='ocr')
+        return _ocr_pool
 
 class LicensePlateProcessor:
     """License plate OCR utility class"""
     
-    def __init__(self):
-        # Configure Tesseract path from settings
-        if hasattr(settings, 'AI_SETTINGS') and 'TESSERACT_PATH' in settings.AI_SETTINGS:
-            pytesseract.pytesseract.tesseract_cmd = settings.AI_SETTINGS['TESSERACT_PATH']
+    def __init__(self, engine=None, cache=None):
+        # Warm OCR engine shared by the process (tesserocr, or pytesseract with TESSERACT_PATH)
+        self.engine = engine if engine is not None else get_ocr_engine()
+        # Results of recently read plates, shared by all workers
+        self.cache = cache if cache is not None else PlateResultCache()
     
     def preprocess_image(self, image_array):
         """Apply various preprocessing techniques for better OCR"""
         try:
-            # Convert to grayscale
-            if len(image_array.shape) == 3:
-                gray = cv2.cvtColor(image_array, cv2.COLOR_BGR2GRAY)
-            else:
-                gray = image_array
-            
-            processed_images = []
-            
-            # Method 1: Original grayscale
-            processed_images.append(('original', gray))
-            
-            # Method 2: Gaussian blur + adaptive threshold
-            blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-            thresh1 = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
-            processed_images.append(('adaptive_thresh', thresh1))
-            
-            # Method 3: OTSU threshold
-            _, thresh2 = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-            processed_images.append(('otsu_thresh', thresh2))
-            
-            # Method 4: Morphological operations
-            kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
-            opening = cv2.morphologyEx(thresh2, cv2.MORPH_OPEN, kernel, iterations=1)
-            processed_images.append(('morphological', opening))
-            
-            # Method 5: Edge detection
-            edges = cv2.Canny(gray, 50, 150)
-            processed_images.append(('edges', edges))
-            
-            # Method 6: Contrast enhancement
-            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-            enhanced = clahe.apply(gray)
-            processed_images.append(('enhanced', enhanced))
-            
-            return processed_images
+            stages = Preprocessor(image_array)
+            return [(method_name, stages[method_name]) for method_name in PREPROCESS_METHODS]
             
         except Exception as e:
             logger.error(f"Image preprocessing failed: {str(e)}")
             return [('original', image_array)]
     
-    def extract_text(self, image_array):
-        """Extract text from license plate image using multiple methods"""
+    def _ocr_variant(self, method_name, proc_img, config):
+        """Run one preprocessing variant/config pair, timing the Tesseract call"""
+        start = time.perf_counter()
+        chars = self.engine.image_to_chars(proc_img, config=config)
+        # Clean detected text, keeping each remaining character's confidence
+        chars = [(char.upper(), confidence) for char, confidence in chars if re.fullmatch(r'[A-Z0-9]', char.upper())]
+        text = ''.join(char for char, _ in chars)
+        confidences = [round(float(confidence), 1) for _, confidence in chars]
+        return text, confidences, round((time.perf_counter() - start) * 1000, 2)
+    
+    def extract_text(self, image_array, variants=None, use_cache=True):
+        """Extract text from license plate image using multiple methods.
+
+        Variants run on a thread pool (Tesseract works in a subprocess, outside
+        the GIL), in two stages:
+        - the plain grayscale crop under every config
+        - only if that found no confident strict-pattern plate, the remaining
+          preprocessing methods, built lazily from the region's shared
+          Preprocessor stages
+        A read's confidence is the mean of Tesseract's per-character
+        confidences. Reads below MIN_PLATE_CONFIDENCE are dropped. Once a read
+        matches a strict pattern with confidence >= OCR_EARLY_EXIT_CONFIDENCE,
+        the remaining variants are cancelled.
+        variants limits the run to (method index, config index) pairs; use_cache=False
+        skips the plate result cache, for callers that want an independent read.
+        """
         try:
-            processed_images = self.preprocess_image(image_array)
+            started = time.perf_counter()
             detected_plates = []
+            selected = set(variants) if variants is not None else None
+            variants = []
+            early_exit = False
+            
+            ai_settings = getattr(settings, 'AI_SETTINGS', {})
+            threads = ai_settings.get('OCR_THREADS', 4)
+            exit_confidence = ai_settings.get('OCR_EARLY_EXIT_CONFIDENCE', 85)
+            min_confidence = ai_settings.get('MIN_PLATE_CONFIDENCE', 60)
             
-            # OCR configurations for license plates
-            configs = [
-                r'--oem 3 --psm 8 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789',
-                r'--oem 3 --psm 7 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789',
-                r'--oem 3 --psm 6 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789',
-                r'--oem 3 --psm 13',
+            # OCR only the localized plate crops; fall back to the whole frame when none are found.
+            # Each region's preprocessing stages are shared by all its variants.
+            frame = Preprocessor(image_array, pool=ocr_buffers)
+            preprocessors = [frame]
+            candidates = localize_plates(frame['gray']) if ai_settings.get('PLATE_LOCALIZATION', True) else []
+            localize_ms = round((time.perf_counter() - started) * 1000, 2)
+            if candidates:
+                regions = [(k, Preprocessor(candidate['image'], pool=ocr_buffers)) for k, candidate in enumerate(candidates)]
+                preprocessors += [stages for _, stages in regions]
+            else:
+                regions = [(None, frame)]
+            candidate_info = [
+                {key: candidate[key] for key in ('box', 'angle', 'aspect')} for candidate in candidates
             ]
             
-            for i, (method_name, proc_img) in enumerate(processed_images):
-                for j, config in enumerate(configs):
-                    try:
-                        text = pytesseract.image_to_string(proc_img, config=config).strip().upper()
+            # A near-identical plate crop was read recently: reuse its result. Whole frames are
+            # not cached: a fixed camera's background dominates their hash, whatever the plate.
+            use_cache = use_cache and bool(candidates)
+            crop_hash = plate_hash(regions[0][1]['gray']) if use_cache else None
+            cached, distance = self.cache.lookup(crop_hash) if use_cache else (None, None)
+            if cached is not None:
+                for stages in preprocessors:
+                    stages.close()
+                return {
+                    **cached,
+                    'candidates': candidate_info,
+                    'localize_ms': localize_ms,
+                    'variants': [],
+                    'early_exit': False,
+                    'cache': {'hit': True, 'distance': distance, 'hash': f'{crop_hash:032x}'},
+                    'total_ms': round((time.perf_counter() - started) * 1000, 2)
+                }
+            
+            pool = get_ocr_pool(threads)
+            in_flight = False
+            
+            def run_stage(images):
+                """OCR (candidate, method index, method, image) jobs; True on an early exit"""
+                nonlocal in_flight
+                futures = {}
+                for k, i, method_name, proc_img in images:
+                    for j, config in enumerate(OCR_CONFIGS):
+                        if selected is not None and (i, j) not in selected:
+                            continue
+                        variant = {'candidate': k, 'method': method_name, 'config_index': j, 'status': 'cancelled'}
+                        variants.append(variant)
+                        futures[pool.submit(self._ocr_variant, method_name, proc_img, config)] = (k or 0, i, j, variant)
+                try:
+                    for future in as_completed(futures):
+                        k, i, j, variant = futures[future]
+                        try:
+                            text, confidences, elapsed_ms = future.result()
+                        except Exception as e:
+                            logger.warning(f"OCR failed for {variant['method']} with config {j}: {str(e)}")
+                            variant.update({'status': 'error', 'error': str(e)})
+                            continue
                         
-                        # Clean detected text
-                        text = re.sub(r'[^A-Z0-9]', '', text)
+                        confidence = round(sum(confidences) / len(confidences), 1) if confidences else 0
+                        variant.update({'status': 'done', 'text': text, 'confidence': confidence, 'ms': elapsed_ms})
                         
-                        # Validate license plate format
-                        if self.is_valid_license_plate(text):
-                            # Calculate confidence based on method and config
-                            base_confidence = 95 - (i * 5) - (j * 2)
-                            confidence = max(base_confidence, 50)
-                            
-                            detected_plates.append({
-                                'text': text,
-                                'confidence': confidence,
-                                'method': method_name,
-                                'config_index': j
-                            })
-                            
-                    except Exception as e:
-                        logger.warning(f"OCR failed for {method_name} with config {j}: {str(e)}")
-                        continue
+                        # Validate license plate format and Tesseract's confidence in the read
+                        if not self.is_valid_license_plate(text) or confidence < min_confidence:
+                            continue
+                        
+                        detected_plates.append({
+                            'text': text,
+                            'confidence': confidence,
+                            'char_confidences': confidences,
+                            'method': variant['method'],
+                            'config_index': j,
+                            'candidate': variant['candidate'],
+                            '_rank': (k, i, j)
+                        })
+                        
+                        if confidence >= exit_confidence and self.is_strict_license_plate(text):
+                            return True
+                finally:
+                    # Drop variants that have not started; running Tesseract calls finish in the background
+                    for future in futures:
+                        in_flight |= not future.cancel() and not future.done()
+                return False
+            
+            try:
+                # The plain crops first; the other preprocessing is only built if they were not enough
+                plain = [(k, 0, PREPROCESS_METHODS[0], stages['original']) for k, stages in regions]
+                early_exit = run_stage(plain)
+                if not early_exit and (selected is None or any(i > 0 for i, _ in selected)):
+                    processed = [
+                        (k, i, method_name, stages[method_name])
+                        for k, stages in regions
+                        for i, method_name in enumerate(PREPROCESS_METHODS)
+                        if i > 0 and (selected is None or any(i == m for m, _ in selected))
+                    ]
+                    early_exit = run_stage(processed)
+            finally:
+                preprocess_ms = round(sum(sum(stages.timings.values()) for stages in preprocessors), 2)
+                # Background Tesseract calls may still be reading the buffers
+                for stages in preprocessors:
+                    stages.close(recycle=not in_flight)
+            
+            timings = {
+                'candidates': candidate_info,
+                'localize_ms': localize_ms,
+                'preprocess_ms': preprocess_ms,
+                'variants': variants,
+                'early_exit': early_exit,
+                'cache': {'hit': False, 'distance': None, 'hash': f'{crop_hash:032x}' if use_cache else None},
+                'total_ms': round((time.perf_counter() - started) * 1000, 2)
+            }
             
             if not detected_plates:
                 return {
                     'success': False,
                     'plates': [],
                     'best_result': None,
-                    'error': 'No license plate text detected'
+                    'error': 'No license plate text detected',
+                    **timings
                 }
             
-            # Sort by confidence and return best result
-            detected_plates.sort(key=lambda x: x['confidence'], reverse=True)
+            # Most confident first; earlier candidates, methods and configs break ties
+            detected_plates.sort(key=lambda x: (-x['confidence'], x['_rank']))
+            for plate in detected_plates:
+                del plate['_rank']
             best_result = detected_plates[0]
+            if use_cache:
+                self.cache.store(crop_hash, {'success': True, 'plates': detected_plates, 'best_result': best_result})
             
             return {
                 'success': True,
                 'plates': detected_plates,
-                'best_result': best_result
+                'best_result': best_result,
+                **timings
             }
             
         except Exception as e:
@@ -261,18 +459,12 @@ class LicensePlateProcessor:
         if not re.search(r'[A-Z0-9]', text):
             return False
         
-        # Common license plate patterns (adjust based on your region)
-        patterns = [
-            r'^[A-Z]{2,3}[0-9]{3,4}$',  # ABC123, AB1234
-            r'^[0-9]{3}[A-Z]{3}$',      # 123ABC  
-            r'^[A-Z][0-9]{3}[A-Z]{3}$', # A123ABC
-            r'^[A-Z]{3}[0-9]{3}$',      # ABC123
-            r'^[0-9]{2}[A-Z]{2}[0-9]{2}$', # 12AB34
-            r'^[A-Z0-9]{4,8}$',         # Generic alphanumeric
-        ]
-        
-        for pattern in patterns:
+        for pattern in STRICT_PLATE_PATTERNS + [GENERIC_PLATE_PATTERN]:
             if re.match(pattern, text):
                 return True
         
-        return False
\ No newline at end of file
+        return False
+    
+    def is_strict_license_plate(self, text):
+        """Check text against the region-specific plate patterns only"""
+        return any(re.match(pattern, text or '') for pattern in STRICT_PLATE_PATTERNS)
\ No newline at end of file
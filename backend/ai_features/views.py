@@ -1,85 +1,109 @@
 # backend/ai_features/views.py
-import json
-import base64
-import numpy as np
-import cv2
-from PIL import Image
-import io
 import face_recognition
-import pytesseract
-import re
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, parser_classes, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from rest_framework import status
 from django.contrib.auth import get_user_model
 from .models import FaceEncoding, FaceAttendanceLog, LicensePlateRecord
+from .face_index import face_index, rescore, search_scope
+from .blobs import blob_store, store_image
+from .images import IMAGE_PARSERS, decode_image, get_field, get_image_upload, get_image_uploads
+from .utils import FaceRecognitionProcessor, LicensePlateProcessor
+from .plate_cache import PlateResultCache
+from .plate_consensus import submit_frame
+from .plate_lookup import resolve_vehicle
+from .quality import FrameRejected
+from .workers import RecognitionBusy, detect_and_encode, timed
 from vehicles.models import Vehicle
-from accounts.permissions import IsGuard
+from tasks.queue import enqueue
 
 User = get_user_model()
 
-# Configure Tesseract path (adjust as needed)
-# pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+def busy_response(error):
+    """503 telling the client when to retry a saturated recognition pool"""
+    return Response({'error': str(error)}, status=503, headers={'Retry-After': str(error.retry_after)})
 
-def decode_base64_image(base64_string):
-    """Convert base64 string to numpy array"""
-    try:
-        # Remove data URL prefix if present
-        if ',' in base64_string:
-            base64_string = base64_string.split(',')[1]
-        
-        image_bytes = base64.b64decode(base64_string)
-        image = Image.open(io.BytesIO(image_bytes))
-        return np.array(image)
-    except Exception as e:
-        raise ValueError(f"Invalid image data: {str(e)}")
+def rejected_response(error):
+    """422 for a frame the quality gate turned away, with the reason"""
+    return Response({'error': str(error), 'reason': error.reason, 'score': error.score}, status=422)
+
+def _enrollment_images(request):
+    """Images of a registration: several under 'images', or one under 'image'"""
+    images = get_image_uploads(request)
+    if images:
+        return images
+    image_data = get_image_upload(request)
+    return [image_data] if image_data else []
+
+def _enrollment_samples(images, processor):
+    """Encodings of the enrollment images showing exactly one face, and why the others were rejected"""
+    arrays, rejected = [], []
+    for i, image_data in enumerate(images):
+        try:
+            arrays.append((i, decode_image(image_data)))
+        except ValueError as e:
+            rejected.append({'index': i, 'error': str(e)})
+    
+    encodings = []
+    results = processor.detect_and_encode_many([image_array for _, image_array in arrays]) if arrays else []
+    for (i, _), result in zip(arrays, results):
+        if isinstance(result, Exception):
+            error = f'Could not process face: {result}'
+        elif not result[0]:
+            error = 'No face detected in image'
+        elif len(result[0]) > 1:
+            error = 'Multiple faces detected. Please use image with single face'
+        elif not result[1]:
+            error = 'Could not generate face encoding'
+        else:
+            encodings.append(result[1][0])
+            continue
+        rejected.append({'index': i, 'error': error})
+    rejected.sort(key=lambda rejection: rejection['index'])
+    return encodings, rejected
+
+def _no_samples_error(images, rejected):
+    """register_face error body when no image gave a usable sample"""
+    if len(images) == 1:
+        return {'error': rejected[0]['error']}
+    return {'error': 'No usable face in the images provided', 'rejected': rejected}
 
 @api_view(['POST'])
+@parser_classes(IMAGE_PARSERS)
 @permission_classes([IsAuthenticated])
 def register_face(request):
-    """Register a user's face for recognition"""
+    """Register a user's face for recognition, from one image or several samples"""
     try:
-        user_id = request.data.get('user_id', request.user.id)
-        image_data = request.data.get('image')
+        user_id = get_field(request, 'user_id', request.user.id)
+        images = _enrollment_images(request)
+        max_images = settings.AI_SETTINGS.get('MAX_ENROLLMENT_IMAGES', 5)
         
-        if not image_data:
+        if not images:
             return Response({'error': 'No image provided'}, status=400)
         
+        if len(images) > max_images:
+            return Response({'error': f'At most {max_images} images per registration'}, status=400)
+        
         # Get target user (admins can register for others)
-        if user_id != request.user.id and request.user.role not in ['ADMIN', 'ORG_MANAGER']:
+        if str(user_id) != str(request.user.id) and request.user.role not in ['ADMIN', 'ORG_MANAGER']:
             return Response({'error': 'Permission denied'}, status=403)
         
         target_user = User.objects.get(id=user_id)
         
-        # Decode and process image
-        image_array = decode_base64_image(image_data)
-        rgb_image = cv2.cvtColor(image_array, cv2.COLOR_BGR2RGB)
-        
-        # Find face encodings
-        face_locations = face_recognition.face_locations(rgb_image)
-        if not face_locations:
-            return Response({'error': 'No face detected in image'}, status=400)
+        # Decode the images and encode their faces, all on the recognition pool at once
+        tolerance = settings.AI_SETTINGS.get('FACE_RECOGNITION_TOLERANCE', 0.6)
+        encodings, rejected = _enrollment_samples(images, FaceRecognitionProcessor(tolerance))
+        if not encodings:
+            return Response(_no_samples_error(images, rejected), status=400)
         
-        if len(face_locations) > 1:
-            return Response({'error': 'Multiple faces detected. Please use image with single face'}, status=400)
-        
-        face_encodings = face_recognition.face_encodings(rgb_image, face_locations)
-        if not face_encodings:
-            return Response({'error': 'Could not generate face encoding'}, status=400)
-        
-        # Save encoding
-        encoding_json = json.dumps(face_encodings[0].tolist())
-        
-        face_data, created = FaceEncoding.objects.get_or_create(
-            user=target_user,
-            defaults={'encoding_data': encoding_json}
-        )
-        
-        if not created:
-            face_data.encoding_data = encoding_json
-            face_data.save()
+        # Matching uses the samples' centroid; the samples settle borderline matches
+        face_data = FaceEncoding.objects.filter(user=target_user).first() or FaceEncoding(user=target_user)
+        face_data.set_samples(encodings)
+        face_data.save()
         
         # Update user face registration status
         target_user.is_face_registered = True
@@ -88,40 +112,65 @@ def register_face(request):
         return Response({
             'message': 'Face registered successfully',
             'user': target_user.username,
-            'face_id': face_data.id
+            'face_id': face_data.id,
+            'samples': len(encodings),
+            'rejected': rejected
         })
         
     except User.DoesNotExist:
         return Response({'error': 'User not found'}, status=404)
+    except RecognitionBusy as e:
+        return busy_response(e)
     except Exception as e:
         return Response({'error': str(e)}, status=500)
 
+def _face_match_data(matched_user, confidence, task_id):
+    """verify_face response for a recognized user"""
+    return {
+        'match': True,
+        'user': {
+            'id': matched_user.id,
+            'username': matched_user.username,
+            'role': matched_user.role
+        },
+        'confidence': round(confidence, 2),
+        'task_id': task_id,
+        'message': f'Face verified for {matched_user.username}'
+    }
+
+NO_FACE_MATCH = {
+    'match': False,
+    'confidence': 0,
+    'message': 'Face not recognized'
+}
+
 @api_view(['POST'])
+@parser_classes(IMAGE_PARSERS)
 @permission_classes([IsAuthenticated])
 def verify_face(request):
     """Verify face for attendance/login"""
     try:
-        image_data = request.data.get('image')
-        scan_type = request.data.get('scan_type', 'VERIFICATION')
-        user_id = request.data.get('user_id')  # Optional - for guard verification
+        image_data = get_image_upload(request)
+        scan_type = get_field(request, 'scan_type', 'VERIFICATION')
+        user_id = get_field(request, 'user_id')  # Optional - for guard verification
         
         if not image_data:
             return Response({'error': 'No image provided'}, status=400)
         
-        # Decode image
-        image_array = decode_base64_image(image_data)
-        rgb_image = cv2.cvtColor(image_array, cv2.COLOR_BGR2RGB)
-        
-        # Find faces
-        face_locations = face_recognition.face_locations(rgb_image)
+        # Decode image, turn away poor frames and find faces on the recognition pool
+        image_array = decode_image(image_data)
+        tolerance = settings.AI_SETTINGS.get('FACE_RECOGNITION_TOLERANCE', 0.6)
+        face_locations, face_encodings = FaceRecognitionProcessor(tolerance, quality_gate=True).detect_and_encode(image_array)
         if not face_locations:
             return Response({'error': 'No face detected'}, status=400)
         
-        face_encodings = face_recognition.face_encodings(rgb_image, face_locations)
         if not face_encodings:
             return Response({'error': 'Could not process face'}, status=400)
         
         # Compare with registered faces
+        scanned_encoding = face_encodings[0]
+        matched_user = None
+        
         if user_id:
             # Specific user verification (for guards)
             try:
@@ -130,180 +179,345 @@ def verify_face(request):
             except (User.DoesNotExist, FaceEncoding.DoesNotExist):
                 return Response({'error': 'User face data not found'}, status=404)
             
-            known_encodings = [np.array(json.loads(face_data.encoding_data))]
-            known_users = [target_user]
+            known_encodings = [face_data.encoding]
+            distance = face_recognition.face_distance(known_encodings, scanned_encoding)[0]
+            if distance > tolerance - face_index.sample_margin():
+                distance = rescore(distance, scanned_encoding, face_data.samples)
+            if distance <= tolerance:
+                matched_user = target_user
         else:
-            # General verification - check against all registered faces
-            face_data_list = FaceEncoding.objects.filter(is_active=True).select_related('user')
-            if not face_data_list:
+            # General verification - search the in-memory index of registered faces,
+            # limited to the organizations the requester may verify
+            face_index.ensure_loaded()
+            org_ids = search_scope(request.user)
+            if not face_index.count(org_ids):
                 return Response({'error': 'No registered faces found'}, status=404)
             
-            known_encodings = []
-            known_users = []
-            for face_data in face_data_list:
-                known_encodings.append(np.array(json.loads(face_data.encoding_data)))
-                known_users.append(face_data.user)
+            match = FaceRecognitionProcessor(tolerance).identify(scanned_encoding, face_index, org_ids)
+            if match['user_id']:
+                distance = match['distance']
+                matched_user = User.objects.filter(id=match['user_id']).first()
         
-        # Perform face comparison
-        scanned_encoding = face_encodings[0]
-        matches = face_recognition.compare_faces(known_encodings, scanned_encoding, tolerance=0.6)
-        face_distances = face_recognition.face_distance(known_encodings, scanned_encoding)
-        
-        if any(matches):
-            best_match_index = np.argmin(face_distances)
-            if matches[best_match_index]:
-                matched_user = known_users[best_match_index]
-                confidence = max(0, (1 - face_distances[best_match_index]) * 100)
-                
-                # Log attendance
-                attendance_log = FaceAttendanceLog.objects.create(
-                    user=matched_user,
-                    scan_type=scan_type,
-                    confidence_score=confidence,
-                    scanned_image=image_data,
-                    verified_by=request.user if request.user != matched_user else None
-                )
-                
-                return Response({
-                    'match': True,
-                    'user': {
-                        'id': matched_user.id,
-                        'username': matched_user.username,
-                        'role': matched_user.role
-                    },
-                    'confidence': round(confidence, 2),
-                    'log_id': attendance_log.id,
-                    'message': f'Face verified for {matched_user.username}'
-                })
+        if matched_user:
+            confidence = max(0, (1 - distance) * 100)
+            
+            # Log attendance in the background; the match decision is all the client waits for
+            log_task = enqueue('ai_features.record_face_attendance', logs=[{
+                'user_id': matched_user.id,
+                'scan_type': scan_type,
+                'confidence': float(confidence),
+                'image_ref': store_image(image_data),
+                'verified_by_id': request.user.id if request.user != matched_user else None
+            }])
+            
+            return Response(_face_match_data(matched_user, confidence, log_task.id))
         
         # No match found
-        return Response({
-            'match': False,
-            'confidence': 0,
-            'message': 'Face not recognized'
-        }, status=200)
+        return Response(NO_FACE_MATCH, status=200)
         
+    except FrameRejected as e:
+        return rejected_response(e)
+    except RecognitionBusy as e:
+        return busy_response(e)
     except Exception as e:
         return Response({'error': str(e)}, status=500)
 
+def _elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 2)
+
 @api_view(['POST'])
+@parser_classes(IMAGE_PARSERS)
 @permission_classes([IsAuthenticated])
-def scan_license_plate(request):
-    """Scan and recognize license plate from image"""
+def verify_faces_batch(request):
+    """Verify a burst of gate-camera frames in one request"""
     try:
-        image_data = request.data.get('image')
-        entry_type = request.data.get('entry_type', 'ENTRY')
-        vehicle_id = request.data.get('vehicle_id')
+        images = get_image_uploads(request)
+        scan_type = get_field(request, 'scan_type', 'VERIFICATION')
+        max_images = settings.AI_SETTINGS.get('MAX_BATCH_IMAGES', 16)
         
-        if not image_data:
-            return Response({'error': 'No image provided'}, status=400)
-        
-        # Decode image
-        image_array = decode_base64_image(image_data)
+        if not images:
+            return Response({'error': 'No images provided'}, status=400)
         
-        # Preprocess image for better OCR
-        gray = cv2.cvtColor(image_array, cv2.COLOR_BGR2GRAY)
+        if len(images) > max_images:
+            return Response({'error': f'At most {max_images} images per batch'}, status=400)
         
-        # Apply various preprocessing techniques
-        processed_images = []
+        total_start = time.perf_counter()
+        results = [{'index': i, 'match': False, 'timings': {}} for i in range(len(images))]
+        processor = FaceRecognitionProcessor(settings.AI_SETTINGS.get('FACE_RECOGNITION_TOLERANCE', 0.6), quality_gate=True)
         
-        # Original grayscale
-        processed_images.append(gray)
+        # Decode and quality-check all frames concurrently (base64 + JPEG decoding release the GIL)
+        def decode(i):
+            start = time.perf_counter()
+            try:
+                image_array = decode_image(images[i])
+                processor.check_frame(image_array)
+                return image_array
+            except ValueError as e:
+                results[i]['error'] = str(e)
+                return None
+            except FrameRejected as e:
+                results[i].update({'error': str(e), 'reason': e.reason})
+                return None
+            finally:
+                results[i]['timings']['decode_ms'] = _elapsed_ms(start)
+        
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=min(len(images), settings.AI_SETTINGS.get('BATCH_DECODE_THREADS', 4))) as pool:
+            arrays = list(pool.map(decode, range(len(images))))
+        decode_ms = _elapsed_ms(start)
+        
+        # Detect and encode every frame that passed, all frames in flight on the pool at once
+        probe_indexes, probes = [], []
+        start = time.perf_counter()
+        futures = []
+        try:
+            for i, image_array in enumerate(arrays):
+                if image_array is not None:
+                    futures.append((i, processor.pool.submit(
+                        timed, detect_and_encode, image_array, processor.max_side, processor.min_face_size
+                    )))
+        except RecognitionBusy:
+            for _, future in futures:
+                future.cancel()
+            raise
+        for i, future in futures:
+            try:
+                (_, face_encodings), results[i]['timings']['detect_ms'] = processor.pool.result(future)
+            except RecognitionBusy:
+                raise
+            except FrameRejected as e:
+                results[i].update({'error': str(e), 'reason': e.reason})
+                continue
+            except Exception as e:
+                results[i]['error'] = f'Could not process face: {e}'
+                continue
+            if not face_encodings:
+                results[i]['error'] = 'No face detected'
+                continue
+            probe_indexes.append(i)
+            probes.append(face_encodings[0])
+        detect_ms = _elapsed_ms(start)
+        
+        # Match all probes against the index in one matrix operation
+        start = time.perf_counter()
+        matches = []
+        if probes:
+            face_index.ensure_loaded()
+            matches = processor.identify_batch(probes, face_index, search_scope(request.user))
+        matched_ids = {match['user_id'] for match in matches if match['user_id']}
+        users = User.objects.in_bulk(matched_ids)
+        match_ms = _elapsed_ms(start)
+        
+        # Queue all attendance logs as one background task
+        start = time.perf_counter()
+        logs = []
+        for i, match in zip(probe_indexes, matches):
+            matched_user = users.get(match['user_id'])
+            if not matched_user:
+                results[i]['message'] = 'Face not recognized'
+                continue
+            results[i].update({
+                'match': True,
+                'user': {
+                    'id': matched_user.id,
+                    'username': matched_user.username,
+                    'role': matched_user.role
+                },
+                'confidence': round(match['confidence'], 2),
+            })
+            logs.append({
+                'user_id': matched_user.id,
+                'scan_type': scan_type,
+                'confidence': float(match['confidence']),
+                'image_ref': store_image(images[i]),
+                'verified_by_id': request.user.id if request.user != matched_user else None
+            })
+        log_task = enqueue('ai_features.record_face_attendance', logs=logs) if logs else None
+        log_ms = _elapsed_ms(start)
         
-        # Gaussian blur + threshold
-        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-        thresh1 = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
-        processed_images.append(thresh1)
+        return Response({
+            'results': results,
+            'matched': len(logs),
+            'task_id': log_task.id if log_task else None,
+            'timings': {
+                'decode_ms': decode_ms,
+                'detect_ms': detect_ms,
+                'match_ms': match_ms,
+                'log_ms': log_ms,
+                'total_ms': _elapsed_ms(total_start)
+            }
+        })
         
-        # Morphological operations
-        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
-        opening = cv2.morphologyEx(thresh1, cv2.MORPH_OPEN, kernel, iterations=1)
-        processed_images.append(opening)
+    except RecognitionBusy as e:
+        return busy_response(e)
+    except Exception as e:
+        return Response({'error': str(e)}, status=500)
+
+def _record_plate_detection(request, plate, confidence, image_data, entry_type, vehicle_id=None):
+    """Match a detected plate to a vehicle and queue its LicensePlateRecord.
+
+    Returns the response fields shared by the plate scan endpoints.
+    """
+    # Try to match with existing vehicles
+    matched_vehicle = None
+    plate_match = None
+    if not vehicle_id:
+        # Search by detected plate, tolerating look-alike OCR swaps
+        plate_scope = settings.AI_SETTINGS.get('PLATE_SEARCH_SCOPE', 'org')
+        vehicle_id, plate_match = resolve_vehicle(plate, org_ids=search_scope(request.user, plate_scope))
+    if vehicle_id:
+        try:
+            matched_vehicle = Vehicle.objects.get(id=vehicle_id)
+        except Vehicle.DoesNotExist:
+            pass
+    
+    # Save the detection record in the background
+    record_task = enqueue(
+        'ai_features.record_plate_scan',
+        detected_plate=plate,
+        confidence=float(confidence),
+        image_ref=store_image(image_data),
+        entry_type=entry_type,
+        scanned_by_id=request.user.id,
+        vehicle_id=matched_vehicle.id if matched_vehicle else None
+    )
+    return _plate_detection_fields(plate, matched_vehicle, plate_match, record_task.id)
+
+def _plate_detection_fields(plate, matched_vehicle, plate_match, task_id):
+    """Response fields for a detected plate, matched or not"""
+    fields = {
+        'task_id': task_id,
+        'matched_vehicle': None,
+        'plate_match': plate_match,
+    }
+    if matched_vehicle:
+        fields['matched_vehicle'] = {
+            'id': matched_vehicle.id,
+            'license_plate': matched_vehicle.license_plate,
+            'make': matched_vehicle.make,
+            'model': matched_vehicle.model,
+            'year': matched_vehicle.year,
+            'status': matched_vehicle.status
+        }
+        fields['message'] = f'License plate {plate} matched to vehicle {matched_vehicle}'
+    elif plate_match:
+        fields['message'] = f"License plate {plate} is close to registered plate {plate_match['plate']}; confirm before attributing the scan"
+    else:
+        fields['message'] = f'License plate {plate} detected but no matching vehicle found'
+    return fields
+
+def _ocr_summary(ocr_result):
+    """The 'ocr' block of a scan response: candidates, variants and timings"""
+    return {
+        'candidates': ocr_result.get('candidates', []),
+        'localize_ms': ocr_result.get('localize_ms'),
+        'variants': ocr_result.get('variants', []),
+        'early_exit': ocr_result.get('early_exit', False),
+        'cache': ocr_result.get('cache'),
+        'total_ms': ocr_result.get('total_ms')
+    }
+
+@api_view(['POST'])
+@parser_classes(IMAGE_PARSERS)
+@permission_classes([IsAuthenticated])
+def scan_license_plate(request):
+    """Scan and recognize license plate from image"""
+    try:
+        image_data = get_image_upload(request)
+        entry_type = get_field(request, 'entry_type', 'ENTRY')
+        vehicle_id = get_field(request, 'vehicle_id')
         
-        # Edge detection
-        edges = cv2.Canny(gray, 50, 150)
-        processed_images.append(edges)
+        if not image_data:
+            return Response({'error': 'No image provided'}, status=400)
         
-        # Try OCR on all processed versions
-        detected_plates = []
+        # Decode image
+        image_array = decode_image(image_data)
         
-        for i, proc_img in enumerate(processed_images):
-            try:
-                # Configure Tesseract for license plates
-                custom_config = r'--oem 3 --psm 8 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
-                text = pytesseract.image_to_string(proc_img, config=custom_config).strip().upper()
-                
-                # Clean and validate detected text
-                text = re.sub(r'[^A-Z0-9]', '', text)
-                
-                if len(text) >= 4 and len(text) <= 10:  # Reasonable plate length
-                    # Calculate confidence based on preprocessing method
-                    confidence = 95 - (i * 10)  # Original gets highest confidence
-                    detected_plates.append((text, confidence, proc_img))
-                    
-            except Exception as e:
-                print(f"OCR failed for method {i}: {e}")
-                continue
+        # Run the OCR variants in parallel, stopping early on a confident strict match
+        ocr_result = LicensePlateProcessor().extract_text(image_array)
+        ocr_timings = _ocr_summary(ocr_result)
         
-        if not detected_plates:
+        if not ocr_result['success']:
             return Response({
                 'detected': False,
-                'message': 'Could not detect license plate text'
+                'message': 'Could not detect license plate text',
+                'ocr': ocr_timings
             }, status=200)
         
         # Get best detection
-        best_plate, best_confidence, best_image = max(detected_plates, key=lambda x: x[1])
-        
-        # Try to match with existing vehicles
-        matched_vehicle = None
-        if vehicle_id:
-            try:
-                matched_vehicle = Vehicle.objects.get(id=vehicle_id)
-            except Vehicle.DoesNotExist:
-                pass
-        else:
-            # Search by detected plate
-            vehicles = Vehicle.objects.filter(license_plate__iexact=best_plate)
-            if vehicles.exists():
-                matched_vehicle = vehicles.first()
-        
-        # Save detection record
-        detection_record = LicensePlateRecord.objects.create(
-            vehicle=matched_vehicle,
-            detected_plate=best_plate,
-            confidence_score=best_confidence,
-            original_image=image_data,
-            entry_type=entry_type,
-            scanned_by=request.user,
-            verified=matched_vehicle is not None
-        )
+        best_plate = ocr_result['best_result']['text']
+        best_confidence = ocr_result['best_result']['confidence']
         
         response_data = {
             'detected': True,
             'plate_number': best_plate,
             'confidence': round(best_confidence, 2),
-            'record_id': detection_record.id,
-            'matched_vehicle': None
+            **_record_plate_detection(request, best_plate, best_confidence, image_data, entry_type, vehicle_id),
+            'ocr': ocr_timings
         }
         
-        if matched_vehicle:
-            response_data['matched_vehicle'] = {
-                'id': matched_vehicle.id,
-                'license_plate': matched_vehicle.license_plate,
-                'make': matched_vehicle.make,
-                'model': matched_vehicle.model,
-                'year': matched_vehicle.year,
-                'status': matched_vehicle.status
-            }
-            response_data['message'] = f'License plate {best_plate} matched to vehicle {matched_vehicle}'
-        else:
-            response_data['message'] = f'License plate {best_plate} detected but no matching vehicle found'
+        return Response(response_data)
+        
+    except Exception as e:
+        return Response({'error': str(e)}, status=500)
+
+@api_view(['POST'])
+@parser_classes(IMAGE_PARSERS)
+@permission_classes([IsAuthenticated])
+def scan_license_plate_stream(request):
+    """Read a plate from successive camera frames by voting across them.
+
+    Post each frame with the session_id of the first response. While 'done' is
+    false the camera should send another frame; the final response records the
+    consensus plate like scan_license_plate does.
+    """
+    try:
+        image_data = get_image_upload(request)
+        session_id = get_field(request, 'session_id') or uuid.uuid4().hex
+        entry_type = get_field(request, 'entry_type', 'ENTRY')
+        vehicle_id = get_field(request, 'vehicle_id')
         
+        if not image_data:
+            return Response({'error': 'No image provided'}, status=400)
+        
+        image_array = decode_image(image_data)
+        frame = submit_frame(request.user.id, str(session_id), image_array, LicensePlateProcessor())
+        consensus = frame.pop('consensus')
+        response_data = {
+            **frame,
+            'detected': consensus['text'] is not None,
+            'plate_number': consensus['text'],
+            'confidence': consensus['confidence'],
+            'agreement': consensus['agreement'],
+        }
+        if not frame['done']:
+            return Response(response_data)
+        
+        if consensus['text'] is None:
+            response_data['message'] = 'Could not detect license plate text'
+            return Response(response_data)
+        
+        response_data.update(_record_plate_detection(
+            request, consensus['text'], consensus['confidence'], image_data, entry_type, vehicle_id
+        ))
         return Response(response_data)
         
     except Exception as e:
         return Response({'error': str(e)}, status=500)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def plate_cache_stats(request):
+    """Hit/miss counters of the plate OCR result cache"""
+    if request.user.role != 'ADMIN':
+        return Response({'error': 'Permission denied'}, status=403)
+    
+    plate_cache = PlateResultCache()
+    stats = plate_cache.stats()
+    if request.query_params.get('reset'):
+        plate_cache.reset_stats()
+    return Response(stats)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def face_attendance_logs(request):
@@ -314,7 +528,7 @@ def face_attendance_logs(request):
     from datetime import datetime, timedelta
     start_date = datetime.now() - timedelta(days=days)
     
-    logs = FaceAttendanceLog.objects.filter(timestamp__gte=start_date)
+    logs = FaceAttendanceLog.objects.filter(timestamp__gte=start_date).select_related('user', 'verified_by')
     
     if user_id:
         logs = logs.filter(user_id=user_id)
@@ -327,7 +541,8 @@ def face_attendance_logs(request):
             'scan_type': log.scan_type,
             'confidence': log.confidence_score,
             'timestamp': log.timestamp.isoformat(),
-            'verified_by': log.verified_by.username if log.verified_by else None
+            'verified_by': log.verified_by.username if log.verified_by else None,
+            'thumbnail_url': blob_store.url(log.thumbnail_ref) if log.thumbnail_ref else None
         })
     
     return Response(logs_data)
@@ -353,6 +568,7 @@ def license_plate_logs(request):
             'verified': log.verified,
             'timestamp': log.timestamp.isoformat(),
             'scanned_by': log.scanned_by.username if log.scanned_by else None,
+            'thumbnail_url': blob_store.url(log.thumbnail_ref) if log.thumbnail_ref else None,
             'vehicle': {
                 'id': log.vehicle.id,
                 'license_plate': log.vehicle.license_plate,
@@ -0,0 +1,190 @@
+# backend/ai_features/workers.py
+"""
+Process pool for CPU-bound face detection and encoding.
+
+HOG detection and the dlib encoder hold the GIL for hundreds of milliseconds,
+so running them in the request thread blocks the Django worker. With
+AI_SETTINGS['RECOGNITION_WORKERS'] > 0 they run in a bounded pool of processes
+(one per core) with the dlib models loaded up front; when every worker is busy
+and the queue is full, callers get RecognitionBusy and the views answer 503.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import cv2
+import face_recognition
+from django.conf import settings
+
+from .quality import check_face_sizes
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SETTINGS = {
+    'RECOGNITION_WORKERS': 0,
+    'RECOGNITION_QUEUE_SIZE': 8,
+    'RECOGNITION_TIMEOUT': 10,
+    'RECOGNITION_RETRY_AFTER': 1,
+}
+
+# Extra context kept around a detected face, as a share of the box size
+FACE_CROP_MARGIN = 0.25
+
+
+class RecognitionBusy(Exception):
+    """Raised when the recognition pool cannot take (or finish) a job in time"""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def detection_scale(shape, max_side):
+    """Factor that shrinks an image so its longer side is at most max_side"""
+    if not max_side:
+        return 1.0
+    return min(1.0, max_side / max(shape[:2]))
+
+
+def detect_faces(rgb_image, max_side=None):
+    """HOG face detection on a downscaled copy, boxes mapped back to full resolution"""
+    height, width = rgb_image.shape[:2]
+    scale = detection_scale(rgb_image.shape, max_side)
+    if scale == 1.0:
+        return face_recognition.face_locations(rgb_image)
+
+    small = cv2.resize(rgb_image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    return [
+        (
+            max(0, int(top / scale)),
+            min(width, int(round(right / scale))),
+            min(height, int(round(bottom / scale))),
+            max(0, int(left / scale)),
+        )
+        for top, right, bottom, left in face_recognition.face_locations(small)
+    ]
+
+
+def encode_faces(rgb_image, face_locations, margin=FACE_CROP_MARGIN):
+    """Compute encodings from a crop around each face instead of the whole frame"""
+    height, width = rgb_image.shape[:2]
+    encodings = []
+    for top, right, bottom, left in face_locations:
+        # Keep some context so the landmark model sees the whole face outline
+        pad_y = int((bottom - top) * margin)
+        pad_x = int((right - left) * margin)
+        y0, y1 = max(0, top - pad_y), min(height, bottom + pad_y)
+        x0, x1 = max(0, left - pad_x), min(width, right + pad_x)
+        crop = np.ascontiguousarray(rgb_image[y0:y1, x0:x1])
+        encodings.extend(face_recognition.face_encodings(crop, [(top - y0, right - x0, bottom - y0, left - x0)]))
+    return encodings
+
+
+def detect_and_encode(image_array, max_side=None, min_face_size=0):
+    """Find faces in a BGR image and compute their encodings.
+
+    Faces smaller than min_face_size pixels across are not encoded; a frame
+    with only such faces raises FrameRejected.
+    """
+    rgb_image = cv2.cvtColor(image_array, cv2.COLOR_BGR2RGB)
+    face_locations = check_face_sizes(detect_faces(rgb_image, max_side), min_face_size)
+    if not face_locations:
+        return [], []
+    return face_locations, encode_faces(rgb_image, face_locations)
+
+
+def timed(fn, *args):
+    """(fn(*args), milliseconds it ran), timed in the worker so queueing is not counted"""
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, round((time.perf_counter() - start) * 1000, 2)
+
+
+def warm_up():
+    """Load the dlib detector, landmark and encoder models in a new worker"""
+    blank = np.zeros((64, 64, 3), dtype=np.uint8)
+    face_recognition.face_locations(blank)
+    face_recognition.face_encodings(blank, [(8, 56, 56, 8)])
+
+
+class RecognitionPool:
+    """Bounded process pool; runs jobs inline when workers is 0"""
+
+    def __init__(self, workers=None, queue_size=None, timeout=None, retry_after=None):
+        config = {**DEFAULT_POOL_SETTINGS, **getattr(settings, 'AI_SETTINGS', {})}
+        self.workers = config['RECOGNITION_WORKERS'] if workers is None else workers
+        self.queue_size = config['RECOGNITION_QUEUE_SIZE'] if queue_size is None else queue_size
+        self.timeout = config['RECOGNITION_TIMEOUT'] if timeout is None else timeout
+        self.retry_after = config['RECOGNITION_RETRY_AFTER'] if retry_after is None else retry_after
+        # In-flight jobs: one running per worker plus queue_size waiting
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_size) if self.workers else None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=warm_up)
+                logger.info(f"Started face recognition pool with {self.workers} workers")
+            return self._executor
+
+    def _reset(self, executor):
+        if executor is None:
+            return
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, fn, *args):
+        """Queue fn(*args) and return its Future; raises RecognitionBusy when full"""
+        if not self.workers:
+            future = Future()
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        if not self._slots.acquire(blocking=False):
+            raise RecognitionBusy('Face recognition is busy, try again shortly', self.retry_after)
+        executor = self._get_executor()
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM); start a fresh pool for the next request
+            self._slots.release()
+            self._reset(executor)
+            raise RecognitionBusy('Face recognition pool restarted, try again', self.retry_after)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def result(self, future):
+        """Wait for a submitted job, giving up after the configured timeout"""
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise RecognitionBusy('Face recognition timed out', self.retry_after)
+        except BrokenProcessPool:
+            self._reset(self._executor)
+            raise RecognitionBusy('Face recognition pool restarted, try again', self.retry_after)
+
+    def run(self, fn, *args):
+        """submit() and wait for the result"""
+        return self.result(self.submit(fn, *args))
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=True)
+
+
+recognition_pool = RecognitionPool()
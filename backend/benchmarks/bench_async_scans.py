@@ -0,0 +1,209 @@
+# backend/benchmarks/bench_async_scans.py
+"""
+Load test of one ASGI worker: plate scans per second, scans in flight and
+threads for the sync DRF endpoint (/api/ai/scan-license-plate/) against its
+async variant (/api/ai/async/scan-license-plate/), at rising client
+concurrency.
+
+Requests are fed straight to Django's ASGIHandler (what vms.asgi serves over
+HTTP) on one event loop, as in a single daphne/uvicorn worker. The handler runs
+a sync view in a thread of its own for each request, so the sync endpoint holds
+one thread per in-flight scan, however many clients there are. The async
+endpoint keeps waiting requests as coroutines and runs at most
+ASYNC_CPU_THREADS scans at once. "in flight" is the peak number of requests
+inside extract_text at once, "threads" the peak thread count of the process
+(the OCR pool's included).
+
+Scans OCR a synthetic plate frame with the configured engine, with the plate
+cache off and the queued scan records left to an external task worker.
+--simulate-ms replaces OCR with a wait of that many milliseconds that releases
+the GIL, as a Tesseract subprocess does; use it when no engine is installed or
+to separate the serving model from OCR cost. The test database
+is created with Django's test runner machinery and destroyed afterwards.
+
+Usage: python benchmarks/bench_async_scans.py [--concurrency 1 4 16 64] [--requests 64] [--threads 4] [--simulate-ms 0] [--tessdata DIR]
+"""
+import argparse
+import asyncio
+import base64
+import io
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+from PIL import Image, ImageDraw, ImageFont
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vms.settings')
+
+from django.conf import settings
+from django.test import override_settings
+
+# Before any view is imported: @api_view reads the throttle classes once, and 100/hour would cap the run
+override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_CLASSES': []}).enable()
+
+import django
+django.setup()
+
+from django.core.asgi import get_asgi_application
+from django.db import connection
+from django.test.utils import setup_test_environment
+from rest_framework_simplejwt.tokens import RefreshToken
+
+ENDPOINTS = {
+    'sync': '/api/ai/scan-license-plate/',
+    'async': '/api/ai/async/scan-license-plate/',
+}
+
+
+def render_frame(text='KA01AB1234'):
+    """A plate on a dark 640x480 background, as a base64 data URL"""
+    frame = Image.new('RGB', (640, 480), (70, 70, 70))
+    draw = ImageDraw.Draw(frame)
+    draw.rectangle((120, 190, 520, 290), fill=(255, 255, 255), outline=(0, 0, 0), width=4)
+    draw.text((150, 210), text, fill=(0, 0, 0), font=ImageFont.load_default(size=52))
+    buffer = io.BytesIO()
+    frame.save(buffer, format='JPEG', quality=90)
+    return 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode()
+
+
+class InFlight:
+    """Wraps extract_text, counting calls running at once"""
+
+    def __init__(self, extract_text, simulate_ms=0):
+        self.extract_text = extract_text
+        self.simulate_ms = simulate_ms
+        self.lock = threading.Lock()
+        self.current = 0
+        self.peak = 0
+        self.peak_threads = 0
+
+    def __call__(self, processor, image_array, *args, **kwargs):
+        with self.lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+        try:
+            if self.simulate_ms:
+                time.sleep(self.simulate_ms / 1000)
+                return {'success': True, 'best_result': {'text': 'KA01AB1234', 'confidence': 90.0}, 'plates': []}
+            return self.extract_text(processor, image_array, *args, **kwargs)
+        finally:
+            with self.lock:
+                self.current -= 1
+
+
+def create_guard():
+    from accounts.models import User
+    from vehicles.models import Organization, Vehicle
+
+    org = Organization.objects.create(name='Bench Org', account='BENCH001', website='https://bench.example')
+    Vehicle.objects.create(vin='BENCH000000000001', license_plate='KA01AB1234', make='Bench', model='Car', year=2024, org=org)
+    guard = User.objects.create_user(username='bench_guard', password='bench-pass', role='GUARD', org=org)
+    return f'Bearer {RefreshToken.for_user(guard).access_token}'
+
+
+async def post(app, path, body, token):
+    """One POST through the ASGI application; returns the status code"""
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'POST', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+        'query_string': b'', 'root_path': '',
+        'headers': [
+            (b'host', b'testserver'),
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            (b'authorization', token.encode()),
+        ],
+        'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+    }
+    received = False
+    finished = asyncio.Event()
+    status = None
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        # Like a server, report the disconnect only once the exchange is over
+        await finished.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await app(scope, receive, send)
+    finished.set()
+    return status
+
+
+async def load(app, path, body, token, concurrency, count):
+    """Send count scans with concurrency clients; (seconds, latencies ms, statuses)"""
+    latencies, statuses = [], []
+    remaining = iter(range(count))
+
+    async def client():
+        for _ in remaining:
+            start = time.perf_counter()
+            statuses.append(await post(app, path, body, token))
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    return time.perf_counter() - start, latencies, statuses
+
+
+def run(levels, count, threads, simulate_ms, tessdata):
+    from ai_features import async_views
+    from ai_features.utils import LicensePlateProcessor
+
+    ai_settings = {**settings.AI_SETTINGS, 'PLATE_CACHE_ENABLED': False, 'ASYNC_CPU_THREADS': threads}
+    if tessdata:
+        ai_settings['TESSDATA_PATH'] = tessdata
+    # Scan records are written by a separate drain_tasks worker, not this web worker
+    override_settings(AI_SETTINGS=ai_settings, TASK_QUEUE={**settings.TASK_QUEUE, 'WORKER': 'external'}).enable()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        app = get_asgi_application()
+        token = create_guard()
+        body = json.dumps({'image': render_frame(), 'entry_type': 'ENTRY'}).encode()
+        counter = InFlight(LicensePlateProcessor.extract_text, simulate_ms)
+        LicensePlateProcessor.extract_text = lambda processor, *args, **kwargs: counter(processor, *args, **kwargs)
+
+        mode = f'simulated {simulate_ms} ms OCR' if simulate_ms else 'real OCR'
+        print(f"{mode}, ASYNC_CPU_THREADS={threads}, {count} scans per row")
+        print(f"{'endpoint':>8} {'clients':>8} {'scans/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'in flight':>10} {'threads':>8} {'errors':>7}")
+        for name, path in ENDPOINTS.items():
+            for concurrency in levels:
+                counter.peak = counter.peak_threads = 0
+                seconds, latencies, statuses = asyncio.run(load(app, path, body, token, concurrency, max(count, concurrency)))
+                latencies.sort()
+                p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+                errors = sum(code != 200 for code in statuses)
+                print(
+                    f"{name:>8} {concurrency:>8} {len(latencies) / seconds:>8.1f} {statistics.median(latencies):>8.1f} "
+                    f"{p95:>8.1f} {counter.peak:>10} {counter.peak_threads:>8} {errors:>7}"
+                )
+    finally:
+        if async_views._executor is not None:
+            async_views._executor.shutdown()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--requests', type=int, default=64)
+    parser.add_argument('--threads', type=int, default=settings.AI_SETTINGS.get('ASYNC_CPU_THREADS', 4))
+    parser.add_argument('--simulate-ms', type=int, default=0)
+    parser.add_argument('--tessdata', help='tesserocr language data directory (default: AI_SETTINGS TESSDATA_PATH)')
+    args = parser.parse_args()
+    run(args.concurrency, args.requests, args.threads, args.simulate_ms, args.tessdata)
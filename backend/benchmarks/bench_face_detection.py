@@ -0,0 +1,130 @@
+# backend/benchmarks/bench_face_detection.py
+"""
+Compare the full-frame face pipeline (HOG on the original image, encode on the
+whole frame) with downscale-then-refine (HOG on a copy scaled to --max-side,
+boxes mapped back, encode on the face crop).
+
+Fixtures are a directory of people, one sub-directory each:
+    fixtures/alice/1.jpg, fixtures/alice/2.jpg, fixtures/bob/1.jpg, ...
+The first image of each person is enrolled with the full-frame path; every other
+image is a probe. "found" is the share of probes with a detected face, "correct"
+the share matched to the right person, "drift" the mean distance between the
+two paths' encodings of the same face.
+
+Without --fixtures only latency is measured, on blank frames.
+
+Usage: python benchmarks/bench_face_detection.py --fixtures DIR [--max-side 480 640 960]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vms.settings')
+
+import django
+django.setup()
+
+import cv2
+import face_recognition
+from ai_features.workers import detect_faces, encode_faces
+
+TOLERANCE = 0.6
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def full_frame(rgb_image):
+    """What the views did before: detection and encoding on the whole frame"""
+    locations = face_recognition.face_locations(rgb_image)
+    return locations, face_recognition.face_encodings(rgb_image, locations)
+
+
+def downscaled(max_side):
+    def pipeline(rgb_image):
+        locations = detect_faces(rgb_image, max_side)
+        return locations, encode_faces(rgb_image, locations)
+    return pipeline
+
+
+def load_fixtures(path):
+    """{person: [rgb image, ...]} from one sub-directory per person"""
+    people = {}
+    for person in sorted(os.listdir(path)):
+        folder = os.path.join(path, person)
+        if not os.path.isdir(folder):
+            continue
+        images = [
+            cv2.cvtColor(cv2.imread(os.path.join(folder, name)), cv2.COLOR_BGR2RGB)
+            for name in sorted(os.listdir(folder)) if name.lower().endswith(IMAGE_EXTENSIONS)
+        ]
+        if images:
+            people[person] = images
+    return people
+
+
+def timed(fn, image):
+    start = time.perf_counter()
+    result = fn(image)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def run_fixtures(people, max_sides):
+    enrolled_names, enrolled = [], []
+    for person, images in people.items():
+        _, encodings = full_frame(images[0])
+        if encodings:
+            enrolled_names.append(person)
+            enrolled.append(encodings[0])
+    probes = [(person, image) for person, images in people.items() for image in images[1:]]
+    if not enrolled or not probes:
+        sys.exit('Need at least one person with two or more images')
+    print(f"{len(enrolled)} enrolled, {len(probes)} probes, "
+          f"median frame {int(np.median([max(image.shape[:2]) for _, image in probes]))}px")
+
+    pipelines = [('full', full_frame)] + [(f'max {side}', downscaled(side)) for side in max_sides]
+    reference = {}
+    print(f"{'pipeline':>10} {'median ms':>10} {'p95 ms':>8} {'found':>7} {'correct':>8} {'drift':>7}")
+    for label, pipeline in pipelines:
+        latencies, found, correct, drift = [], 0, 0, []
+        for i, (person, image) in enumerate(probes):
+            (_, encodings), ms = timed(pipeline, image)
+            latencies.append(ms)
+            if not encodings:
+                continue
+            found += 1
+            distances = face_recognition.face_distance(enrolled, encodings[0])
+            best = int(np.argmin(distances))
+            correct += distances[best] <= TOLERANCE and enrolled_names[best] == person
+            if label == 'full':
+                reference[i] = encodings[0]
+            elif i in reference:
+                drift.append(np.linalg.norm(reference[i] - encodings[0]))
+        print(f"{label:>10} {np.median(latencies):>10.1f} {np.percentile(latencies, 95):>8.1f} "
+              f"{found / len(probes):>7.1%} {correct / len(probes):>8.1%} "
+              f"{np.mean(drift) if drift else 0:>7.4f}")
+
+
+def run_blank(max_sides, repeat):
+    print('No fixtures given: timing detection on blank frames only')
+    print(f"{'frame':>10} {'pipeline':>10} {'median ms':>10}")
+    for height, width in [(720, 1280), (1080, 1920), (3024, 4032)]:
+        image = np.full((height, width, 3), 127, dtype=np.uint8)
+        pipelines = [('full', full_frame)] + [(f'max {side}', downscaled(side)) for side in max_sides]
+        for label, pipeline in pipelines:
+            ms = np.median([timed(pipeline, image)[1] for _ in range(repeat)])
+            print(f"{f'{width}x{height}':>10} {label:>10} {ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fixtures', help='Directory with one sub-directory of face images per person')
+    parser.add_argument('--max-side', type=int, nargs='+', default=[480, 640, 960])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    if args.fixtures:
+        run_fixtures(load_fixtures(args.fixtures), args.max_side)
+    else:
+        run_blank(args.max_side, args.repeat)
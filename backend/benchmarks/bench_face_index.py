@@ -0,0 +1,84 @@
+# backend/benchmarks/bench_face_index.py
+"""
+Compare 1:N face matching latency: the old per-request JSON decode + face_distance
+path against the in-memory FaceIndex backends (flat, ivf, hnsw if installed).
+"agree" is the share of probes where a backend makes the same decision as flat.
+
+Usage: python benchmarks/bench_face_index.py [--sizes 1000 10000 100000] [--repeat 20]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vms.settings')
+
+import django
+django.setup()
+
+import face_recognition
+from ai_features.face_index import create_face_index, hnswlib
+
+TOLERANCE = 0.6
+
+
+def timed(fn, repeat):
+    """Median wall time of fn() in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return float(np.median(samples))
+
+
+def legacy_match(rows, probe):
+    """What verify_face used to do per request: decode every row, then compare"""
+    known = [np.array(json.loads(data)) for _, data in rows]
+    distances = face_recognition.face_distance(known, probe)
+    return int(np.argmin(distances))
+
+
+def synthetic_faces(rng, size):
+    """Clustered 128-d encodings at roughly dlib's scale"""
+    centers = rng.normal(0, 0.3, (max(size // 50, 1), 128))
+    return centers[rng.integers(0, len(centers), size)] + rng.normal(0, 0.05, (size, 128))
+
+
+def run(sizes, repeat, probes):
+    rng = np.random.default_rng(42)
+    backends = ['flat', 'ivf'] + (['hnsw'] if hnswlib else [])
+    print(f"{'faces':>8} {'backend':>8} {'search ms':>10} {'speedup':>9} {'agree':>7} {'load ms':>9}")
+    for size in sizes:
+        encodings = synthetic_faces(rng, size)
+        rows = [(user_id, json.dumps(vector.tolist())) for user_id, vector in enumerate(encodings, 1)]
+        probe_set = encodings[rng.choice(size, probes)] + rng.normal(0, 0.01, (probes, 128))
+
+        legacy_ms = timed(lambda: legacy_match(rows, probe_set[0]), max(1, repeat // 10))
+        print(f"{size:>8} {'legacy':>8} {legacy_ms:>10.2f}")
+
+        reference = None
+        for backend in backends:
+            index = create_face_index({'BACKEND': backend})
+            start = time.perf_counter()
+            index.load(enumerate(encodings, 1))
+            load_ms = (time.perf_counter() - start) * 1000
+
+            decisions = [index.search(probe, TOLERANCE) for probe in probe_set]
+            reference = reference or decisions
+            agree = np.mean([a == b for a, b in zip(decisions, reference)])
+            search_ms = timed(lambda: [index.search(probe, TOLERANCE) for probe in probe_set], repeat) / probes
+            print(f"{'':>8} {backend:>8} {search_ms:>10.3f} {legacy_ms / search_ms:>8.0f}x {agree:>7.1%} {load_ms:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--probes', type=int, default=50)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat, args.probes)
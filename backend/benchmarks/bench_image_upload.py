@@ -0,0 +1,119 @@
+# backend/benchmarks/bench_image_upload.py
+"""
+Peak RSS and latency of the three image upload formats, through DRF parsing and
+the shared decoder (ai_features.images) used by every image endpoint:
+
+  base64     JSON body {"image": "data:image/jpeg;base64,..."} (the original API)
+  multipart  multipart/form-data file part
+  raw        image/jpeg request body
+
+Each format runs in a fresh subprocess so peak RSS (ru_maxrss) is not shared
+between them; "peak MB" is the growth over the process baseline after setup.
+The test frame is a synthetic noisy JPEG, so no fixtures are needed.
+
+Usage: python benchmarks/bench_image_upload.py [--width 1920] [--height 1080] [--requests 30]
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vms.settings')
+
+MODES = ('base64', 'multipart', 'raw')
+
+
+def render_frame(width, height):
+    rng = np.random.default_rng(3)
+    frame = np.clip(rng.normal(128, 40, (height, width, 3)), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(frame).save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def measure(mode, width, height, count):
+    """Run one format in this process and print a JSON result line"""
+    import django
+    django.setup()
+
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from rest_framework.decorators import api_view, parser_classes, permission_classes
+    from rest_framework.permissions import AllowAny
+    from rest_framework.response import Response
+    from rest_framework.test import APIRequestFactory
+    from ai_features.images import IMAGE_PARSERS, decode_image, get_image_upload
+
+    @api_view(['POST'])
+    @parser_classes(IMAGE_PARSERS)
+    @permission_classes([AllowAny])
+    def decode_view(request):
+        image_array = decode_image(get_image_upload(request))
+        return Response({'shape': image_array.shape})
+
+    factory = APIRequestFactory()
+    image_bytes = render_frame(width, height)
+
+    def build_request():
+        if mode == 'base64':
+            body = {'image': 'data:image/jpeg;base64,' + base64.b64encode(image_bytes).decode()}
+            return factory.post('/decode/', body, format='json')
+        if mode == 'multipart':
+            upload = SimpleUploadedFile('frame.jpg', image_bytes, content_type='image/jpeg')
+            return factory.post('/decode/', {'image': upload}, format='multipart')
+        return factory.generic('POST', '/decode/', image_bytes, content_type='image/jpeg')
+
+    # Bodies are built outside the timed section; only parsing and decoding count
+    body_kb = round(len(build_request().body) / 1024, 1)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    latencies = []
+    for _ in range(count):
+        request = build_request()
+        start = time.perf_counter()
+        response = decode_view(request)
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.data
+        del request, response
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        'mode': mode,
+        'body_kb': body_kb,
+        'median_ms': round(statistics.median(latencies), 2),
+        'p95_ms': round(sorted(latencies)[int(0.95 * (len(latencies) - 1))], 2),
+        'peak_mb': round((peak - baseline) / 1024, 1),
+    }))
+
+
+def run(width, height, count):
+    print(f"{width}x{height} JPEG, {len(render_frame(width, height)) / 1024:.0f} KB, {count} requests per format")
+    print(f"{'format':>10} {'body KB':>9} {'median ms':>10} {'p95 ms':>8} {'peak MB':>8}")
+    for mode in MODES:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--mode', mode,
+             '--width', str(width), '--height', str(height), '--requests', str(count)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{mode:>10} {result['body_kb']:>9} {result['median_ms']:>10} {result['p95_ms']:>8} {result['peak_mb']:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--requests', type=int, default=30)
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.mode:
+        measure(args.mode, args.width, args.height, args.requests)
+    else:
+        run(args.width, args.height, args.requests)
@@ -0,0 +1,137 @@
+# backend/benchmarks/bench_ocr_engines.py
+"""
+Plates per second for each OCR engine: pytesseract (a tesseract subprocess per
+call) against tesserocr (warm in-process API). "single" is one psm 7 call per
+plate, "pipeline" the full LicensePlateProcessor.extract_text (24 variants with
+early exit). "read" is the share of plates whose text came back exactly.
+
+With --scenes each plate is pasted, slightly rotated, into a 1280x720 frame and
+the pipeline is run with and without plate localization ("full frame" against
+"localized"), which shows what OCRing only the plate crops saves.
+
+Plates are rendered synthetically, so no fixtures are needed. Engines that
+cannot run here (no tesseract binary, no tesserocr or language data) are skipped.
+
+Usage: python benchmarks/bench_ocr_engines.py [--plates 50] [--tessdata DIR] [--scenes]
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vms.settings')
+
+import django
+django.setup()
+
+import cv2
+import pytesseract
+from django.conf import settings
+from django.test import override_settings
+from ai_features.ocr import PytesseractEngine, TesserocrEngine, tesserocr
+from ai_features.utils import LicensePlateProcessor, OCR_CONFIGS
+
+SINGLE_CONFIG = OCR_CONFIGS[1]  # --psm 7, plate whitelist
+
+
+def render_plates(count, seed=7):
+    """White plates with black ABC123-style text and a little noise"""
+    rng = random.Random(seed)
+    noise = np.random.default_rng(seed)
+    font = ImageFont.load_default(size=56)
+    plates = []
+    for _ in range(count):
+        text = ''.join(rng.choices(string.ascii_uppercase, k=3)) + ''.join(rng.choices(string.digits, k=3))
+        image = Image.new('L', (360, 110), 255)
+        draw = ImageDraw.Draw(image)
+        draw.rectangle((4, 4, 355, 105), outline=0, width=4)
+        draw.text((40, 18), text, fill=0, font=font)
+        array = np.array(image) + noise.normal(0, 12, (110, 360))
+        plates.append((text, np.clip(array, 0, 255).astype(np.uint8)))
+    return plates
+
+
+def place_in_scene(plate, seed):
+    """Paste a plate, rotated a few degrees, into a dark car-sized frame"""
+    rng = np.random.default_rng(seed)
+    scene = np.clip(rng.normal(90, 10, (720, 1280)), 0, 255).astype(np.uint8)
+    cv2.rectangle(scene, (200, 150), (1100, 650), 60, -1)
+    angle = rng.uniform(-12, 12)
+    rotated = np.array(Image.fromarray(plate).rotate(angle, expand=True, fillcolor=0))
+    mask = np.array(Image.new('L', (plate.shape[1], plate.shape[0]), 255).rotate(angle, expand=True, fillcolor=0)) > 0
+    y, x = int(rng.integers(300, 450)), int(rng.integers(300, 700))
+    region = scene[y:y + rotated.shape[0], x:x + rotated.shape[1]]
+    region[mask] = rotated[mask]
+    return cv2.cvtColor(scene, cv2.COLOR_GRAY2BGR)
+
+
+def run_scenes(count, engines):
+    scenes = [(text, place_in_scene(image, seed)) for seed, (text, image) in enumerate(render_plates(count))]
+    print(f"{'engine':>12} {'mode':>11} {'plates/s':>9} {'ms/plate':>9} {'read':>7}")
+    for engine in engines:
+        processor = LicensePlateProcessor(engine=engine)
+        for label, localize in (('full frame', False), ('localized', True)):
+            with override_settings(AI_SETTINGS={**settings.AI_SETTINGS, 'PLATE_LOCALIZATION': localize}):
+                start = time.perf_counter()
+                results = [processor.extract_text(image) for _, image in scenes]
+                elapsed = time.perf_counter() - start
+            read = sum(result['success'] and result['best_result']['text'] == text for result, (text, _) in zip(results, scenes))
+            print(f"{engine.name:>12} {label:>11} {count / elapsed:>9.1f} {elapsed / count * 1000:>9.1f} {read / count:>7.1%}")
+
+
+def available_engines(tessdata):
+    engines = []
+    try:
+        pytesseract.get_tesseract_version()
+        engines.append(PytesseractEngine())
+    except Exception as e:
+        print(f"skipping pytesseract: {e}")
+    if tesserocr is None:
+        print('skipping tesserocr: not installed')
+    else:
+        try:
+            engines.append(TesserocrEngine(tessdata))
+        except RuntimeError as e:
+            print(f"skipping tesserocr: {e}")
+    return engines
+
+
+def run(count, tessdata, scenes=False):
+    engines = available_engines(tessdata)
+    if not engines:
+        sys.exit('No OCR engine can run here')
+    if scenes:
+        return run_scenes(count, engines)
+
+    plates = render_plates(count)
+
+    print(f"{'engine':>12} {'mode':>9} {'plates/s':>9} {'ms/plate':>9} {'read':>7}")
+    for engine in engines:
+        start = time.perf_counter()
+        read = sum(engine.image_to_string(image, config=SINGLE_CONFIG).strip().replace(' ', '') == text for text, image in plates)
+        elapsed = time.perf_counter() - start
+        print(f"{engine.name:>12} {'single':>9} {count / elapsed:>9.1f} {elapsed / count * 1000:>9.1f} {read / count:>7.1%}")
+
+        # Bare plates fill the frame already, so skip localization here
+        processor = LicensePlateProcessor(engine=engine)
+        with override_settings(AI_SETTINGS={**settings.AI_SETTINGS, 'PLATE_LOCALIZATION': False}):
+            start = time.perf_counter()
+            results = [processor.extract_text(image) for _, image in plates]
+            elapsed = time.perf_counter() - start
+        read = sum(result['success'] and result['best_result']['text'] == text for result, (text, _) in zip(results, plates))
+        print(f"{engine.name:>12} {'pipeline':>9} {count / elapsed:>9.1f} {elapsed / count * 1000:>9.1f} {read / count:>7.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--plates', type=int, default=50)
+    parser.add_argument('--tessdata', help='tesserocr language data directory (default: AI_SETTINGS TESSDATA_PATH)')
+    parser.add_argument('--scenes', action='store_true', help='Compare full-frame and localized OCR on plates in larger frames')
+    args = parser.parse_args()
+    run(args.plates, args.tessdata or settings.AI_SETTINGS.get('TESSDATA_PATH'), args.scenes)
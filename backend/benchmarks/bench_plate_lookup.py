@@ -0,0 +1,125 @@
+# backend/benchmarks/bench_plate_lookup.py
+"""
+Plate -> vehicle resolution latency of the in-memory PlateLookup against a
+linear scan scoring every registered plate with the same weighted edit
+distance (what fuzzy matching costs without the index).
+Reads are registered plates with 0-2 look-alike swaps applied, the way
+Tesseract garbles them, and every third one also gets one real edit.
+"found" is the share resolved to the right vehicle; misses are reads costing
+more than --max-cost (a real edit plus swaps) or left ambiguous between two
+plates. "lookup" searches every organization (admin scope), "org" one of
+--orgs organizations. "MB" is the table's traced size.
+
+Usage: python benchmarks/bench_plate_lookup.py [--sizes 1000 10000 100000] [--reads 200] [--orgs 20] [--max-cost 1.0]
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vms.settings')
+
+import django
+django.setup()
+
+from ai_features.plate_lookup import CONFUSION_COSTS, PlateLookup, confusion_distance
+
+LOOK_ALIKES = {}
+for a, b in CONFUSION_COSTS:
+    LOOK_ALIKES.setdefault(a, []).append(b)
+    LOOK_ALIKES.setdefault(b, []).append(a)
+
+
+def synthetic_plates(rng, size):
+    """Unique plates shaped like 'KA01AB1234'"""
+    plates = set()
+    while len(plates) < size:
+        plates.add(
+            ''.join(rng.choices(string.ascii_uppercase, k=2)) + f'{rng.randrange(100):02d}'
+            + ''.join(rng.choices(string.ascii_uppercase, k=2)) + f'{rng.randrange(10000):04d}'
+        )
+    return sorted(plates)
+
+
+def garble(rng, plate):
+    chars = list(plate)
+    swappable = [i for i, char in enumerate(chars) if char in LOOK_ALIKES]
+    for i in rng.sample(swappable, min(len(swappable), rng.randrange(3))):
+        chars[i] = rng.choice(LOOK_ALIKES[chars[i]])
+    if rng.random() < 1 / 3:
+        i = rng.randrange(len(chars))
+        edit = rng.choice(('substitute', 'insert', 'delete'))
+        if edit == 'delete':
+            del chars[i]
+        elif edit == 'insert':
+            chars.insert(i, rng.choice(string.ascii_uppercase))
+        else:
+            chars[i] = rng.choice(string.ascii_uppercase)
+    return ''.join(chars)
+
+
+def linear_resolve(plates, text, max_cost):
+    best = min(plates, key=lambda item: confusion_distance(text, item[1], max_cost))
+    return best[0] if confusion_distance(text, best[1]) <= max_cost else None
+
+
+def timed(fn, reads):
+    """Mean microseconds per read"""
+    start = time.perf_counter()
+    results = [fn(text) for text in reads]
+    return (time.perf_counter() - start) * 1e6 / len(reads), results
+
+
+def run(sizes, count, orgs, max_cost):
+    rng = random.Random(42)
+    print(f"{'plates':>8} {'method':>8} {'us/read':>10} {'found':>7} {'load ms':>9} {'MB':>7}")
+    for size in sizes:
+        plates = list(enumerate(synthetic_plates(rng, size), 1))
+        sample = rng.sample(plates, count)
+        reads = [garble(rng, plate) for _, plate in sample]
+        expected = [vehicle_id for vehicle_id, _ in sample]
+
+        rows = [(vehicle_id, plate, vehicle_id % orgs) for vehicle_id, plate in plates]
+        lookup = PlateLookup()
+        start = time.perf_counter()
+        lookup.load(rows)
+        load_ms = (time.perf_counter() - start) * 1000
+
+        # Traced separately: tracemalloc slows every allocation down
+        tracemalloc.start()
+        traced = PlateLookup()
+        traced.load(rows)
+        table_mb = tracemalloc.get_traced_memory()[0] / 2 ** 20
+        tracemalloc.stop()
+        del traced
+
+        def indexed(text, org_ids=None):
+            match = lookup.resolve(text, max_cost, org_ids)
+            return match and match['vehicle_id']
+
+        org_of = {read: [vehicle_id % orgs] for read, vehicle_id in zip(reads, expected)}
+        methods = [
+            ('lookup', indexed, reads, f'{load_ms:>9.1f} {table_mb:>7.1f}'),
+            ('org', lambda text: indexed(text, org_of[text]), reads, ''),
+        ]
+        if size <= 10000:
+            # The scan is too slow to time at full size; a slice of the reads is enough
+            methods.append(('linear', lambda text: linear_resolve(plates, text, max_cost), reads[:20], ''))
+        for name, fn, batch, extra in methods:
+            micros, results = timed(fn, batch)
+            found = sum(a == b for a, b in zip(results, expected)) / len(batch)
+            print(f"{size:>8} {name:>8} {micros:>10.1f} {found:>7.1%} {extra}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--reads', type=int, default=200)
+    parser.add_argument('--orgs', type=int, default=20)
+    parser.add_argument('--max-cost', type=float, default=1.0)
+    args = parser.parse_args()
+    run(args.sizes, args.reads, args.orgs, args.max_cost)
@@ -0,0 +1,94 @@
+# backend/benchmarks/bench_preprocess.py
+"""
+Time and allocations of OCR preprocessing: the old standalone pipeline
+(every variant built from scratch, OpenCV allocating each output) against
+ai_features.preprocess.Preprocessor, with and without a BufferPool.
+
+Each row builds all six LicensePlateProcessor variants for one image.
+"alloc KB" is the traced peak of new allocations per call (tracemalloc sees
+NumPy/OpenCV arrays). The per-stage table is the Preprocessor's own timings.
+
+Usage: python benchmarks/bench_preprocess.py [--repeat 200]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai_features.preprocess import BufferPool, Preprocessor
+
+METHODS = ('original', 'adaptive_thresh', 'otsu_thresh', 'morphological', 'edges', 'enhanced')
+SIZES = {'plate crop': (64, 256), 'VGA frame': (480, 640), '1080p frame': (1080, 1920)}
+
+
+def legacy_preprocess(image_array):
+    """LicensePlateProcessor.preprocess_image before the shared stages"""
+    gray = cv2.cvtColor(image_array, cv2.COLOR_BGR2GRAY)
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    thresh1 = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
+    _, thresh2 = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+    opening = cv2.morphologyEx(thresh2, cv2.MORPH_OPEN, kernel, iterations=1)
+    edges = cv2.Canny(gray, 50, 150)
+    enhanced = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(gray)
+    return [gray, thresh1, thresh2, opening, edges, enhanced]
+
+
+def shared_preprocess(image_array, pool=None, stage_ms=None):
+    with Preprocessor(image_array, pool=pool) as stages:
+        images = stages.get(*METHODS)
+        if stage_ms is not None:
+            for name, ms in stages.timings.items():
+                stage_ms.setdefault(name, []).append(ms)
+        return len(images)
+
+
+def measure(fn, image, repeat):
+    """(median ms, peak KB allocated per call)"""
+    fn(image)  # warm up (and fill a pool)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(image)
+        samples.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    fn(image)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(samples), peak / 1024
+
+
+def run(repeat):
+    rng = np.random.default_rng(7)
+    pool = BufferPool()
+    print(f"{'image':>12} {'pipeline':>8} {'ms':>8} {'alloc KB':>10}")
+    stage_tables = {}
+    for label, (height, width) in SIZES.items():
+        image = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        stage_ms = stage_tables.setdefault(label, {})
+        pipelines = [
+            ('legacy', legacy_preprocess),
+            ('shared', lambda img: shared_preprocess(img, stage_ms=stage_ms)),
+            ('pooled', lambda img: shared_preprocess(img, pool=pool)),
+        ]
+        for name, fn in pipelines:
+            ms, kb = measure(fn, image, repeat if height < 1000 else max(repeat // 10, 5))
+            print(f"{label:>12} {name:>8} {ms:>8.3f} {kb:>10.1f}")
+
+    print(f"\n{'image':>12} " + ' '.join(f'{name:>10}' for name in stage_tables['plate crop']))
+    for label, stage_ms in stage_tables.items():
+        print(f"{label:>12} " + ' '.join(f'{statistics.median(values):>10.3f}' for values in stage_ms.values()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+    run(args.repeat)
@@ -0,0 +1,109 @@
+# backend/benchmarks/bench_quality_gate.py
+"""
+Cost of the face quality gate against the detection pass it saves, and what it
+would reject on a set of real frames.
+
+Latency rows time ai_features.quality.check_frame and workers.detect_and_encode
+(downscaled HOG detection, plus encoding when a face is found) on synthetic
+frames: sharp noise, the same blurred, and the same darkened. A rejected frame
+costs only the check.
+
+With --fixtures, every image in the directory is scored with the configured
+AI_SETTINGS['FACE_QUALITY'] and the verdicts are counted per reason, with the
+score ranges to tune MIN_SHARPNESS and the luminance bounds against.
+
+Usage: python benchmarks/bench_quality_gate.py [--repeat 20] [--fixtures DIR]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vms.settings')
+
+import django
+django.setup()
+
+import cv2
+from django.conf import settings
+from ai_features.quality import FrameRejected, check_frame, frame_quality, quality_settings
+from ai_features.workers import detect_and_encode
+
+SIZES = {'VGA': (480, 640), '1080p': (1080, 1920)}
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def synthetic_frames(shape):
+    rng = np.random.default_rng(0)
+    sharp = rng.integers(60, 200, (*shape, 3), dtype=np.uint8)
+    return {
+        'sharp': sharp,
+        'blurred': cv2.GaussianBlur(sharp, (0, 0), 8),
+        'dark': sharp // 8,
+    }
+
+
+def median_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def verdict(image, config):
+    try:
+        check_frame(image, config)
+        return 'accepted'
+    except FrameRejected as e:
+        return e.reason
+
+
+def run_latency(repeat, config):
+    max_side = settings.AI_SETTINGS.get('FACE_DETECTION_MAX_SIDE')
+    print(f"{'frame':>14} {'check ms':>9} {'detect ms':>10} {'verdict':>10}")
+    for size_name, shape in SIZES.items():
+        for frame_name, frame in synthetic_frames(shape).items():
+            check_ms = median_ms(lambda: verdict(frame, config), repeat)
+            detect_ms = median_ms(lambda: detect_and_encode(frame, max_side), max(1, repeat // 4))
+            print(f"{size_name + ' ' + frame_name:>14} {check_ms:>9.2f} {detect_ms:>10.1f} {verdict(frame, config):>10}")
+
+
+def run_fixtures(directory, config):
+    verdicts = Counter()
+    sharpness, luminance = [], []
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        image = cv2.imread(os.path.join(directory, name))
+        if image is None:
+            continue
+        scores = frame_quality(image, config['MAX_SIDE'])
+        sharpness.append(scores['sharpness'])
+        luminance.append(scores['luminance'])
+        verdicts[verdict(image, config)] += 1
+
+    if not verdicts:
+        print(f"No images in {directory}")
+        return
+    print(f"\n{sum(verdicts.values())} fixtures: " + ', '.join(f"{reason} {count}" for reason, count in verdicts.most_common()))
+    for label, values in (('sharpness', sharpness), ('luminance', luminance)):
+        p10, p50, p90 = np.percentile(values, [10, 50, 90])
+        print(f"{label:>10}: p10 {p10:.1f}  median {p50:.1f}  p90 {p90:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--fixtures', help='directory of frames to score')
+    args = parser.parse_args()
+    config = {**quality_settings(), 'ENABLED': True}
+    run_latency(args.repeat, config)
+    if args.fixtures:
+        run_fixtures(args.fixtures, config)
@@ -6,4 +6,5 @@ class RealtimeConfig(AppConfig):
     name = 'realtime'
     
     def ready(self):
-        import realtime.signals
\ No newline at end of file
+        import realtime.signals
+        import realtime.tasks
\ No newline at end of file
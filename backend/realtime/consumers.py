@@ -78,10 +78,13 @@ class VehicleLogConsumer(AsyncWebsocketConsumer):
     @database_sync_to_async
     def get_recent_logs(self):
         # Get recent logs for user's organization
-        if self.user.role == 'ADMIN':
-            logs = EntryLog.objects.all()[:20]
-        else:
-            logs = EntryLog.objects.filter(vehicle__org=self.user.org)[:20]
+        logs = EntryLog.objects.all()
+        if self.user.role != 'ADMIN':
+            logs = logs.filter(vehicle__org=self.user.org)
+        # Only the columns sent to the client, vehicles and users joined in the same query
+        logs = logs.select_related('vehicle', 'created_by').only(
+            'id', 'action', 'timestamp', 'vehicle__license_plate', 'vehicle__vin', 'created_by__username'
+        ).order_by('-timestamp')[:20]
         
         return [
             {
@@ -91,5 +94,5 @@ class VehicleLogConsumer(AsyncWebsocketConsumer):
                 'timestamp': log.timestamp.isoformat(),
                 'created_by': log.created_by.username if log.created_by else 'System'
             }
-            for log in logs.order_by('-timestamp')
+            for log in logs
         ]
\ No newline at end of file
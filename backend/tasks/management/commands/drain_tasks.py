@@ -0,0 +1,30 @@
+# backend/tasks/management/commands/drain_tasks.py
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from tasks.queue import _config, drain
+
+
+class Command(BaseCommand):
+    help = 'Run queued background tasks: one pass by default, or forever with --loop'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new tasks (standalone worker)')
+        parser.add_argument('--max-tasks', type=int, help='Stop after running this many tasks')
+
+    def handle(self, *args, **options):
+        if not options['loop']:
+            ran = drain(options['max_tasks'])
+            self.stdout.write(f'Ran {ran} tasks')
+            return
+
+        interval = _config()['POLL_INTERVAL']
+        self.stdout.write(f'Draining tasks every {interval}s')
+        while True:
+            ran = drain()
+            if ran:
+                self.stdout.write(f'Ran {ran} tasks')
+            close_old_connections()
+            time.sleep(interval)
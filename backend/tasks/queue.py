@@ -0,0 +1,184 @@
+# backend/tasks/queue.py
+"""
+Database outbox for side effects that should not hold up a request.
+
+enqueue() inserts a Task row in the caller's transaction, so a task exists if
+and only if the change that caused it was committed. Workers drain the table:
+- the drain_tasks command (one pass, or --loop as a standalone worker)
+- a daemon thread in each web process, woken when a transaction that enqueued
+  something commits (TASK_QUEUE['WORKER'] = 'thread')
+
+Delivery is at least once:
+- A task is claimed with a conditional UPDATE that takes a lease
+  (LEASE_SECONDS). If the worker dies, the lease expires and another worker
+  reclaims the task.
+- The handler's database writes commit in the same transaction that deletes
+  the task, and only while the worker still holds its lease: a worker that
+  overran LEASE_SECONDS and lost the task to another rolls its writes back, so
+  they happen exactly once. Retry and FAILED updates are lease-checked too.
+- Effects outside the database (websocket messages, files) may repeat after a
+  crash, so handlers must tolerate running twice.
+- Failures are retried with exponential backoff. After max_attempts the task
+  is kept as FAILED with its last error.
+"""
+import logging
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SETTINGS = {
+    'WORKER': 'thread',
+    'POLL_INTERVAL': 5,
+    'LEASE_SECONDS': 60,
+    'MAX_ATTEMPTS': 5,
+    'MAX_BACKOFF': 300,
+    'BATCH_SIZE': 20,
+}
+
+handlers = {}
+
+
+def _config():
+    return {**DEFAULT_QUEUE_SETTINGS, **getattr(settings, 'TASK_QUEUE', {})}
+
+
+def task(name):
+    """Register a handler; it is called with the payload as keyword arguments"""
+    def register(func):
+        handlers[name] = func
+        return func
+    return register
+
+
+def enqueue(name, max_attempts=None, delay=0, **payload):
+    """Queue a task in the current transaction; workers see it once that commits"""
+    if name not in handlers:
+        raise ValueError(f"Unknown task {name}")
+    config = _config()
+    queued = Task.objects.create(
+        name=name,
+        payload=payload,
+        max_attempts=max_attempts or config['MAX_ATTEMPTS'],
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+    if config['WORKER'] == 'inline':
+        transaction.on_commit(drain)
+    elif config['WORKER'] == 'thread':
+        transaction.on_commit(local_worker.wake)
+    return queued
+
+
+class LeaseLost(Exception):
+    """The task was reclaimed by another worker while this one ran it"""
+
+
+def _lease(queued):
+    """The task row, as long as it is still leased to the worker that claimed it"""
+    return Q(id=queued.id, status='RUNNING', locked_until=queued.locked_until)
+
+
+def _due(now):
+    return Q(status='PENDING', run_after__lte=now) | Q(status='RUNNING', locked_until__lt=now)
+
+
+def claim(batch_size=None):
+    """Lease up to batch_size due tasks to this worker"""
+    config = _config()
+    now = timezone.now()
+    claimed = []
+    candidates = Task.objects.filter(_due(now)).order_by('run_after', 'id').values_list('id', flat=True)
+    for task_id in candidates[:batch_size or config['BATCH_SIZE']]:
+        # Only one worker's UPDATE matches; the others see 0 rows and move on
+        won = Task.objects.filter(_due(now), id=task_id).update(
+            status='RUNNING',
+            attempts=F('attempts') + 1,
+            locked_until=now + timedelta(seconds=config['LEASE_SECONDS']),
+        )
+        if won:
+            claimed.append(task_id)
+    return list(Task.objects.filter(id__in=claimed).order_by('id'))
+
+
+def run(queued):
+    """Run one claimed task; True if it succeeded"""
+    handler = handlers.get(queued.name)
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for {queued.name}")
+        with transaction.atomic():
+            handler(**queued.payload)
+            deleted, _ = Task.objects.filter(_lease(queued)).delete()
+            if not deleted:
+                # Roll the handler's writes back; the worker holding the lease commits its own
+                raise LeaseLost(f"Task {queued} was reclaimed by another worker")
+        return True
+    except LeaseLost as e:
+        logger.warning(str(e))
+        return False
+    except Exception as e:
+        logger.warning(f"Task {queued} failed: {e}")
+        if queued.attempts >= queued.max_attempts:
+            Task.objects.filter(_lease(queued)).update(
+                status='FAILED', locked_until=None, last_error=traceback.format_exc()
+            )
+        else:
+            backoff = min(2 ** queued.attempts, _config()['MAX_BACKOFF'])
+            Task.objects.filter(_lease(queued)).update(
+                status='PENDING',
+                locked_until=None,
+                run_after=timezone.now() + timedelta(seconds=backoff),
+                last_error=traceback.format_exc(),
+            )
+        return False
+
+
+def drain(max_tasks=None):
+    """Run due tasks until none are left (or max_tasks ran); returns how many ran"""
+    ran = 0
+    while max_tasks is None or ran < max_tasks:
+        batch = claim(None if max_tasks is None else min(max_tasks - ran, _config()['BATCH_SIZE']))
+        if not batch:
+            break
+        for queued in batch:
+            run(queued)
+            ran += 1
+    return ran
+
+
+class LocalWorker:
+    """Daemon thread draining the outbox in a web process"""
+
+    def __init__(self):
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def wake(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name='task-worker', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def _loop(self):
+        while True:
+            self._wakeup.wait(_config()['POLL_INTERVAL'])
+            self._wakeup.clear()
+            try:
+                drain()
+            except Exception:
+                logger.exception("Task worker pass failed")
+            finally:
+                close_old_connections()
+
+
+local_worker = LocalWorker()
@@ -0,0 +1,137 @@
+# backend/tasks/tests.py
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import AsyncMock, patch
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from vehicles.models import EntryLog, Organization, Vehicle
+from .models import Task
+from .queue import claim, drain, enqueue, run, task
+
+calls = []
+
+@task('tests.record')
+def record(value):
+    calls.append(value)
+    Organization.objects.create(name=f'Org {value}', account=value, website='https://example.com')
+
+@task('tests.flaky')
+def flaky(value):
+    Organization.objects.create(name=f'Org {value}', account=value, website='https://example.com')
+    raise RuntimeError('upstream down')
+
+class TaskQueueTestCase(TestCase):
+    """Test the database outbox and its workers"""
+
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_and_drain(self):
+        """Test tasks run in order and are removed once done"""
+        enqueue('tests.record', value='a')
+        enqueue('tests.record', value='b')
+        self.assertEqual(calls, [])
+
+        self.assertEqual(drain(), 2)
+        self.assertEqual(calls, ['a', 'b'])
+        self.assertFalse(Task.objects.exists())
+        self.assertEqual(drain(), 0)
+
+    def test_unknown_task_is_rejected(self):
+        with self.assertRaises(ValueError):
+            enqueue('tests.missing')
+
+    def test_delayed_task_waits(self):
+        enqueue('tests.record', value='later', delay=60)
+        self.assertEqual(drain(), 0)
+        Task.objects.update(run_after=timezone.now())
+        self.assertEqual(drain(), 1)
+
+    def test_failure_rolls_back_and_retries(self):
+        """Test a failing handler's writes roll back, then it backs off and finally fails for good"""
+        queued = enqueue('tests.flaky', value='x', max_attempts=2)
+
+        self.assertEqual(drain(), 1)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('PENDING', 1))
+        self.assertGreater(queued.run_after, timezone.now())
+        self.assertIn('upstream down', queued.last_error)
+        self.assertFalse(Organization.objects.filter(account='x').exists())
+
+        # Not due until the backoff passes
+        self.assertEqual(drain(), 0)
+        Task.objects.update(run_after=timezone.now())
+        self.assertEqual(drain(), 1)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('FAILED', 2))
+        self.assertEqual(drain(), 0)
+
+    def test_expired_lease_is_reclaimed(self):
+        """Test a task whose worker died is handed to another worker"""
+        enqueue('tests.record', value='a')
+        self.assertEqual(len(claim()), 1)
+        self.assertEqual(claim(), [])
+
+        Task.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        [queued] = claim()
+        self.assertEqual(queued.attempts, 2)
+        self.assertTrue(run(queued))
+        self.assertEqual(calls, ['a'])
+
+    def test_reclaimed_task_commits_once(self):
+        """Test a worker that lost its lease rolls back instead of repeating the new owner's writes"""
+        enqueue('tests.record', value='a')
+        [slow] = claim()
+        Task.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        [owner] = claim()
+
+        self.assertFalse(run(slow))
+        self.assertFalse(Organization.objects.filter(account='a').exists())
+        self.assertTrue(Task.objects.filter(id=owner.id, locked_until=owner.locked_until).exists())
+
+        self.assertTrue(run(owner))
+        self.assertEqual(Organization.objects.filter(account='a').count(), 1)
+        self.assertFalse(Task.objects.exists())
+
+    def test_failure_after_lost_lease_keeps_new_lease(self):
+        """Test a failing worker that lost its lease does not reschedule the new owner's task"""
+        enqueue('tests.flaky', value='x')
+        [slow] = claim()
+        Task.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        [owner] = claim()
+
+        self.assertFalse(run(slow))
+        queued = Task.objects.get()
+        self.assertEqual((queued.status, queued.locked_until, queued.last_error), ('RUNNING', owner.locked_until, ''))
+
+    @override_settings(TASK_QUEUE={'WORKER': 'inline'})
+    def test_inline_worker_runs_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue('tests.record', value='a')
+            self.assertEqual(calls, [])
+        self.assertEqual(calls, ['a'])
+
+    def test_drain_tasks_command(self):
+        for value in 'abc':
+            enqueue('tests.record', value=value)
+        out = StringIO()
+        call_command('drain_tasks', max_tasks=2, stdout=out)
+        self.assertIn('Ran 2 tasks', out.getvalue())
+        call_command('drain_tasks', stdout=out)
+        self.assertEqual(calls, ['a', 'b', 'c'])
+
+    def test_entry_logs_are_broadcast_by_a_task(self):
+        """Test websocket fan-out of new entry logs goes through the queue"""
+        org = Organization.objects.create(name='Gate Org', account='GATE001', website='https://gate.com')
+        vehicle = Vehicle.objects.create(vin='GATE123456789', license_plate='GTE123', make='Test', model='Van', year=2023, org=org)
+        channel_layer = AsyncMock()
+        with patch('realtime.tasks.get_channel_layer', return_value=channel_layer):
+            EntryLog.objects.create(vehicle=vehicle, action='ENTRY')
+            channel_layer.group_send.assert_not_called()
+            drain()
+        groups = sorted(call.args[0] for call in channel_layer.group_send.call_args_list)
+        self.assertEqual(groups, [f'vehicle_logs_{org.id}', 'vehicle_logs_global'])
+        self.assertEqual(channel_layer.group_send.call_args.args[1]['log']['vehicle_plate'], 'GTE123')
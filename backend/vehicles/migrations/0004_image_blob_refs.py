@@ -0,0 +1,38 @@
+# Generated by Django 5.2.2 on 2026-10-17 23:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0003_add_rbac_models'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendancelog',
+            name='face_image_ref',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='vehicleverification',
+            name='driver_face_image_ref',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='vehicleverification',
+            name='license_plate_image_ref',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='vehicleverification',
+            name='driver_face_image',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AlterField(
+            model_name='vehicleverification',
+            name='license_plate_image',
+            field=models.TextField(blank=True),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.2 on 2026-10-17 23:23
+
+import re
+
+from django.db import migrations, models
+
+
+BATCH_SIZE = 500
+
+
+def fill_plate_normalized(apps, schema_editor):
+    Vehicle = apps.get_model('vehicles', 'Vehicle')
+    batch = []
+    for vehicle in Vehicle.objects.exclude(license_plate='').only('id', 'license_plate').iterator(chunk_size=BATCH_SIZE):
+        vehicle.plate_normalized = re.sub(r'[^A-Z0-9]', '', vehicle.license_plate.upper())
+        batch.append(vehicle)
+        if len(batch) >= BATCH_SIZE:
+            Vehicle.objects.bulk_update(batch, ['plate_normalized'])
+            batch = []
+    if batch:
+        Vehicle.objects.bulk_update(batch, ['plate_normalized'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0004_image_blob_refs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vehicle',
+            name='plate_normalized',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=20),
+        ),
+        migrations.RunPython(fill_plate_normalized, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.2 on 2026-10-18 00:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0005_vehicle_plate_normalized'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VinDecode',
+            fields=[
+                ('vin', models.CharField(max_length=17, primary_key=True, serialize=False)),
+                ('data', models.JSONField(blank=True, help_text='Decoded fields; null when the decoder rejected the VIN', null=True)),
+                ('error', models.CharField(blank=True, help_text='Why the decoder rejected the VIN', max_length=255)),
+                ('decoded_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
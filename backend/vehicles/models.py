@@ -1,7 +1,13 @@
 # backend/vehicles/models.py
+import re
+
 from django.db import models
 from django.contrib.auth.models import User
 
+def normalize_plate(plate):
+    """Uppercase letters and digits only: ' ab-123 ' -> 'AB123'"""
+    return re.sub(r'[^A-Z0-9]', '', (plate or '').upper())
+
 class Organization(models.Model):
     name = models.CharField(max_length=100, unique=True)
     account = models.CharField(max_length=100)
@@ -13,6 +19,17 @@ class Organization(models.Model):
     def __str__(self):
         return self.name
 
+    def subtree_ids(self):
+        """IDs of this organization and all of its descendants"""
+        ids = [self.id]
+        frontier = [self.id]
+        while frontier:
+            frontier = list(
+                Organization.objects.filter(parent_id__in=frontier).exclude(id__in=ids).values_list('id', flat=True)
+            )
+            ids.extend(frontier)
+        return ids
+
 class Vehicle(models.Model):
     STATUS_CHOICES = [
         ('AVAILABLE', 'Available'),
@@ -23,6 +40,7 @@ class Vehicle(models.Model):
     
     vin = models.CharField(max_length=100, unique=True)
     license_plate = models.CharField(max_length=20, blank=True)
+    plate_normalized = models.CharField(max_length=20, blank=True, db_index=True, editable=False)
     make = models.CharField(max_length=100, blank=True)
     model = models.CharField(max_length=100, blank=True)
     year = models.IntegerField(null=True, blank=True)
@@ -34,6 +52,23 @@ class Vehicle(models.Model):
     def __str__(self):
         return f"{self.license_plate or self.vin}"
 
+    def save(self, *args, **kwargs):
+        self.plate_normalized = normalize_plate(self.license_plate)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'license_plate' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'plate_normalized'}
+        super().save(*args, **kwargs)
+
+class VinDecode(models.Model):
+    """Persistent copy of the shared VIN decode cache (vehicles.vin)"""
+    vin = models.CharField(max_length=17, primary_key=True)
+    data = models.JSONField(null=True, blank=True, help_text="Decoded fields; null when the decoder rejected the VIN")
+    error = models.CharField(max_length=255, blank=True, help_text="Why the decoder rejected the VIN")
+    decoded_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.vin
+
 class Shift(models.Model):
     SHIFT_TYPE_CHOICES = [
         ('GUARD', 'Guard Shift'),
@@ -55,6 +90,17 @@ class Shift(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.shift_type} - {self.date}"
 
+class ImageLogQuerySet(models.QuerySet):
+    def with_images(self):
+        """Opt back in to the image columns deferred by ImageLogManager"""
+        return self.defer(None)
+
+class ImageLogManager(models.Manager.from_queryset(ImageLogQuerySet)):
+    """Defers the model's IMAGE_FIELDS (inline base64 images) unless with_images() is used"""
+
+    def get_queryset(self):
+        return super().get_queryset().defer(*self.model.IMAGE_FIELDS)
+
 class AttendanceLog(models.Model):
     ACTION_CHOICES = [
         ('LOGIN', 'Login'),
@@ -65,9 +111,13 @@ class AttendanceLog(models.Model):
     action = models.CharField(max_length=10, choices=ACTION_CHOICES)
     timestamp = models.DateTimeField(auto_now_add=True)
     shift = models.ForeignKey(Shift, on_delete=models.CASCADE, null=True, blank=True)
-    face_image = models.TextField(blank=True)  # Base64 encoded image
+    face_image = models.TextField(blank=True)  # Legacy base64 encoded image
+    face_image_ref = models.CharField(max_length=64, blank=True)  # SHA-256 in the blob store
     verified_by = models.ForeignKey('accounts.User', on_delete=models.SET_NULL, null=True, blank=True, related_name='verified_attendance')
 
+    IMAGE_FIELDS = ['face_image']
+    objects = ImageLogManager()
+
     def __str__(self):
         return f"{self.user.username} - {self.action} - {self.timestamp}"
 
@@ -75,12 +125,17 @@ class VehicleVerification(models.Model):
     vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE)
     driver = models.ForeignKey('accounts.User', on_delete=models.CASCADE, related_name='vehicle_verifications')
     guard = models.ForeignKey('accounts.User', on_delete=models.CASCADE, related_name='guard_verifications')
-    license_plate_image = models.TextField()  # Base64 encoded
-    driver_face_image = models.TextField()    # Base64 encoded
+    license_plate_image = models.TextField(blank=True)  # Legacy base64 encoded
+    license_plate_image_ref = models.CharField(max_length=64, blank=True)  # SHA-256 in the blob store
+    driver_face_image = models.TextField(blank=True)    # Legacy base64 encoded
+    driver_face_image_ref = models.CharField(max_length=64, blank=True)  # SHA-256 in the blob store
     verification_time = models.DateTimeField(auto_now_add=True)
     is_verified = models.BooleanField(default=True)
     shift = models.ForeignKey(Shift, on_delete=models.CASCADE)
 
+    IMAGE_FIELDS = ['license_plate_image', 'driver_face_image']
+    objects = ImageLogManager()
+
     def __str__(self):
         return f"{self.vehicle} verified by {self.guard.username}"
 
@@ -0,0 +1,246 @@
+# backend/vehicles/tests.py
+import base64
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, time as dt_time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock, PropertyMock, patch
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import User
+from .models import AttendanceLog, Organization, Shift, Vehicle, VinDecode
+from .vin import InvalidVin, VinDecoder, VinServiceError
+
+VALID_VIN = '1HGCM82633A004352'
+REJECTED_VIN = '1HGCM82633A00435X'
+FAILING_VIN = '1HGCM82633A004353'
+
+VIN_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'vin': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'vin-tests'},
+}
+
+class StubDecoder:
+    """Local stand-in for NHTSA's decodevinvalues endpoint, counting calls per VIN"""
+
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.calls = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                vin = self.path.rsplit('/', 1)[-1].split('?')[0]
+                stub.calls.append(vin)
+                time.sleep(stub.delay)
+                if vin == FAILING_VIN:
+                    self.send_error(503)
+                    return
+                if vin == REJECTED_VIN:
+                    result = {'Make': '', 'Model': '', 'ModelYear': '', 'ErrorCode': '11', 'ErrorText': 'Incorrect Model Year'}
+                else:
+                    result = {'Make': 'HONDA', 'Model': 'Accord', 'ModelYear': '2003', 'ErrorCode': '0', 'ErrorText': ''}
+                body = json.dumps({'Results': [result]}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_port}/api/vehicles/decodevinvalues/{{vin}}?format=json'
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def start_stub_decoder(test_case, delay=0):
+    """Serve a stub decoder for one test and point VIN_DECODER at it"""
+    stub = StubDecoder(delay)
+    test_case.addCleanup(stub.close)
+    override = override_settings(VIN_DECODER={'URL': stub.url, 'TIMEOUT': 5, 'LOCK_TIMEOUT': 5})
+    override.enable()
+    test_case.addCleanup(override.disable)
+    return stub
+
+@override_settings(CACHES=VIN_CACHES)
+class VinDecoderTestCase(TestCase):
+    """Test the shared VIN decode cache"""
+
+    def setUp(self):
+        caches['vin'].clear()
+        self.stub = start_stub_decoder(self)
+        self.decoder = VinDecoder()
+
+    def test_decodes_are_cached_and_persisted(self):
+        """Test a decode is stored in the cache and the table, and refills a flushed cache"""
+        decoded = self.decoder.decode(VALID_VIN)
+        self.assertEqual((decoded['make'], decoded['model'], decoded['year']), ('HONDA', 'Accord', '2003'))
+        self.assertEqual(VinDecode.objects.get(vin=VALID_VIN).data, decoded)
+
+        self.assertEqual(self.decoder.decode(VALID_VIN), decoded)
+        caches['vin'].clear()
+        self.assertEqual(self.decoder.decode(VALID_VIN), decoded)
+        self.assertEqual(self.stub.calls, [VALID_VIN])
+
+    def test_rejected_vins_are_cached(self):
+        """Test VINs the decoder rejects are answered locally until NEGATIVE_TTL passes"""
+        for _ in range(3):
+            with self.assertRaises(InvalidVin) as raised:
+                self.decoder.decode(REJECTED_VIN)
+        self.assertEqual(str(raised.exception), 'Incorrect Model Year')
+        self.assertEqual(self.stub.calls, [REJECTED_VIN])
+
+        caches['vin'].clear()
+        with self.assertRaises(InvalidVin):
+            self.decoder.decode(REJECTED_VIN)
+        self.assertEqual(len(self.stub.calls), 1)
+
+        # An expired rejection is asked again
+        caches['vin'].clear()
+        with self.settings(VIN_DECODER={'URL': self.stub.url, 'NEGATIVE_TTL': 0}):
+            with self.assertRaises(InvalidVin):
+                self.decoder.decode(REJECTED_VIN)
+        self.assertEqual(len(self.stub.calls), 2)
+
+    def test_service_errors_are_not_cached(self):
+        """Test upstream failures reach the caller and are retried on the next lookup"""
+        for _ in range(2):
+            with self.assertRaises(VinServiceError):
+                self.decoder.decode(FAILING_VIN)
+        self.assertEqual(self.stub.calls, [FAILING_VIN, FAILING_VIN])
+        self.assertFalse(VinDecode.objects.filter(vin=FAILING_VIN).exists())
+
+    def test_cache_outage_is_a_miss(self):
+        """Test an unreachable cache falls back to the table and the decoder instead of failing"""
+        broken = MagicMock()
+        for method in ('get', 'set', 'add', 'delete'):
+            getattr(broken, method).side_effect = ConnectionError('cache down')
+        with patch.object(VinDecoder, 'cache', new_callable=PropertyMock, return_value=broken):
+            self.assertEqual(self.decoder.decode(VALID_VIN)['make'], 'HONDA')
+            self.assertEqual(self.decoder.decode(VALID_VIN)['make'], 'HONDA')
+        self.assertEqual(self.stub.calls, [VALID_VIN])
+
+    def test_decode_and_add_vehicle_endpoints(self):
+        """Test the VIN endpoints share decodes and report rejections"""
+        org = Organization.objects.create(name='VIN Org', account='VIN001', website='https://vin.example')
+        manager = User.objects.create_user(username='vin_manager', password='testpass123', role='ORG_MANAGER', org=org)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(manager).access_token}')
+
+        response = client.get(f'/api/decode-vin/{VALID_VIN}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['make'], 'HONDA')
+
+        response = client.post('/api/add-vehicle/', {'vin': VALID_VIN, 'license_plate': 'VIN123'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        vehicle = Vehicle.objects.get(vin=VALID_VIN)
+        self.assertEqual((vehicle.make, vehicle.model, vehicle.year), ('HONDA', 'Accord', 2003))
+        self.assertEqual(self.stub.calls, [VALID_VIN])
+
+        response = client.get(f'/api/decode-vin/{REJECTED_VIN}/')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Incorrect Model Year', response.json()['error'])
+
+        # Any decoder failure leaves the vehicle to be added as given
+        with patch('vehicles.views.vin_decoder.decode', side_effect=RuntimeError('cache down')):
+            response = client.post('/api/add-vehicle/', {'vin': FAILING_VIN, 'license_plate': 'VIN124'}, format='json')
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(client.get(f'/api/decode-vin/{FAILING_VIN}/').status_code, 500)
+
+@override_settings(CACHES=VIN_CACHES)
+class VinSingleflightTestCase(TransactionTestCase):
+    """Test concurrent lookups of one VIN share an upstream call"""
+
+    def setUp(self):
+        caches['vin'].clear()
+        self.stub = start_stub_decoder(self, delay=0.3)
+
+    def decode_concurrently(self, decoders):
+        results = []
+
+        def lookup(decoder):
+            try:
+                results.append(decoder.decode(VALID_VIN)['make'])
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=lookup, args=(decoder,)) for decoder in decoders]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_threads_share_one_call(self):
+        """Test threads of one process wait for the first one's call"""
+        decoder = VinDecoder()
+        self.assertEqual(self.decode_concurrently([decoder] * 8), ['HONDA'] * 8)
+        self.assertEqual(self.stub.calls, [VALID_VIN])
+
+    def test_processes_share_one_call(self):
+        """Test separate decoders (as in separate workers) coordinate through the shared cache lock"""
+        self.assertEqual(self.decode_concurrently([VinDecoder() for _ in range(4)]), ['HONDA'] * 4)
+        self.assertEqual(self.stub.calls, [VALID_VIN])
+
+class GuardImageEndpointsTestCase(TestCase):
+    """Test guard endpoints store images only for valid requests"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.blob_dir = directory.name
+        override = override_settings(STORAGES={**settings.STORAGES, 'blobs': {
+            'BACKEND': 'django.core.files.storage.FileSystemStorage',
+            'OPTIONS': {'location': directory.name},
+        }})
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.org = Organization.objects.create(name='Gate Org', account='GATE001', website='https://gate.example')
+        guard = User.objects.create_user(username='gate_guard', password='testpass123', role='GUARD', org=self.org)
+        self.driver = User.objects.create_user(username='gate_driver', password='testpass123', role='DRIVER', org=self.org)
+        self.vehicle = Vehicle.objects.create(vin='GATE1234567890123', license_plate='GATE123', org=self.org)
+        Shift.objects.create(
+            user=self.driver, shift_type='DRIVER', date=datetime.now().date(),
+            start_time=dt_time(8), end_time=dt_time(16), vehicle=self.vehicle, org=self.org,
+        )
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(guard).access_token}')
+        self.image = 'data:image/png;base64,' + base64.b64encode(b'\x89PNG stand-in').decode()
+
+    def stored_blobs(self):
+        return [name for _, _, files in os.walk(self.blob_dir) for name in files]
+
+    def test_rejected_requests_store_nothing(self):
+        """Test unknown users, vehicles and malformed images are refused before anything is stored"""
+        response = self.client.post('/api/record-attendance/', {'action': 'LOGIN', 'user_id': 9999, 'face_image': self.image}, format='json')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.post('/api/verify-driver-vehicle/', {
+            'driver_id': self.driver.id, 'vehicle_id': 9999, 'license_plate_image': self.image,
+        }, format='json')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.stored_blobs(), [])
+
+        response = self.client.post('/api/record-attendance/', {'action': 'LOGIN', 'face_image': 'not*base64'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(AttendanceLog.objects.count(), 0)
+
+        response = self.client.post('/api/verify-driver-vehicle/', {
+            'driver_id': self.driver.id, 'vehicle_id': self.vehicle.id, 'license_plate_image': self.image,
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.stored_blobs()), 1)
@@ -1,7 +1,7 @@
 # backend/vehicles/views.py 
 
 from rest_framework import viewsets, status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, parser_classes, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from accounts.models import User              
@@ -9,7 +9,7 @@ from accounts.permissions import IsDriver
 from django.shortcuts import get_object_or_404
 from .models import Vehicle, Organization,EntryLog
 from .serializers import VehicleSerializer, RecursiveOrgSerializer,EntryLogSerializer
-from django.core.cache import cache
+from .vin import InvalidVin, VinServiceError, vin_decoder
 from accounts.permissions import IsAdmin, IsGuard, IsOrgManager
 from rest_framework.decorators import permission_classes
 from accounts.permissions import IsAdminOrOrgManager
@@ -22,13 +22,11 @@ import pytesseract
 pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
 
 import pytesseract
-import cv2
-import numpy as np
-import base64
-from PIL import Image
-import io
 import re
-import requests
+from ai_features.ocr import get_ocr_engine
+from ai_features.blobs import store_image
+from ai_features.images import IMAGE_PARSERS, decode_image, get_image_upload
+from ai_features.preprocess import Preprocessor
 
 
 vin_call_timestamps = []
@@ -40,17 +38,16 @@ class VehicleViewSet(viewsets.ModelViewSet):
 
 # Image Upload + OCR
 @api_view(['POST'])
+@parser_classes(IMAGE_PARSERS)
 @permission_classes([IsAuthenticated])
 def upload_image(request):
-    image_data = request.data.get('image_base64', '')
+    image_data = get_image_upload(request, 'image_base64') or get_image_upload(request)
     if not image_data:
         return Response({"error": "No image provided."}, status=400)
     try:
-        image_bytes = base64.b64decode(image_data.split(',')[-1])
-        image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
-        image_np = np.array(image)
-        gray = cv2.cvtColor(image_np, cv2.COLOR_RGB2GRAY)
-        text = pytesseract.image_to_string(gray)
+        image_np = decode_image(image_data, mode='RGB')
+        gray = Preprocessor(image_np, color_order='RGB')['gray']
+        text = get_ocr_engine().image_to_string(gray)
         return Response({"recognized_text": text.strip()})
     except Exception as e:
         import traceback
@@ -68,12 +65,6 @@ def decode_vin(request, vin):
     if not re.fullmatch(r'^[A-HJ-NPR-Z0-9]{17}$', vin):
         return Response({"error": "Invalid VIN format. Must be 17 characters."}, status=400)
     
-    # Check cache first
-    cached_data = cache.get(f"vin_{vin}")
-    if cached_data:
-        print(f"📋 Returning cached VIN data for {vin}")
-        return Response(cached_data)
-    
     # Handle test VIN
     if vin == "TEST123456789ABCD" or vin.startswith("TEST"):
         test_data = {
@@ -87,68 +78,18 @@ def decode_vin(request, vin):
             "fuel_type": "Gasoline",
             "api_status": "test_data"
         }
-        cache.set(f"vin_{vin}", test_data, timeout=3600)
         return Response(test_data)
     
+    # Shared cache, then the VinDecode table, then one NHTSA call however many requests ask at once
     try:
-        # Call NHTSA API
-        url = f"https://vpic.nhtsa.dot.gov/api/vehicles/decodevinvalues/{vin}?format=json"
-        print(f"🌐 Calling NHTSA API: {url}")
-        
-        response = requests.get(url, timeout=15)
-        response.raise_for_status()
-        
-        data = response.json()
-        if not data.get('Results'):
-            return Response({"error": "No data returned from VIN service"}, status=400)
-            
-        result = data['Results'][0]
-        
-        # Extract information
-        decoded_data = {
+        decoded = vin_decoder.decode(vin)
+    except InvalidVin as e:
+        return Response({
+            "error": f"VIN decode failed: {e}",
             "vin": vin,
-            "make": result.get("Make", "").strip() or "Unknown",
-            "model": result.get("Model", "").strip() or "Unknown", 
-            "year": result.get("ModelYear", "").strip() or "Unknown",
-            "manufacturer": result.get("Manufacturer", "").strip(),
-            "body_class": result.get("BodyClass", "").strip(),
-            "engine_hp": result.get("EngineHP", "").strip(),
-            "fuel_type": result.get("FuelTypePrimary", "").strip(),
-            "transmission": result.get("TransmissionStyle", "").strip(),
-            "drive_type": result.get("DriveType", "").strip(),
-            "vehicle_type": result.get("VehicleType", "").strip(),
-        }
-        
-        # Check for API errors
-        error_code = result.get("ErrorCode", "")
-        error_text = result.get("ErrorText", "")
-        
-        if error_code:
-            decoded_data["api_error_code"] = error_code
-            decoded_data["api_error_text"] = error_text
-            print(f"⚠️ NHTSA API warning for VIN {vin}: {error_code} - {error_text}")
-        
-        # If we got some useful data, proceed even with warnings
-        has_useful_data = any([
-            decoded_data["make"] != "Unknown",
-            decoded_data["model"] != "Unknown", 
-            decoded_data["year"] != "Unknown"
-        ])
-        
-        if not has_useful_data and error_code and error_code not in ["0", "", "8"]:
-            return Response({
-                "error": f"VIN decode failed: {error_text or 'No detailed data available'}",
-                "vin": vin,
-                "suggestion": "Try with a different VIN or check if the VIN is correct"
-            }, status=400)
-        
-        # Cache successful results
-        cache.set(f"vin_{vin}", decoded_data, timeout=3600)
-        
-        print(f"✅ VIN {vin} decoded: {decoded_data['make']} {decoded_data['model']} {decoded_data['year']}")
-        return Response(decoded_data)
-        
-    except requests.RequestException as e:
+            "suggestion": "Try with a different VIN or check if the VIN is correct"
+        }, status=400)
+    except VinServiceError as e:
         print(f"🌐 Network error decoding VIN {vin}: {e}")
         return Response({
             "error": f"Failed to connect to VIN service: {str(e)}",
@@ -160,6 +101,16 @@ def decode_vin(request, vin):
             "error": f"VIN decode error: {str(e)}",
             "vin": vin
         }, status=500)
+    
+    if decoded.get("api_error_code"):
+        print(f"⚠️ NHTSA API warning for VIN {vin}: {decoded['api_error_code']} - {decoded.get('api_error_text', '')}")
+    
+    return Response({
+        **decoded,
+        "make": decoded["make"] or "Unknown",
+        "model": decoded["model"] or "Unknown",
+        "year": decoded["year"] or "Unknown",
+    })
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -219,24 +170,13 @@ def add_vehicle(request):
             return Response({"error": "Organization manager must have an organization assigned"}, status=400)
         print(f"✅ Org Manager adding vehicle to their org: {org.name}")
 
-    # Try to get decoded data from cache first
-    decoded = cache.get(f"vin_{vin}")
-    if not decoded:
-        try:
-            url = f"https://vpic.nhtsa.dot.gov/api/vehicles/decodevinvalues/{vin}?format=json"
-            res = requests.get(url, timeout=10)
-            data = res.json()
-            result = data['Results'][0]
-            decoded = {
-                "make": result.get("Make", ""),
-                "model": result.get("Model", ""),
-                "year": result.get("ModelYear", ""),
-            }
-            cache.set(f"vin_{vin}", decoded, timeout=3600)
-        except Exception as e:
-            print(f"VIN decode error: {e}")
-            # Continue with manual data if VIN decode fails
-            decoded = {}
+    # Decoded fields fill in what the request left out; without them the vehicle is added as given
+    try:
+        decoded = vin_decoder.decode(vin)
+    except Exception as e:
+        print(f"VIN decode error: {e}")
+        # Continue with manual data if VIN decode fails
+        decoded = {}
 
     # Create vehicle with provided or decoded data
     vehicle = Vehicle.objects.create(
@@ -727,7 +667,7 @@ def org_dashboard(request):
     attendance_logs = AttendanceLog.objects.filter(
         user__org=org,
         timestamp__date=today
-    ).order_by('-timestamp')
+    ).select_related('user').order_by('-timestamp')
     
     # Get vehicle verifications
     verifications = VehicleVerification.objects.filter(
@@ -740,7 +680,7 @@ def org_dashboard(request):
         'total_drivers': User.objects.filter(org=org, role='DRIVER').count(), 
         'total_vehicles': Vehicle.objects.filter(org=org).count(),
         'todays_attendance': len(attendance_logs),
-        'todays_verifications': len(verifications),
+        'todays_verifications': verifications.count(),
         'recent_logs': [
             {
                 'user': log.user.username,
@@ -830,15 +770,21 @@ def driver_dashboard(request):
     })
 
 @api_view(['POST'])
+@parser_classes(IMAGE_PARSERS)
 @permission_classes([IsAuthenticated, IsGuard])
 def record_attendance(request):
     """Guard records login/logout with face scan"""
     action = request.data.get('action')  # 'LOGIN' or 'LOGOUT'
-    face_image = request.data.get('face_image')  # Base64
     user_id = request.data.get('user_id', request.user.id)  # For recording driver attendance
     
     user = get_object_or_404(User, id=user_id, org=request.user.org)
     
+    # Stored only once the request is valid, so rejected requests leave no blobs behind
+    try:
+        face_image_ref = store_image(get_image_upload(request, 'face_image'))  # Base64 or file
+    except ValueError as e:
+        return Response({'error': f'Invalid face image: {e}'}, status=400)
+    
     # Get today's shift
     today = datetime.now().date()
     shift = Shift.objects.filter(user=user, date=today).first()
@@ -847,24 +793,30 @@ def record_attendance(request):
         user=user,
         action=action,
         shift=shift,
-        face_image=face_image,
+        face_image_ref=face_image_ref,
         verified_by=request.user if user != request.user else None
     )
     
     return Response({'message': f'{action} recorded successfully'})
 
 @api_view(['POST'])
+@parser_classes(IMAGE_PARSERS)
 @permission_classes([IsAuthenticated, IsGuard])
 def verify_driver_vehicle(request):
     """Guard verifies driver has correct vehicle"""
     driver_id = request.data.get('driver_id')
     vehicle_id = request.data.get('vehicle_id')
-    license_plate_image = request.data.get('license_plate_image')
-    driver_face_image = request.data.get('driver_face_image')
     
     driver = get_object_or_404(User, id=driver_id, role='DRIVER', org=request.user.org)
     vehicle = get_object_or_404(Vehicle, id=vehicle_id, org=request.user.org)
     
+    # Stored only once the request is valid, so rejected requests leave no blobs behind
+    try:
+        license_plate_image_ref = store_image(get_image_upload(request, 'license_plate_image'))
+        driver_face_image_ref = store_image(get_image_upload(request, 'driver_face_image'))
+    except ValueError as e:
+        return Response({'error': f'Invalid image: {e}'}, status=400)
+    
     # Get today's driver shift
     today = datetime.now().date()
     shift = Shift.objects.filter(user=driver, date=today, shift_type='DRIVER').first()
@@ -873,8 +825,8 @@ def verify_driver_vehicle(request):
         vehicle=vehicle,
         driver=driver,
         guard=request.user,
-        license_plate_image=license_plate_image,
-        driver_face_image=driver_face_image,
+        license_plate_image_ref=license_plate_image_ref,
+        driver_face_image_ref=driver_face_image_ref,
         shift=shift
     )
     
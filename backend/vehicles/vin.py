@@ -0,0 +1,238 @@
+# backend/vehicles/vin.py
+"""
+Shared, persistent cache of VIN decodes.
+
+NHTSA's vPIC decoder takes from hundreds of milliseconds to seconds to answer,
+and a VIN always decodes the same way. decode() looks, in order, in:
+- the 'vin' cache alias (Redis in production, shared by all workers)
+- VinDecode rows, which outlive cache flushes and restarts and refill the cache
+- the upstream decoder at VIN_DECODER['URL'] (point it at a local stub in tests)
+
+VINs the decoder rejects are cached as well, for NEGATIVE_TTL, so a repeated
+typo does not reach it again. Network and server errors are not cached.
+
+An unreachable cache or a failing VinDecode query counts as a miss, so an
+outage of either costs an upstream call instead of the request.
+
+Concurrent lookups of a VIN missing everywhere make one upstream call
+(singleflight):
+- threads of a process wait for the first one's call
+- processes race for a short lock in the shared cache (cache.add); the others
+  poll the cache for the winner's result, and call upstream themselves if the
+  winner gives up or LOCK_TIMEOUT passes
+"""
+import logging
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+import requests
+from django.conf import settings
+from django.core.cache import caches, InvalidCacheBackendError
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from .models import VinDecode
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'vin'
+
+DEFAULT_VIN_SETTINGS = {
+    'URL': 'https://vpic.nhtsa.dot.gov/api/vehicles/decodevinvalues/{vin}?format=json',
+    'TIMEOUT': 10,
+    'CACHE_ALIAS': 'vin',
+    'TTL': 30 * 24 * 3600,
+    'NEGATIVE_TTL': 24 * 3600,
+    'LOCK_TIMEOUT': 15,
+    'POLL_INTERVAL': 0.05,
+}
+
+# NHTSA error codes that still come with a usable decode (0 = clean, 8 = no detailed data)
+BENIGN_ERROR_CODES = ('0', '', '8')
+
+
+class VinDecodeError(Exception):
+    """A VIN could not be decoded"""
+
+
+class InvalidVin(VinDecodeError):
+    """The decoder rejected the VIN; cached like a successful decode"""
+
+
+class VinServiceError(VinDecodeError):
+    """The decoder could not be reached or gave no usable answer; never cached"""
+
+
+def parse_decoder_result(vin, payload):
+    """Decoded fields from a vPIC decodevinvalues answer; raises InvalidVin or VinServiceError"""
+    results = payload.get('Results') if isinstance(payload, dict) else None
+    if not results:
+        raise VinServiceError('No data returned from VIN service')
+    result = results[0]
+
+    def field(name):
+        return (result.get(name) or '').strip()
+
+    decoded = {
+        'vin': vin,
+        'make': field('Make'),
+        'model': field('Model'),
+        'year': field('ModelYear'),
+        'manufacturer': field('Manufacturer'),
+        'body_class': field('BodyClass'),
+        'engine_hp': field('EngineHP'),
+        'fuel_type': field('FuelTypePrimary'),
+        'transmission': field('TransmissionStyle'),
+        'drive_type': field('DriveType'),
+        'vehicle_type': field('VehicleType'),
+    }
+
+    error_code, error_text = field('ErrorCode'), field('ErrorText')
+    if error_code:
+        decoded['api_error_code'] = error_code
+        decoded['api_error_text'] = error_text
+
+    # Some data is worth keeping even with warnings
+    if not any([decoded['make'], decoded['model'], decoded['year']]) and error_code not in BENIGN_ERROR_CODES:
+        raise InvalidVin(error_text or 'No detailed data available')
+    return decoded
+
+
+class VinDecoder:
+    """VIN decodes through the shared cache, the VinDecode table and a single upstream call"""
+
+    def __init__(self, config=None):
+        self._config = config
+        self._lock = threading.Lock()
+        self._inflight = {}  # vin -> Future of the call in progress in this process
+
+    @property
+    def config(self):
+        return {**DEFAULT_VIN_SETTINGS, **(self._config if self._config is not None else getattr(settings, 'VIN_DECODER', {}))}
+
+    @property
+    def cache(self):
+        try:
+            return caches[self.config['CACHE_ALIAS']]
+        except InvalidCacheBackendError:
+            return caches['default']
+
+    def _cache_call(self, method, *args, default=None):
+        """A call on the shared cache, or default when it fails (the outage is logged, not raised)"""
+        try:
+            return getattr(self.cache, method)(*args)
+        except Exception as e:
+            logger.warning(f"VIN cache {method} failed: {e}")
+            return default
+
+    def decode(self, vin):
+        """Decoded fields of a VIN; raises InvalidVin or VinServiceError"""
+        config = self.config
+        entry = self._cached(vin, config)
+        if entry is None:
+            entry = self._singleflight(vin, config)
+        if 'error' in entry:
+            raise InvalidVin(entry['error'])
+        return entry['data']
+
+    def _cached(self, vin, config):
+        """The cache entry of a VIN, refilled from its VinDecode row when the cache lost it"""
+        entry = self._cache_call('get', f'{KEY_PREFIX}:{vin}')
+        if entry is not None:
+            return entry
+
+        try:
+            row = VinDecode.objects.filter(vin=vin).first()
+        except DatabaseError as e:
+            logger.warning(f"VinDecode lookup of {vin} failed: {e}")
+            return None
+        if row is None:
+            return None
+        if row.data is not None:
+            entry, ttl = {'data': row.data}, config['TTL']
+        else:
+            ttl = config['NEGATIVE_TTL'] - (timezone.now() - row.decoded_at).total_seconds()
+            if ttl <= 0:
+                return None
+            entry = {'error': row.error}
+        self._cache_call('set', f'{KEY_PREFIX}:{vin}', entry, int(ttl))
+        return entry
+
+    def _singleflight(self, vin, config):
+        """One upstream call per VIN in this process; other threads wait for its result"""
+        with self._lock:
+            flight = self._inflight.get(vin)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[vin] = Future()
+
+        if not leader:
+            try:
+                return flight.result(timeout=config['TIMEOUT'] + config['LOCK_TIMEOUT'])
+            except FutureTimeout:
+                raise VinServiceError('Timed out waiting for the VIN service')
+
+        try:
+            entry = self._fetch_once(vin, config)
+            flight.set_result(entry)
+            return entry
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[vin]
+
+    def _fetch_once(self, vin, config):
+        """One upstream call per VIN across processes, coordinated through a lock in the shared cache"""
+        key = f'{KEY_PREFIX}:{vin}'
+        lock_key = f'{key}:lock'
+        # Without the cache there is no lock to wait on; call upstream directly
+        owner = self._cache_call('add', lock_key, 1, config['LOCK_TIMEOUT'], default=True)
+        if not owner:
+            deadline = time.monotonic() + config['LOCK_TIMEOUT']
+            while time.monotonic() < deadline:
+                time.sleep(config['POLL_INTERVAL'])
+                entry = self._cache_call('get', key)
+                if entry is not None:
+                    return entry
+                if self._cache_call('get', lock_key) is None:
+                    # The other process failed; this one tries for itself
+                    break
+        try:
+            entry = self._fetch(vin, config)
+            self._store(vin, entry, config)
+            return entry
+        finally:
+            if owner:
+                self._cache_call('delete', lock_key)
+
+    def _fetch(self, vin, config):
+        try:
+            response = requests.get(config['URL'].format(vin=vin), timeout=config['TIMEOUT'])
+            response.raise_for_status()
+            payload = response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise VinServiceError(str(e))
+        try:
+            return {'data': parse_decoder_result(vin, payload)}
+        except InvalidVin as e:
+            logger.info(f"VIN {vin} rejected by the decoder: {e}")
+            return {'error': str(e)}
+
+    def _store(self, vin, entry, config):
+        try:
+            # A savepoint, so a failed write does not break the caller's transaction
+            with transaction.atomic():
+                VinDecode.objects.update_or_create(vin=vin, defaults={
+                    'data': entry.get('data'),
+                    'error': entry.get('error', '')[:255],
+                })
+        except DatabaseError as e:
+            logger.warning(f"VinDecode of {vin} not saved: {e}")
+        ttl = config['TTL'] if 'data' in entry else config['NEGATIVE_TTL']
+        self._cache_call('set', f'{KEY_PREFIX}:{vin}', entry, ttl)
+
+
+vin_decoder = VinDecoder()
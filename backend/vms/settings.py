@@ -27,6 +27,7 @@ INSTALLED_APPS = [
     'channels',
     'realtime',
     'ai_features',
+    'tasks',
 ]
 
 MIDDLEWARE = [
@@ -94,7 +95,22 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
+    # Plate OCR results shared by all workers; run Redis with maxmemory-policy allkeys-lru
+    'ocr': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:6379/1',
+    },
+    # VIN decodes shared by all workers; the VinDecode table refills it after a flush
+    'vin': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:6379/2',
+    },
+    # Change counters of the per-worker face index and plate lookup
+    'index': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:6379/3',
+    },
 }
 AUTHENTICATION_BACKENDS = [
     'django.contrib.auth.backends.ModelBackend'
@@ -127,6 +143,24 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Background task outbox (tasks.queue)
+TASK_QUEUE = {
+    'WORKER': 'thread',  # 'thread' (drained in each web process), 'external' (only manage.py drain_tasks --loop) or 'inline'
+    'POLL_INTERVAL': 5,  # Seconds between polls for delayed and retried tasks
+    'LEASE_SECONDS': 60,  # A claimed task is handed to another worker if not finished by then
+    'MAX_ATTEMPTS': 5,  # Attempts before a task is left as FAILED
+}
+
+# VIN decoding (vehicles.vin)
+VIN_DECODER = {
+    'URL': 'https://vpic.nhtsa.dot.gov/api/vehicles/decodevinvalues/{vin}?format=json',  # Upstream decoder - point at a local stub in tests
+    'TIMEOUT': 10,  # Seconds an upstream call may take
+    'CACHE_ALIAS': 'vin',  # CACHES alias holding decodes, shared by all workers
+    'TTL': 30 * 24 * 3600,  # Seconds a decode is cached (VINs always decode the same way)
+    'NEGATIVE_TTL': 24 * 3600,  # Seconds a VIN the decoder rejected is answered from the cache
+    'LOCK_TIMEOUT': 15,  # Seconds other workers wait on the worker calling upstream for the same VIN
+}
+
 # AI Configuration
 AI_SETTINGS = {
     'FACE_RECOGNITION_TOLERANCE': 0.6,  # Lower = more strict
@@ -134,8 +168,85 @@ AI_SETTINGS = {
     'MIN_PLATE_CONFIDENCE': 60,  # Minimum confidence for license plate detection
     'TESSERACT_PATH': r'C:\Program Files\Tesseract-OCR\tesseract.exe',  # Windows path
     # 'TESSERACT_PATH': '/usr/bin/tesseract',  # Linux path
+    'FACE_DETECTION_MAX_SIDE': 640,  # Detect faces on a copy scaled down to this longer side - None = full frame
+    'FACE_QUALITY': {
+        'ENABLED': True,  # Verification answers 422 for frames failing these checks, before detection/encoding
+        'MAX_SIDE': 320,  # Frames are scored on a grayscale copy scaled down to this longer side
+        'MIN_SHARPNESS': 50.0,  # Variance of the Laplacian - lower = blurred
+        'MIN_LUMINANCE': 40,  # Mean gray level (0-255) - lower = too dark
+        'MAX_LUMINANCE': 225,  # Mean gray level - higher = overexposed
+        'MIN_FACE_SIZE': 40,  # Shorter side of a face box, in frame pixels - smaller faces are not encoded
+    },
+    'OCR_ENGINE': 'auto',  # 'tesserocr' (warm in-process API), 'pytesseract' (subprocess per call) or 'auto'
+    'TESSDATA_PATH': None,  # tesserocr language data directory - None = library default
+    'OCR_LANGUAGE': 'eng',
+    'PLATE_LOCALIZATION': True,  # OCR localized plate crops instead of the whole frame
+    'PLATE_CROP_HEIGHT': 64,  # Deskewed plate crops are scaled to this height
+    'PLATE_MAX_CANDIDATES': 3,  # Plate-shaped regions OCR'd per image
+    'PLATE_CASCADE': None,  # Optional Haar cascade XML, e.g. cv2.data.haarcascades + 'haarcascade_russian_plate_number.xml'
+    'PLATE_CACHE_ENABLED': True,  # Reuse OCR results for near-identical plate crops
+    'PLATE_CACHE_ALIAS': 'ocr',  # CACHES alias holding the results
+    'PLATE_CACHE_TTL': 300,  # Seconds an unused result is kept (refreshed on every hit)
+    'PLATE_CACHE_MAX_DISTANCE': 5,  # Max differing bits (of 128) between plate crop hashes for a hit - crops of plates one look-alike character apart can differ by only 6
+    'OCR_THREADS': 4,  # Tesseract variants run concurrently per plate
+    'OCR_EARLY_EXIT_CONFIDENCE': 85,  # Stop at the first strict-pattern plate read with this confidence
+    'PLATE_LOOKUP_IN_MEMORY': True,  # Resolve plates through the in-memory lookup - False = indexed exact match in the database
+    'PLATE_MATCH_MAX_COST': 0.8,  # Max weighted edit distance for a plate read to resolve to a vehicle (look-alike swaps cost 0.2-0.6, real edits 1)
+    'PLATE_CANDIDATE_MAX_COST': 1.0,  # Dearer reads up to this cost are reported as an unverified candidate, not attributed
+    'PLATE_SEARCH_SCOPE': 'org',  # Non-admins match plates of their 'org', its 'subtree' or 'all' organizations
+    'PLATE_CONSENSUS_VARIANTS_PER_FRAME': 2,  # OCR variants per frame of /api/ai/scan-license-plate-stream/ (a still gets all 24)
+    'PLATE_CONSENSUS_MIN_FRAMES': 3,  # Frames voted on before a consensus may count as stable
+    'PLATE_CONSENSUS_MAX_FRAMES': 10,  # Frame budget; the session ends with its best consensus
+    'PLATE_CONSENSUS_AGREEMENT': 0.6,  # Share of a position's votes its leading character needs
+    'PLATE_SESSION_CACHE_ALIAS': 'ocr',  # CACHES alias holding session tallies, shared by all workers
+    'PLATE_SESSION_TTL': 120,  # Seconds an idle session is kept
+    'MAX_BATCH_IMAGES': 16,  # Frames accepted by /api/ai/verify-faces-batch/
+    'MAX_ENROLLMENT_IMAGES': 5,  # Face samples accepted per /api/ai/register-face/ call
+    'BATCH_DECODE_THREADS': 4,  # Threads decoding a batch's images
+    # Face detection/encoding processes per web worker - 0 = run in the request thread, without 503 backpressure.
+    # Opt-in: each process loads the dlib models, and tests mock face_recognition in-process.
+    # Set the RECOGNITION_WORKERS environment variable to the cores per web worker in production.
+    'RECOGNITION_WORKERS': int(os.environ.get('RECOGNITION_WORKERS', 0)),
+    'RECOGNITION_QUEUE_SIZE': 8,  # Jobs that may wait for a free worker before requests get 503
+    'RECOGNITION_TIMEOUT': 10,  # Seconds a request waits for its recognition job
+    'RECOGNITION_RETRY_AFTER': 1,  # Retry-After seconds sent with a 503
+    'ASYNC_CPU_THREADS': 4,  # Threads running decoding, recognition and OCR for the /api/ai/async/ views, per worker
+    'BLOB_STORAGE': 'blobs',  # STORAGES alias holding scan images, keyed by SHA-256
+    'SCAN_ARCHIVE_MAX_SIDE': 1280,  # Stored scans are downscaled to this longer side
+    'SCAN_ARCHIVE_FORMAT': 'JPEG',  # 'JPEG' or 'WEBP' for archive copies and thumbnails
+    'SCAN_ARCHIVE_QUALITY': 80,
+    'SCAN_THUMBNAIL_SIZE': 160,  # Longer side of list-view thumbnails
+    'SCAN_KEEP_ORIGINALS': False,  # Also keep the full-resolution upload (raw_image_ref), e.g. for evidence retention
+    'INDEX_VERSION_CACHE_ALIAS': 'index',  # CACHES alias shared by all workers, telling them to reload the face index and plate lookup
+    'FACE_INDEX': {
+        'BACKEND': 'flat',  # 'flat' (exact), 'ivf' (approximate, pure NumPy) or 'hnsw' (needs hnswlib)
+        'SEARCH_SCOPE': 'org',  # Non-admins match faces within their 'org' or its 'subtree'
+        'IVF_NPROBE': 8,  # Clusters scanned per probe - higher = better recall, slower
+        'HNSW_EF_SEARCH': 64,  # Graph search breadth - higher = better recall, slower
+        'RERANK_K': 10,  # Approximate candidates re-ranked with exact distances
+        'EXACT_FALLBACK_ON_MISS': True,  # Full scan when no candidate is within tolerance
+        'SAMPLE_MARGIN': 0.08,  # Centroid matches this close to the tolerance are re-checked on enrollment samples
+        'SAMPLE_RERANK_K': 5,  # Nearest centroids whose samples a borderline probe is re-checked on
+    },
 }
 
 # Media files for storing images (optional)
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+    # Content-addressed scan images (ai_features.blobs); swap in any Storage backend, e.g. S3
+    'blobs': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        'OPTIONS': {
+            'location': os.path.join(MEDIA_ROOT, 'blobs'),
+            'base_url': MEDIA_URL + 'blobs/',
+        },
+    },
+}
\ No newline at end of file
@@ -6,14 +6,63 @@ import base64
 from PIL import Image
 import io
 import pytesseract
-from datetime import datetime, time
+from datetime import datetime
 import random
+import time
 
 app = FastAPI(title="AI Service", version="1.0.0")
 
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
 # Configure Tesseract (adjust path as needed)
 pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
 
+PLATE_WHITELIST = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+
+# Warm in-process Tesseract (language data loaded once) when tesserocr is installed;
+# otherwise each call starts a tesseract subprocess through pytesseract
+_ocr_api = None
+if tesserocr is not None:
+    try:
+        _ocr_api = tesserocr.PyTessBaseAPI(psm=tesserocr.PSM.SINGLE_WORD)
+        _ocr_api.SetVariable('tessedit_char_whitelist', PLATE_WHITELIST)
+    except RuntimeError:
+        _ocr_api = None
+
+def read_plate_chars(gray):
+    """Single-word plate OCR as (character, confidence 0-100) pairs, with the warm engine or pytesseract"""
+    if _ocr_api is None:
+        # image_to_data only has word confidences; each character gets its word's
+        data = pytesseract.image_to_data(
+            gray,
+            config=f'--psm 8 -c tessedit_char_whitelist={PLATE_WHITELIST}',
+            output_type=pytesseract.Output.DICT
+        )
+        return [
+            (char, float(conf))
+            for word, conf in zip(data['text'], data['conf'])
+            if float(conf) >= 0
+            for char in str(word).strip()
+        ]
+    _ocr_api.SetImage(Image.fromarray(gray))
+    try:
+        _ocr_api.Recognize()
+        iterator = _ocr_api.GetIterator()
+        if iterator is None:
+            return []
+        level = tesserocr.RIL.SYMBOL
+        chars = []
+        for symbol in tesserocr.iterate_level(iterator, level):
+            char = symbol.GetUTF8Text(level)
+            if char and not char.isspace():
+                chars.append((char, symbol.Confidence(level)))
+        return chars
+    finally:
+        _ocr_api.Clear()
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "service": "ai"}
@@ -26,6 +75,7 @@ async def ocr_image(
 ):
     """Extract text from image using OCR"""
     try:
+        started = time.perf_counter()
         image_base64 = image_data.get('image_base64', '')
         if not image_base64:
             raise HTTPException(status_code=400, detail="No image provided")
@@ -35,20 +85,23 @@ async def ocr_image(
         image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
         image_np = np.array(image)
         
-        # Preprocess image for better OCR
+        # Preprocess image for better OCR (same gray -> bilateral -> OTSU stages as the
+        # backend's ai_features.preprocess, two frame buffers: the threshold overwrites gray)
         gray = cv2.cvtColor(image_np, cv2.COLOR_RGB2GRAY)
         
         # Apply noise reduction and contrast enhancement
-        gray = cv2.bilateralFilter(gray, 11, 17, 17)
-        gray = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+        smoothed = cv2.bilateralFilter(gray, 11, 17, 17)
+        gray = cv2.threshold(smoothed, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=gray)[1]
         
-        # Extract text
-        text = pytesseract.image_to_string(gray, config='--psm 8 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789')
+        # Extract text with Tesseract's per-character confidences
+        chars = read_plate_chars(gray)
+        confidences = [conf for _, conf in chars]
         
         return {
-            "recognized_text": text.strip(),
-            "confidence": 0.85,  # Placeholder confidence score
-            "processing_time_ms": 1250
+            "recognized_text": ''.join(char for char, _ in chars),
+            "confidence": round(sum(confidences) / len(confidences) / 100, 3) if confidences else 0.0,
+            "char_confidences": [round(conf / 100, 3) for conf in confidences],
+            "processing_time_ms": round((time.perf_counter() - started) * 1000, 2)
         }
         
     except Exception as e:
@@ -1,8 +1,13 @@
 # microservices/vehicle-service/main.py
 from fastapi import FastAPI, HTTPException, Header
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey
+from sqlalchemy import create_engine, Column, DateTime, Integer, String, ForeignKey, Text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.exc import SQLAlchemyError
+from datetime import datetime, timedelta
+import asyncio
+import json
+import redis
 import requests
 import os
 
@@ -28,8 +33,26 @@ class Vehicle(Base):
     status = Column(String, default="AVAILABLE")
     assigned_driver_id = Column(Integer)
 
+class VinDecode(Base):
+    """Persistent copy of the VIN cache; data is null for VINs the decoder rejected"""
+    __tablename__ = "vin_decodes"
+
+    vin = Column(String(17), primary_key=True)
+    data = Column(Text)
+    error = Column(String(255), default="")
+    decoded_at = Column(DateTime, default=datetime.utcnow)
+
 Base.metadata.create_all(bind=engine)
 
+# VIN decoding: Redis first, then the vin_decodes table, then one upstream call per VIN
+VIN_DECODER_URL = os.getenv("VIN_DECODER_URL", "https://vpic.nhtsa.dot.gov/api/vehicles/decodevinvalues/{vin}?format=json")
+VIN_DECODER_TIMEOUT = float(os.getenv("VIN_DECODER_TIMEOUT", "10"))
+VIN_CACHE_TTL = int(os.getenv("VIN_CACHE_TTL", str(30 * 24 * 3600)))
+VIN_NEGATIVE_TTL = int(os.getenv("VIN_NEGATIVE_TTL", str(24 * 3600)))
+VIN_LOCK_TIMEOUT = int(os.getenv("VIN_LOCK_TIMEOUT", "15"))
+redis_client = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+vin_inflight = {}  # vin -> task decoding it in this process
+
 def get_db():
     db = SessionLocal()
     try:
@@ -104,27 +127,137 @@ async def create_vehicle(
     
     return {"message": "Vehicle created", "id": new_vehicle.id}
 
+class InvalidVin(Exception):
+    """The decoder rejected the VIN; cached for VIN_NEGATIVE_TTL"""
+
+def parse_vin_result(vin, payload):
+    results = payload.get("Results") if isinstance(payload, dict) else None
+    if not results:
+        raise HTTPException(status_code=502, detail="No data returned from VIN service")
+    result = results[0]
+    decoded = {
+        "vin": vin,
+        "make": (result.get("Make") or "").strip(),
+        "model": (result.get("Model") or "").strip(),
+        "year": (result.get("ModelYear") or "").strip(),
+        "manufacturer": (result.get("Manufacturer") or "").strip()
+    }
+    error_code = (result.get("ErrorCode") or "").strip()
+    if not (decoded["make"] or decoded["model"] or decoded["year"]) and error_code not in ("0", "", "8"):
+        raise InvalidVin((result.get("ErrorText") or "").strip() or "Invalid VIN")
+    return decoded
+
+def cache_get(key):
+    """Redis lookup that treats an unreachable Redis as a miss"""
+    try:
+        value = redis_client.get(key)
+    except redis.RedisError:
+        return None
+    return json.loads(value) if value else None
+
+def cache_set(key, entry, ttl):
+    try:
+        redis_client.setex(key, max(1, int(ttl)), json.dumps(entry))
+    except redis.RedisError:
+        pass
+
+def cache_lock(lock_key):
+    """Take the cross-replica lock for one VIN; True without Redis, as there is nothing to coordinate with"""
+    try:
+        return bool(redis_client.set(lock_key, 1, nx=True, ex=VIN_LOCK_TIMEOUT))
+    except redis.RedisError:
+        return True
+
+def cache_delete(key):
+    try:
+        redis_client.delete(key)
+    except redis.RedisError:
+        pass
+
+def stored_vin_entry(vin):
+    """Cache entry from the vin_decodes table, or None when missing, an expired rejection or the DB is down"""
+    db = SessionLocal()
+    try:
+        row = db.get(VinDecode, vin)
+    except SQLAlchemyError:
+        return None
+    finally:
+        db.close()
+    if row is None:
+        return None
+    if row.data is not None:
+        entry, ttl = {"data": json.loads(row.data)}, VIN_CACHE_TTL
+    else:
+        ttl = VIN_NEGATIVE_TTL - (datetime.utcnow() - row.decoded_at).total_seconds()
+        if ttl <= 0:
+            return None
+        entry = {"error": row.error}
+    cache_set(f"vin:{vin}", entry, ttl)
+    return entry
+
+def store_vin_entry(vin, entry):
+    db = SessionLocal()
+    try:
+        db.merge(VinDecode(
+            vin=vin,
+            data=json.dumps(entry["data"]) if "data" in entry else None,
+            error=entry.get("error", "")[:255],
+            decoded_at=datetime.utcnow()
+        ))
+        db.commit()
+    except SQLAlchemyError:
+        db.rollback()  # The decode is still returned and cached; the table catches up on the next one
+    finally:
+        db.close()
+    cache_set(f"vin:{vin}", entry, VIN_CACHE_TTL if "data" in entry else VIN_NEGATIVE_TTL)
+
+async def fetch_vin_entry(vin):
+    """One upstream call per VIN across service replicas, coordinated through a Redis lock"""
+    # Redis, the database and the decoder are blocking clients: keep them off the event loop
+    key, lock_key = f"vin:{vin}", f"vin:{vin}:lock"
+    owner = await asyncio.to_thread(cache_lock, lock_key)
+    if not owner:
+        deadline = asyncio.get_running_loop().time() + VIN_LOCK_TIMEOUT
+        while asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.05)
+            entry = await asyncio.to_thread(cache_get, key)
+            if entry is not None:
+                return entry
+            if await asyncio.to_thread(cache_get, lock_key) is None:
+                break  # The other replica failed; try for ourselves
+    try:
+        try:
+            response = await asyncio.to_thread(requests.get, VIN_DECODER_URL.format(vin=vin), timeout=VIN_DECODER_TIMEOUT)
+            response.raise_for_status()
+            payload = response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise HTTPException(status_code=502, detail=f"VIN decode failed: {str(e)}")
+        try:
+            entry = {"data": parse_vin_result(vin, payload)}
+        except InvalidVin as e:
+            entry = {"error": str(e)}
+        await asyncio.to_thread(store_vin_entry, vin, entry)
+        return entry
+    finally:
+        if owner:
+            await asyncio.to_thread(cache_delete, lock_key)
+
 @app.get("/decode-vin/{vin}")
 async def decode_vin(vin: str):
-    """Decode VIN using NHTSA API"""
-    try:
-        url = f"https://vpic.nhtsa.dot.gov/api/vehicles/decodevinvalues/{vin}?format=json"
-        response = requests.get(url, timeout=10)
-        data = response.json()
-        
-        if data.get('Results'):
-            result = data['Results'][0]
-            return {
-                "vin": vin,
-                "make": result.get("Make", ""),
-                "model": result.get("Model", ""),
-                "year": result.get("ModelYear", ""),
-                "manufacturer": result.get("Manufacturer", "")
-            }
-        else:
-            raise HTTPException(status_code=400, detail="Invalid VIN")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"VIN decode failed: {str(e)}")
+    """Decode VIN using NHTSA API, through the shared Redis cache and the vin_decodes table"""
+    vin = vin.strip().upper()
+    entry = await asyncio.to_thread(cache_get, f"vin:{vin}") or await asyncio.to_thread(stored_vin_entry, vin)
+    if entry is None:
+        # Concurrent requests for the same VIN await the first one's upstream call
+        task = vin_inflight.get(vin)
+        if task is None:
+            task = vin_inflight[vin] = asyncio.ensure_future(fetch_vin_entry(vin))
+            task.add_done_callback(lambda _: vin_inflight.pop(vin, None))
+        entry = await asyncio.shield(task)
+
+    if "error" in entry:
+        raise HTTPException(status_code=400, detail=f"Invalid VIN: {entry['error']}")
+    return entry["data"]
 
 if __name__ == "__main__":
     import uvicorn